@@ -8,10 +8,149 @@ from tkinter import ttk, messagebox
 import pickle
 
 # Importing datetime module for handling date and time
-from datetime import datetime
+from datetime import datetime, timedelta
+
+# Importing hashlib, os, queue, shutil, struct, sys, threading and time modules for the journal and snapshots
+import hashlib
+import os
+import queue
+import shutil
+import struct
+import sys
+import threading
+import time
+
+# Importing bisect and accumulate for the sorted search indexes, islice for the export chunks
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, islice
+
+# Importing Counter for the analytics columns' per-day counters and OrderedDict for the session table
+from collections import Counter, OrderedDict
+
+# Importing NumPy when it is installed, for faster passes over the analytics columns
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Importing fcntl (POSIX) or msvcrt (Windows) for locks shared between processes
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Importing asyncio, base64, json, re, traceback and query string parsing for the HTTP/JSON booking API
+import asyncio
+import base64
+import json
+import re
+import traceback
+from urllib.parse import parse_qsl
+
+# Importing contextmanager for the data store's write sections, nullcontext for an export without a lock file
+from contextlib import contextmanager, nullcontext
+
+# Importing hmac and ThreadPoolExecutor for password hashing off the caller's thread
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+
+# Importing sqlite3 module for the database-backed repository
+import sqlite3
+
+# Importing array, csv and zlib modules for the CSV and columnar exports
+from array import array
+import csv
+import zlib
+
+# Importing cProfile, functools, io and pstats modules for the instrumentation and on-demand profiling
+import cProfile
+import functools
+import io
+import pstats
+
+# Importing argparse module for the command-line options
+import argparse
+
+# Version of the flat record format written to the snapshot files
+RECORD_FORMAT_VERSION = 5  # 2: reservations name their payment, payments count their seats; 3: check-in time;
+                           # 4: refunds name the payment they refund; 5: customers, tickets and reservations
+                           # carry their version
+
+# Pattern of a group discount in a ticket's discount text, such as "20% off for groups of 20 or more"
+GROUP_DISCOUNT_PATTERN = re.compile(r"(\d+(?:\.\d+)?)% off for groups of (\d+) or more", re.IGNORECASE)
+
+# Tag that marks a snapshot file written as flat records rather than pickled objects
+RECORD_SNAPSHOT_TAG = "adventureland-records"
+
+# Tag of the first pickle of a record snapshot written in chunks, (tag, format version, record count); the records
+# follow as one pickled list per RECORD_CHUNK_SIZE records, so a reader can stream them
+RECORD_CHUNKS_TAG = "adventureland-record-chunks"
+RECORD_CHUNK_SIZE = 10000
+
+# Function to restore pickled attributes onto an object that uses __slots__
+def restore_slots(obj, state):
+    if isinstance(state, tuple):  # (instance dict, slot values) as pickled for slotted objects
+        state = {**(state[0] or {}), **(state[1] or {})}
+    for name, value in state.items():  # Objects pickled before __slots__ carry their attributes in a dict
+        object.__setattr__(obj, name, value)
+
+# Work factor of new password hashes: scrypt's CPU and memory cost is 2 ** PASSWORD_HASH_COST (sized by the
+# passwords benchmark in tests/benchmarks.py; raising it by one doubles the time a login takes)
+PASSWORD_HASH_COST = 14
+
+# scrypt block size and parallelism, and the bytes of salt and of derived key stored with each hash
+SCRYPT_BLOCK_SIZE = 8
+SCRYPT_PARALLELISM = 1
+PASSWORD_SALT_BYTES = 16
+PASSWORD_KEY_BYTES = 32
+
+# PBKDF2-SHA256 iterations per 2 ** cost, used where Python's OpenSSL has no scrypt (about 600,000 at cost 14)
+PBKDF2_ITERATIONS_PER_COST = 36
+
+# Stored in place of the password of an account that can no longer sign in (no password hashes or equals it)
+LOCKED_PASSWORD = "!locked"
+
+# Function to derive the key stored for a password with one of the supported schemes
+def derive_password_key(scheme, password, salt, cost):
+    if scheme == "scrypt":
+        n = 2 ** cost
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=SCRYPT_BLOCK_SIZE, p=SCRYPT_PARALLELISM,
+                              maxmem=256 * SCRYPT_BLOCK_SIZE * n, dklen=PASSWORD_KEY_BYTES)
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PBKDF2_ITERATIONS_PER_COST * 2 ** cost,
+                               PASSWORD_KEY_BYTES)
+
+# Function to hash a password with a fresh salt, as "scheme$cost$salt$key"
+def hash_password(password, cost=PASSWORD_HASH_COST):
+    scheme = "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256"
+    salt = os.urandom(PASSWORD_SALT_BYTES)
+    return f"{scheme}${cost}${salt.hex()}${derive_password_key(scheme, password, salt, cost).hex()}"
+
+# Function to split a stored password into (scheme, cost, salt, key), or None for a plaintext password
+def parse_password_hash(stored):
+    parts = stored.split("$")
+    if len(parts) != 4 or parts[0] not in ("scrypt", "pbkdf2_sha256") or not parts[1].isdigit():
+        return None  # Saved before passwords were hashed
+    try:
+        return parts[0], int(parts[1]), bytes.fromhex(parts[2]), bytes.fromhex(parts[3])
+    except ValueError:
+        return None
+
+# Function to check a password against a stored hash (or the plaintext saved by older versions)
+def verify_password(stored, password):
+    if stored == LOCKED_PASSWORD:
+        return False
+    parsed = parse_password_hash(stored)
+    if parsed is None:
+        return hmac.compare_digest(stored.encode(), password.encode())
+    scheme, cost, salt, key = parsed
+    return hmac.compare_digest(derive_password_key(scheme, password, salt, cost), key)
 
 # Base class for User (Inheritance)
 class User:
+    # Fixed attribute layout: no per-object __dict__
+    __slots__ = ("__user_id", "__name", "__email", "__password")
+
     # Constructor to initialize user attributes
     def __init__(self, user_id, name, email, password):
         self.__user_id = user_id  # Private attribute for user ID
@@ -31,9 +170,37 @@ class User:
     def get_email(self):
         return self.__email
 
-    # Method to check if a given password matches the stored password
+    # Method to check if a given password matches the stored password hash (slow by design: run it on a pool)
     def check_password(self, password):
-        return self.__password == password
+        return not self.is_locked() and verify_password(self.__password, password)
+
+    # Method to check whether the account can no longer sign in (its personal details were anonymized)
+    def is_locked(self):
+        return self.__password in (None, LOCKED_PASSWORD)
+
+    # Method to retrieve the stored password hash (used when journaling account changes)
+    def get_password(self):
+        return self.__password
+
+    # Method to replace the stored password hash
+    def set_password(self, password):
+        self.__password = password
+
+    # Method to retrieve the work factor of the stored hash (None for a password saved in plaintext)
+    def get_password_cost(self):
+        parsed = None if self.__password is None else parse_password_hash(self.__password)
+        return None if parsed is None else parsed[1]
+
+    # Methods to update the user's name and email
+    def set_name(self, name):
+        self.__name = name
+
+    def set_email(self, email):
+        self.__email = email
+
+    # Method to restore a user pickled before the class used __slots__
+    def __setstate__(self, state):
+        restore_slots(self, state)
 
     # String representation of a User object
     def __str__(self):
@@ -41,23 +208,83 @@ class User:
 
 # Customer class inherits from User (Inheritance)
 class Customer(User):
+    __slots__ = ("__phone_number", "__reservations", "__cancelled", "__deleted", "__version")
+
     # Constructor to initialize customer-specific attributes
     def __init__(self, user_id, name, email, password, phone_number):
         super().__init__(user_id, name, email, password)  # Call to parent constructor
         self.__phone_number = phone_number  # Private attribute for customer phone number
         self.__reservations = []  # Aggregation: Customer has a list of reservations
+        self.__cancelled = 0  # Cancelled reservations still in the list until they are swept out
+        self.__deleted = None  # Journal position of the account's deletion: a tombstone until the list is swept
+        self.__version = 1  # Changes made to the profile, for optimistic concurrency checks
 
     # Method to add a reservation to the customer's list
     def add_reservation(self, reservation):
         self.__reservations.append(reservation)
 
+    # Method to note that one of the reservations was cancelled (it stays in the list as a tombstone)
+    def note_cancellation(self):
+        self.__cancelled += 1
+
+    # Method to drop the cancelled reservations from the list
+    def sweep_cancelled(self):
+        if self.__cancelled:
+            self.__reservations[:] = [reservation for reservation in self.__reservations
+                                      if reservation.get_cancelled() is None]
+            self.__cancelled = 0
+
     # Method to retrieve the customer's phone number
     def get_phone_number(self):
         return self.__phone_number
 
-    # Method to retrieve all reservations for the customer
+    # Method to update the customer's phone number
+    def set_phone_number(self, phone_number):
+        self.__phone_number = phone_number
+
+    # Method to retrieve all active reservations for the customer
     def get_reservations(self):
-        return self.__reservations
+        if not self.__cancelled:
+            return self.__reservations
+        return [reservation for reservation in self.__reservations if reservation.get_cancelled() is None]
+
+    # Method to count the customer's active reservations without building a list
+    def count_reservations(self):
+        return len(self.__reservations) - self.__cancelled
+
+    # Methods to mark the account deleted by the journal record at the given position, and to read the mark
+    def set_deleted(self, lsn):
+        self.__deleted = lsn
+
+    def get_deleted(self):
+        return self.__deleted
+
+    # Methods to set and retrieve the profile's version
+    def set_version(self, version):
+        self.__version = version
+
+    def get_version(self):
+        return self.__version
+
+    # Method to flatten the customer into a record (reservations are rebuilt from the reservation records)
+    def to_record(self):
+        return (self.get_user_id(), self.get_name(), self.get_email(), self.get_password(), self.__phone_number,
+                self.__version)
+
+    # Method to rebuild a customer from a record
+    @classmethod
+    def from_record(cls, record):
+        customer = cls(*record[:5])
+        if len(record) > 5:
+            customer.__version = record[5]  # Format 5 records carry the version
+        return customer
+
+    # Method to restore a customer pickled before cancellations were kept as tombstones
+    def __setstate__(self, state):
+        self.__cancelled = 0  # Not present in older pickles
+        self.__deleted = None
+        self.__version = 1
+        super().__setstate__(state)
 
     # String representation of a Customer object
     def __str__(self):
@@ -65,6 +292,8 @@ class Customer(User):
 
 # Admin class inherits from User (Inheritance)
 class Admin(User):
+    __slots__ = ("__role",)
+
     # Constructor to initialize admin-specific attributes
     def __init__(self, user_id, name, email, password, role):
         super().__init__(user_id, name, email, password)  # Call to parent constructor
@@ -74,12 +303,25 @@ class Admin(User):
     def get_role(self):
         return self.__role
 
+    # Method to flatten the admin into a record
+    def to_record(self):
+        return (self.get_user_id(), self.get_name(), self.get_email(), self.get_password(), self.__role)
+
+    # Method to rebuild an admin from a record
+    @classmethod
+    def from_record(cls, record):
+        return cls(*record)
+
     # String representation of an Admin object
     def __str__(self):
         return f"Admin: {self.get_name()} (Role: {self.__role})"
 
 # Class representing a Ticket
 class Ticket:
+    # Fixed attribute layout: no per-object __dict__
+    __slots__ = ("__ticket_id", "__ticket_type", "__price", "__validity", "__description", "__limitations",
+                 "__discount", "__version")
+
     # Constructor to initialize ticket attributes
     def __init__(self, ticket_id, ticket_type, price, validity, description, limitations, discount=None):
         self.__ticket_id = ticket_id  # Private attribute for ticket ID
@@ -89,6 +331,7 @@ class Ticket:
         self.__description = description  # Private attribute for ticket description
         self.__limitations = limitations  # Private attribute for ticket limitations
         self.__discount = discount  # Private attribute for optional discount
+        self.__version = 1  # Changes made to the ticket, for optimistic concurrency checks
 
     # Getter methods for ticket attributes
     def get_ticket_id(self):
@@ -116,24 +359,71 @@ class Ticket:
     def set_price(self, new_price):
         self.__price = new_price
 
+    # Method to retrieve the group discount percentage for a number of seats, parsed from the discount text
+    def get_group_discount(self, quantity):
+        match = GROUP_DISCOUNT_PATTERN.search(self.__discount or "")
+        if match is None or quantity < int(match.group(2)):
+            return 0
+        return float(match.group(1))
+
+    # Methods to set and retrieve the ticket's version
+    def set_version(self, version):
+        self.__version = version
+
+    def get_version(self):
+        return self.__version
+
+    # Method to flatten the ticket into a record
+    def to_record(self):
+        return (self.__ticket_id, self.__ticket_type, self.__price, self.__validity, self.__description,
+                self.__limitations, self.__discount, self.__version)
+
+    # Method to rebuild a ticket from a record
+    @classmethod
+    def from_record(cls, record):
+        ticket = cls(*record[:7])
+        if len(record) > 7:
+            ticket.__version = record[7]  # Format 5 records carry the version
+        return ticket
+
+    # Method to restore a ticket pickled before the class used __slots__
+    def __setstate__(self, state):
+        self.__version = 1  # Not present in older pickles
+        restore_slots(self, state)
+
     # String representation of a Ticket object
     def __str__(self):
         return f"{self.__ticket_type} - {self.__price} DHS"
 
 # Class representing a Reservation
 class Reservation:
+    # Fixed attribute layout: no per-object __dict__
+    __slots__ = ("__reservation_id", "__customer", "__ticket", "__date", "__payment", "__checked_in", "__cancelled",
+                 "__version")
+
     # Constructor to initialize reservation attributes
     def __init__(self, reservation_id, customer, ticket, date):
         self.__reservation_id = reservation_id  # Private attribute for reservation ID
         self.__customer = customer  # Composition: Reservation has a Customer
         self.__ticket = ticket  # Composition: Reservation has a Ticket
-        self.__date = date  # Private attribute for reservation date
+        self.__date = sys.intern(date)  # Private attribute for reservation date, shared by equal dates
         self.__payment = None  # Bidirectional Association: Reservation has a Payment
+        self.__checked_in = None  # Time the visitor was let in at the gate ("YYYY-MM-DD HH:MM:SS")
+        self.__cancelled = None  # Journal position of the cancellation: a tombstone until the lists are swept
+        self.__version = 1  # Changes made to the reservation, for optimistic concurrency checks
 
     # Method to associate a payment with the reservation
     def set_payment(self, payment):
         self.__payment = payment
 
+    # Method to record the time the visitor was checked in at the gate
+    def set_checked_in(self, checked_in):
+        self.__checked_in = checked_in
+
+    # Method to mark the reservation cancelled by the journal record at the given position
+    def set_cancelled(self, lsn):
+        self.__cancelled = lsn
+
     # Getter methods for reservation attributes
     def get_reservation_id(self):
         return self.__reservation_id
@@ -150,23 +440,82 @@ class Reservation:
     def get_payment(self):
         return self.__payment
 
+    def get_checked_in(self):
+        return self.__checked_in
+
+    def get_cancelled(self):
+        return self.__cancelled
+
+    # Methods to set and retrieve the reservation's version
+    def set_version(self, version):
+        self.__version = version
+
+    def get_version(self):
+        return self.__version
+
+    # Method to flatten the reservation into a record that refers to its customer, ticket and payment by ID
+    def to_record(self):
+        payment_id = self.__payment.get_payment_id() if self.__payment is not None else None
+        return (self.__reservation_id, self.__customer.get_user_id(), self.__ticket.get_ticket_id(), self.__date,
+                payment_id, self.__checked_in, self.__version)
+
+    # Method to rebuild a reservation from a record, looking its customer, ticket and payment up by ID
+    @classmethod
+    def from_record(cls, record, customers, tickets, payments=None):
+        reservation_id, customer_id, ticket_id, date, *rest = record  # Format 1 records have no payment ID
+        customer, ticket = customers.get(customer_id), tickets.get(ticket_id)
+        if customer is None or ticket is None:
+            return None  # The customer or ticket no longer exists
+        reservation = cls(reservation_id, customer, ticket, date)
+        if len(rest) > 1:
+            reservation.set_checked_in(rest[1])  # Format 3 records have the check-in time
+        if len(rest) > 2:
+            reservation.__version = rest[2]  # Format 5 records carry the version
+        payment = payments.get(rest[0]) if payments and rest else None
+        if payment is not None:
+            reservation.set_payment(payment)  # Seats of a group booking share one payment
+            if payment.get_reservation_id() == reservation_id:
+                payment.set_reservation(reservation)
+        return reservation
+
+    # Method to restore a reservation pickled before the class used __slots__
+    def __setstate__(self, state):
+        self.__checked_in = None  # Not present in older pickles
+        self.__cancelled = None
+        self.__version = 1
+        restore_slots(self, state)
+
     # String representation of a Reservation object
     def __str__(self):
         return f"Reservation {self.__reservation_id}: {self.__ticket.get_ticket_type()} for {self.__customer.get_name()} on {self.__date}"
 
 # Class representing a Payment
 class Payment:
+    # Fixed attribute layout: no per-object __dict__
+    __slots__ = ("__payment_id", "__amount", "__payment_method", "__date", "__reservation", "__reservation_id",
+                 "__quantity", "__refund_of", "__deleted")
+
     # Constructor to initialize payment attributes
-    def __init__(self, payment_id, amount, payment_method):
+    def __init__(self, payment_id, amount, payment_method, quantity=1):
         self.__payment_id = payment_id  # Private attribute for payment ID
         self.__amount = amount  # Private attribute for payment amount
         self.__payment_method = payment_method  # Private attribute for payment method
-        self.__date = datetime.now().strftime("%Y-%m-%d")  # Auto-generated payment date
-        self.__reservation = None  # Bidirectional Association: Payment has a Reservation
+        self.__date = sys.intern(datetime.now().strftime("%Y-%m-%d"))  # Auto-generated payment date, shared by equal dates
+        self.__reservation = None  # Bidirectional Association: Payment has a Reservation (the first of a group)
+        self.__reservation_id = None  # ID of the reservation, kept even if the reservation is removed
+        self.__quantity = quantity  # Number of seats paid for: more than one for a group booking
+        self.__refund_of = None  # ID of the payment this one refunds (its amount is negative)
+        self.__deleted = None  # Journal position of its customer's deletion: a tombstone until the list is swept
+
+    # Method to restore the original payment date when a payment is rebuilt from the journal
+    def set_date(self, date):
+        self.__date = sys.intern(date)
 
     # Method to associate a reservation with the payment
     def set_reservation(self, reservation):
         self.__reservation = reservation
+        if reservation is not None:
+            self.__reservation_id = reservation.get_reservation_id()
 
     # Getter methods for payment attributes
     def get_payment_id(self):
@@ -184,53 +533,2574 @@ class Payment:
     def get_reservation(self):
         return self.__reservation
 
+    def get_reservation_id(self):
+        if self.__reservation_id is None and self.__reservation is not None:
+            return self.__reservation.get_reservation_id()  # Payment pickled before the ID was kept
+        return self.__reservation_id
+
+    def get_quantity(self):
+        return self.__quantity
+
+    def get_refund_of(self):
+        return self.__refund_of
+
+    # Methods to mark the payment deleted with its customer, and to read the mark
+    def set_deleted(self, lsn):
+        self.__deleted = lsn
+
+    def get_deleted(self):
+        return self.__deleted
+
+    # Method to create the payment that refunds one seat of this payment when a reservation is cancelled
+    def refund(self, refund_id, date, reservation_id):
+        refund = Payment(refund_id, -self.get_seat_amount(), self.__payment_method)
+        refund.__date = sys.intern(date)
+        refund.__reservation_id = reservation_id  # By ID only, so the cancelled reservation can be dropped
+        refund.__refund_of = self.__payment_id
+        return refund
+
+    # Method to retrieve the share of the amount paid for one seat
+    def get_seat_amount(self):
+        return self.__amount if self.__quantity == 1 else self.__amount / self.__quantity
+
+    # Method to flatten the payment into a record that refers to its (first) reservation by ID
+    def to_record(self):
+        return (self.__payment_id, self.__amount, self.__payment_method, self.__date, self.get_reservation_id(),
+                self.__quantity, self.__refund_of)
+
+    # Method to rebuild a payment from a record (the reservation is linked by the caller)
+    @classmethod
+    def from_record(cls, record):
+        payment_id, amount, payment_method, date, reservation_id, *rest = record  # Format 1 has no quantity
+        payment = cls(payment_id, amount, payment_method, rest[0] if rest else 1)
+        payment.__date = sys.intern(date)
+        payment.__reservation_id = reservation_id
+        if len(rest) > 1:
+            payment.__refund_of = rest[1]  # Format 4 records name the payment they refund
+        return payment
+
+    # Method to restore a payment pickled before the class used __slots__
+    def __setstate__(self, state):
+        self.__reservation_id = None  # Not present in older pickles
+        self.__quantity = 1
+        self.__refund_of = None
+        self.__deleted = None
+        restore_slots(self, state)
+
     # String representation of a Payment object
     def __str__(self):
-        return f"Payment: {self.__payment_id} - Amount: {self.__amount} DHS, Method: {self.__payment_method}"
+        seats = f" for {self.__quantity} seats" if self.__quantity > 1 else ""
+        return f"Payment: {self.__payment_id} - Amount: {self.__amount} DHS{seats}, Method: {self.__payment_method}"
+
+# Environment variable that turns the instrumentation on (any value other than 0)
+INSTRUMENT_ENV = "ADVENTURELAND_PROFILE"
+
+# Environment variable naming a file the measurements are written to on exit (.json, otherwise Prometheus text)
+INSTRUMENT_FILE_ENV = "ADVENTURELAND_PROFILE_FILE"
+
+# Upper bounds in seconds of the latency histogram buckets (slower calls land in a last, open bucket)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Files the Diagnostics screen exports to, the file a profile is saved to and the functions shown from it
+DIAGNOSTICS_FILES = {"JSON": "diagnostics.json", "Prometheus": "diagnostics.prom"}
+PROFILE_FILE = "adventureland.prof"
+PROFILE_TOP_FUNCTIONS = 25
+
+
+# Class collecting call counts, latency histograms and bytes written per snapshot file, when enabled
+class Instrumentation:
+    # Constructor to initialize the counters (a disabled instance leaves measured functions untouched)
+    def __init__(self, enabled=False, output=None):
+        self.__enabled = enabled
+        self.__output = output  # File written by write_output (None: nothing is written)
+        self.__lock = threading.Lock()  # Operations are measured on the window, server and worker threads
+        self.__latencies = {}  # Operation -> [calls, total seconds, slowest, calls per bucket]
+        self.__written = {}  # Snapshot file name -> [writes, bytes]
+        self.__profiler = None  # cProfile.Profile while a capture is running
+        self.__started = time.time()
+
+    # Method to wrap a function so its calls are timed (when disabled the function itself is returned)
+    def measure(self, name):
+        def decorate(function):
+            if not self.__enabled:
+                return function  # Nothing is added to the call when the instrumentation is off
+
+            @functools.wraps(function)
+            def measured(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return measured
+        return decorate
+
+    # Method to start timing an operation that finishes in a later callback (None when disabled)
+    def start(self):
+        return time.perf_counter() if self.__enabled else None
+
+    # Method to finish timing an operation started with start
+    def stop(self, name, started):
+        if started is not None:
+            self.record(name, time.perf_counter() - started)
+
+    # Method to add one call of an operation to its histogram
+    def record(self, name, seconds):
+        bucket = bisect_left(LATENCY_BUCKETS, seconds)  # A call taking exactly a bound counts towards it
+        with self.__lock:
+            entry = self.__latencies.get(name)
+            if entry is None:
+                entry = self.__latencies[name] = [0, 0.0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3][bucket] += 1
+
+    # Method to count the bytes written to a snapshot file (temporary names count towards the file they replace)
+    def count_bytes(self, filename, size):
+        if not self.__enabled:
+            return
+        name = re.sub(r"\.\d+\.tmp$", "", os.path.basename(filename))
+        with self.__lock:
+            entry = self.__written.setdefault(name, [0, 0])
+            entry[0] += 1
+            entry[1] += size
+
+    # Method to forget everything measured so far
+    def reset(self):
+        with self.__lock:
+            self.__latencies.clear()
+            self.__written.clear()
+            self.__started = time.time()
+
+    # Method to copy the measurements as plain data, with quantiles estimated from the buckets
+    def get_snapshot(self):
+        with self.__lock:
+            latencies = {name: (calls, total, slowest, list(buckets))
+                         for name, (calls, total, slowest, buckets) in self.__latencies.items()}
+            written = {name: tuple(entry) for name, entry in self.__written.items()}
+
+        # Upper bound of the bucket holding a quantile (the slowest call for the open bucket)
+        def quantile(calls, slowest, buckets, fraction):
+            for bound, cumulative in zip(LATENCY_BUCKETS, accumulate(buckets)):
+                if cumulative >= calls * fraction:
+                    return min(bound, slowest)
+            return slowest
+
+        operations = {}
+        for name, (calls, total, slowest, buckets) in sorted(latencies.items()):
+            operations[name] = {
+                "calls": calls, "total_seconds": total, "mean_ms": total / calls * 1000, "max_ms": slowest * 1000,
+                "p50_ms": quantile(calls, slowest, buckets, 0.5) * 1000,
+                "p95_ms": quantile(calls, slowest, buckets, 0.95) * 1000,
+                "buckets": {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ("+Inf",),
+                                                                    accumulate(buckets))},  # Cumulative, as "le"
+            }
+        since = datetime.fromtimestamp(self.__started).isoformat(timespec="seconds")
+        return {"enabled": self.__enabled, "since": since, "operations": operations,
+                "files": {name: {"writes": writes, "bytes": size} for name, (writes, size) in sorted(written.items())}}
+
+    # Method to render the measurements in the Prometheus text exposition format
+    def to_prometheus(self):
+        snapshot = self.get_snapshot()
+        lines = ["# HELP adventureland_operation_seconds Time spent in each instrumented operation",
+                 "# TYPE adventureland_operation_seconds histogram"]
+        for name, operation in snapshot["operations"].items():
+            for bound, count in operation["buckets"].items():
+                lines.append(f'adventureland_operation_seconds_bucket{{operation="{name}",le="{bound}"}} {count}')
+            lines.append(f'adventureland_operation_seconds_sum{{operation="{name}"}} {operation["total_seconds"]}')
+            lines.append(f'adventureland_operation_seconds_count{{operation="{name}"}} {operation["calls"]}')
+        for metric, key, text in (("snapshot_writes_total", "writes", "Snapshot files written"),
+                                  ("snapshot_bytes_written_total", "bytes", "Bytes written to each snapshot file")):
+            lines += [f"# HELP adventureland_{metric} {text}", f"# TYPE adventureland_{metric} counter"]
+            for name, entry in snapshot["files"].items():
+                lines.append(f'adventureland_{metric}{{file="{name}"}} {entry[key]}')
+        return "\n".join(lines) + "\n"
+
+    # Method to write the measurements to a file, as JSON for a .json name and as Prometheus text otherwise
+    def export(self, path):
+        text = json.dumps(self.get_snapshot(), indent=2) if path.endswith(".json") else self.to_prometheus()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(temp_path, path)  # A scraper never reads a half-written file
+        return path
+
+    # Method to write the measurements to the file named by the environment, if any
+    def write_output(self):
+        if self.__enabled and self.__output:
+            self.export(self.__output)
+
+    # Method to start a cProfile capture of the calling thread (False if one is already running)
+    def start_profile(self):
+        with self.__lock:
+            if self.__profiler is not None:
+                return False
+            self.__profiler = cProfile.Profile()
+        self.__profiler.enable()
+        return True
+
+    # Method to stop the capture, save it for pstats/snakeviz and return the slowest functions as text
+    def stop_profile(self, path, limit=PROFILE_TOP_FUNCTIONS):
+        with self.__lock:
+            profiler, self.__profiler = self.__profiler, None
+        if profiler is None:
+            return None
+        profiler.disable()
+        profiler.dump_stats(path)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(limit)
+        return report.getvalue()
+
+    # Getter methods for whether measurements are taken and whether a profile is being captured
+    def is_enabled(self):
+        return self.__enabled
+
+    def is_profiling(self):
+        return self.__profiler is not None
+
+
+# Measurements shared by the whole program, switched on by the environment when it starts
+INSTRUMENTS = Instrumentation(os.environ.get(INSTRUMENT_ENV, "0") not in ("", "0"), os.environ.get(INSTRUMENT_FILE_ENV))
+
+
+# Magic bytes that start a snapshot file written with a checksummed header
+SNAPSHOT_MAGIC = b"ALSNAP\r\n"
+
+# Snapshot header: magic, header version, record count, payload length, SHA-256 of the payload and generation
+# (the journal position of the compaction that wrote the file, -1 for a file written on its own); version 3 has
+# the same layout, and record snapshots written in chunks
+SNAPSHOT_HEADER = struct.Struct(">8sHQQ32sq")
+SNAPSHOT_HEADER_VERSION = 3
+
+# Header written before snapshots carried a generation, and the magic and version every header starts with
+SNAPSHOT_HEADER_V1 = struct.Struct(">8sHQQ32s")
+SNAPSHOT_HEADER_PREFIX = struct.Struct(">8sH")
+
+# Number of previous versions kept of every snapshot file (name.1 is the newest)
+SNAPSHOT_BACKUPS = 2
+
+# Bytes read and hashed at a time when a snapshot is loaded
+SNAPSHOT_CHUNK_SIZE = 1 << 20
+
+
+# Exception raised when a snapshot file is truncated or fails its checksum
+class CorruptSnapshotError(ValueError):
+    pass
+
+
+# Class representing a file wrapper that hashes everything written through it
+class HashingWriter:
+    # Constructor to initialize the wrapper around an open binary file
+    def __init__(self, file):
+        self.__file = file
+        self.__checksum = hashlib.sha256()
+        self.__length = 0
+
+    # Method called by pickle with each chunk of serialized data
+    def write(self, data):
+        self.__checksum.update(data)
+        self.__length += len(data)
+        return self.__file.write(data)
+
+    # Getter methods for the bytes written and their digest
+    def get_length(self):
+        return self.__length
+
+    def get_digest(self):
+        return self.__checksum.digest()
+
+
+# Function to count the records held by a snapshot, for its header
+def count_records(data):
+    if isinstance(data, tuple) and data[:1] == (RECORD_SNAPSHOT_TAG,):
+        return len(data[2])
+    return len(data) if isinstance(data, (list, dict)) else 1
+
+
+# Function to write data to a file with a checksummed header and fsync it, hashing while pickling
+# (returns the number of bytes written)
+@INSTRUMENTS.measure("write_snapshot")
+def write_snapshot(filename, data, generation=None):
+    with open(filename, 'wb') as file:
+        file.write(bytes(SNAPSHOT_HEADER.size))  # Room for the header, filled in once the payload is known
+        writer = HashingWriter(file)
+        if isinstance(data, tuple) and data[:1] == (RECORD_SNAPSHOT_TAG,):
+            # Flat records go a chunk at a time, so a reader can stream them
+            pickle.dump((RECORD_CHUNKS_TAG, data[1], len(data[2])), writer)
+            for start in range(0, len(data[2]), RECORD_CHUNK_SIZE):
+                pickle.dump(data[2][start:start + RECORD_CHUNK_SIZE], writer)
+        else:
+            pickle.dump(data, writer)  # Serialize, hash and write the data in one pass
+        file.seek(0)
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_HEADER_VERSION, count_records(data),
+                                        writer.get_length(), writer.get_digest(),
+                                        -1 if generation is None else generation))
+        file.flush()
+        os.fsync(file.fileno())  # On disk before it can replace the previous version
+    INSTRUMENTS.count_bytes(filename, SNAPSHOT_HEADER.size + writer.get_length())
+    return SNAPSHOT_HEADER.size + writer.get_length()
+
+
+# Function to install a written snapshot over a file, keeping the previous versions in rotation
+@INSTRUMENTS.measure("install_snapshot")
+def install_snapshot(temp_filename, filename):
+    if SNAPSHOT_BACKUPS and os.path.exists(filename):
+        for number in range(SNAPSHOT_BACKUPS - 1, 0, -1):
+            if os.path.exists(f"{filename}.{number}"):
+                os.replace(f"{filename}.{number}", f"{filename}.{number + 1}")
+        if os.path.exists(f"{filename}.1"):
+            os.remove(f"{filename}.1")  # Not moved along above when SNAPSHOT_BACKUPS is 1: the oldest goes
+        try:
+            os.link(filename, f"{filename}.1")  # The current version stays in place until the replace below
+        except OSError:
+            shutil.copyfile(filename, f"{filename}.1")  # File system without hard links
+    os.replace(temp_filename, filename)  # Readers see the old or the new version, never a partial one
 
-# Function to save data to a file using pickle
-def save_data(filename, data):
-    with open(filename, 'wb') as file:  # Open file in write-binary mode
-        pickle.dump(data, file)  # Serialize and save data to the file
 
-# Function to load data from a file using pickle
+# Function to make renames in a directory durable (not possible on every platform)
+def sync_directory(directory):
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# Function to save data to a file atomically: temporary file, fsync, rename
+@INSTRUMENTS.measure("save_data")
+def save_data(filename, data):
+    temp_filename = f"{filename}.{os.getpid()}.tmp"
+    write_snapshot(temp_filename, data)
+    install_snapshot(temp_filename, filename)
+    sync_directory(os.path.dirname(filename))
+
+
+# Function to read a snapshot header: None for a file written before headers, otherwise
+# (record count, payload length, digest, generation), with no generation for a header written before generations
+def read_snapshot_header(filename, file):
+    prefix = file.read(SNAPSHOT_HEADER_PREFIX.size)
+    if not prefix.startswith(SNAPSHOT_MAGIC):
+        file.seek(0)
+        return None
+    if len(prefix) < SNAPSHOT_HEADER_PREFIX.size:
+        raise CorruptSnapshotError(f"{filename} is truncated")
+    version = SNAPSHOT_HEADER_PREFIX.unpack(prefix)[1]
+    if version > SNAPSHOT_HEADER_VERSION:
+        raise ValueError(f"{filename} was written by a newer version (header {version})")
+    layout = SNAPSHOT_HEADER if version >= 2 else SNAPSHOT_HEADER_V1
+    header = prefix + file.read(layout.size - len(prefix))
+    if len(header) < layout.size:
+        raise CorruptSnapshotError(f"{filename} is truncated")
+    _, _, count, length, digest, *generation = layout.unpack(header)
+    generation = generation[0] if generation and generation[0] >= 0 else None
+    return count, length, digest, generation
+
+
+# Function to read only the generation of a snapshot file (None for a file that does not belong to a set)
+def read_snapshot_generation(filename):
+    with open(filename, 'rb') as file:
+        header = read_snapshot_header(filename, file)
+    return None if header is None else header[3]
+
+
+# Function to read one snapshot file, verifying its checksum before it is unpickled
+def read_snapshot(filename):
+    with open(filename, 'rb') as file:
+        header = read_snapshot_header(filename, file)
+        if header is None:  # Written before snapshots had headers
+            return load_snapshot_payload(filename, file)
+        count, length, digest, _ = header
+        payload = file.read(length)  # Read once; unpickled from the same buffer
+        if len(payload) < length or file.read(1) or hashlib.sha256(payload).digest() != digest:
+            raise CorruptSnapshotError(f"{filename} is truncated or fails its checksum")
+    data = load_snapshot_payload(filename, io.BytesIO(payload))
+    if count_records(data) != count:
+        raise CorruptSnapshotError(f"{filename} holds {count_records(data)} records instead of {count}")
+    return data
+
+
+# Function to open a snapshot file for streaming, verifying its checksum a block at a time (returns the open file,
+# positioned at the payload)
+def open_snapshot(filename):
+    file = open(filename, 'rb')
+    try:
+        header = read_snapshot_header(filename, file)
+        if header is not None:
+            start = file.tell()
+            checksum = hashlib.sha256()
+            read = 0
+            while read < header[1]:
+                block = file.read(min(SNAPSHOT_CHUNK_SIZE, header[1] - read))
+                if not block:
+                    break
+                checksum.update(block)
+                read += len(block)
+            if read < header[1] or file.read(1) or checksum.digest() != header[2]:
+                raise CorruptSnapshotError(f"{filename} is truncated or fails its checksum")
+            file.seek(start)
+        return file
+    except BaseException:
+        file.close()
+        raise
+
+
+# Function to unpickle a snapshot payload from a file, joining the chunks of a record snapshot into one list
+def load_snapshot_payload(filename, file):
+    chunks = iter_snapshot_records(filename, file)
+    data = next(chunks)
+    if isinstance(data, tuple) and data[:1] == (RECORD_CHUNKS_TAG,):
+        records = []
+        for chunk in chunks:
+            records.extend(chunk)
+        data = (RECORD_SNAPSHOT_TAG, data[1], records)
+    return data
+
+
+# Function to unpickle a snapshot payload from a file: yields the payload, then for a record snapshot written in
+# chunks, each list of records in turn
+def iter_snapshot_records(filename, file):
+    try:
+        data = pickle.load(file)
+        yield data
+        if isinstance(data, tuple) and data[:1] == (RECORD_CHUNKS_TAG,):
+            remaining = data[2]
+            while remaining > 0:
+                chunk = pickle.load(file)
+                remaining -= len(chunk)
+                yield chunk
+    except Exception as error:
+        raise CorruptSnapshotError(f"{filename} is damaged ({error})")
+
+
+# Function to load data from a file using pickle, falling back to the newest readable previous version
+@INSTRUMENTS.measure("load_data")
 def load_data(filename):
+    damaged = None
+    for path in [filename] + [f"{filename}.{number}" for number in range(1, SNAPSHOT_BACKUPS + 1)]:
+        try:
+            data = read_snapshot(path)
+        except FileNotFoundError:
+            continue
+        except CorruptSnapshotError as error:
+            damaged = damaged or error
+            continue
+        if path != filename:
+            print(f"Warning: {damaged or f'{filename} is missing'}; recovered {path}", file=sys.stderr)
+        return data
+    if damaged is not None:
+        raise CorruptSnapshotError(f"{damaged}, and no previous version could be read")
+
+    # If the file doesn't exist, create a default admin for admin data
+    if os.path.basename(filename) == "admins.pkl":
+        default_admin = Admin(1, "Admin", "admin@admin.com", hash_password("test1234"), "Admin")
+        save_data(filename, [default_admin])  # Save the default admin to the file
+        return [default_admin]
+    # Return an empty list for other data files
+    return []
+
+# Function to normalise an email address for lookups and uniqueness checks
+def normalize_email(email):
+    return email.strip().lower()
+
+# Name of the file holding the sales metrics that match the snapshots
+METRICS_FILE = "metrics.pkl"
+
+
+# Class representing running sales counters, kept up to date as tickets are sold and cancelled
+class SalesMetrics:
+    # Constructor to initialize the counters, optionally from a saved state
+    def __init__(self, state=None):
+        state = state or {}
+        self.__by_day = dict(state.get("by_day", {}))  # Payment date -> [tickets, revenue]
+        self.__by_ticket_type = dict(state.get("by_ticket_type", {}))  # Ticket type -> [tickets, revenue]
+        self.__by_method = dict(state.get("by_method", {}))  # Payment method -> [tickets, revenue]
+        self.__totals = list(state.get("totals", [0, 0]))  # All-time [tickets, revenue]
+        self.__cancelled = dict(state.get("cancelled", {}))  # Ticket type -> [tickets, revenue] cancelled
+        # Payment date of the cancelled sale -> ticket type -> [tickets, revenue] (not kept before it was added,
+        # so older cancellations only show in reports over every date)
+        self.__cancelled_by_day = {day: dict(value) for day, value in state.get("cancelled_by_day", {}).items()}
+
+    # Method to count a sale
+    def record_sale(self, payment_date, ticket_type, payment_method, amount, quantity=1):
+        self.__add(payment_date, ticket_type, payment_method, quantity, amount)
+
+    # Method to take a cancelled sale back out of the counters
+    def record_cancellation(self, payment_date, ticket_type, payment_method, amount, quantity=1):
+        self.__add(payment_date, ticket_type, payment_method, -quantity, -amount)
+        for counter in (self.__cancelled.setdefault(ticket_type, [0, 0]),
+                        self.__cancelled_by_day.setdefault(payment_date, {}).setdefault(ticket_type, [0, 0])):
+            counter[0] += quantity
+            counter[1] += amount
+
+    # Method to take the sale of a deleted customer out of the counters, without counting it as cancelled
+    def record_removal(self, payment_date, ticket_type, payment_method, amount, quantity=1):
+        self.__add(payment_date, ticket_type, payment_method, -quantity, -amount)
+
+    # Method to apply a change to every counter
+    def __add(self, payment_date, ticket_type, payment_method, quantity, amount):
+        for counters, key in ((self.__by_day, payment_date), (self.__by_ticket_type, ticket_type),
+                              (self.__by_method, payment_method)):
+            counter = counters.setdefault(key, [0, 0])
+            counter[0] += quantity
+            counter[1] += amount
+        self.__totals[0] += quantity
+        self.__totals[1] += amount
+
+    # Method to retrieve the all-time (tickets, revenue) totals
+    def get_totals(self):
+        return tuple(self.__totals)
+
+    # Method to retrieve (tickets, revenue) for one payment date
+    def get_day(self, day):
+        return tuple(self.__by_day.get(day.strftime("%Y-%m-%d"), (0, 0)))
+
+    # Method to retrieve (tickets, revenue) for the payment dates between two dates, inclusive
+    def get_range(self, start, end):
+        tickets, revenue = 0, 0
+        day = start
+        while day <= end:  # One dictionary lookup per day in the range, however many sales there were
+            day_tickets, day_revenue = self.get_day(day)
+            tickets += day_tickets
+            revenue += day_revenue
+            day += timedelta(days=1)
+        return tickets, revenue
+
+    # Method to retrieve (tickets, revenue) for the last number of days, including today
+    def get_last_days(self, days, today=None):
+        today = today or datetime.now().date()
+        return self.get_range(today - timedelta(days=days - 1), today)
+
+    # Method to retrieve (tickets, revenue) from the first of the month until today
+    def get_month_to_date(self, today=None):
+        today = today or datetime.now().date()
+        return self.get_range(today.replace(day=1), today)
+
+    # Methods to retrieve the per-ticket-type and per-payment-method counters
+    def get_by_ticket_type(self):
+        return {key: tuple(value) for key, value in self.__by_ticket_type.items()}
+
+    def get_by_payment_method(self):
+        return {key: tuple(value) for key, value in self.__by_method.items()}
+
+    # Method to retrieve the (tickets, revenue) cancelled per ticket type, optionally only of the sales paid
+    # between two YYYY-MM-DD dates, inclusive
+    def get_cancelled_by_ticket_type(self, start_date=None, end_date=None):
+        if start_date is None and end_date is None:
+            return {key: tuple(value) for key, value in self.__cancelled.items()}
+        cancelled = {}
+        for day, by_ticket_type in self.__cancelled_by_day.items():  # One entry per payment day, not per sale
+            if (start_date is None or day >= start_date) and (end_date is None or day <= end_date):
+                for ticket_type, (tickets, revenue) in by_ticket_type.items():
+                    counter = cancelled.setdefault(ticket_type, [0, 0])
+                    counter[0] += tickets
+                    counter[1] += revenue
+        return {key: tuple(value) for key, value in cancelled.items()}
+
+    # Method to copy the counters into a plain dictionary that can be saved
+    def get_state(self):
+        return {
+            "by_day": {key: list(value) for key, value in self.__by_day.items()},
+            "by_ticket_type": {key: list(value) for key, value in self.__by_ticket_type.items()},
+            "by_method": {key: list(value) for key, value in self.__by_method.items()},
+            "totals": list(self.__totals),
+            "cancelled": {key: list(value) for key, value in self.__cancelled.items()},
+            "cancelled_by_day": {day: {key: list(value) for key, value in by_ticket_type.items()}
+                                 for day, by_ticket_type in self.__cancelled_by_day.items()},
+        }
+
+# Name of the file holding the ticket price history that matches the snapshots
+PRICE_HISTORY_FILE = "prices.pkl"
+
+
+# Class representing the ticket catalogue: tickets by ID, their price history and their rendered text
+class TicketCatalog:
+    # Constructor to initialize the catalogue, optionally with a saved price history
+    def __init__(self, tickets=(), history=None):
+        self.__tickets = {}  # Ticket ID -> ticket, in catalogue order
+        self.__history = {key: list(value) for key, value in (history or {}).items()}  # ID -> [(version, price, when)]
+        self.__rendered = {}  # Ticket ID -> (label, detail lines), dropped when its price changes
+        self.__choices = None  # [(ticket ID, label)] for the ticket dropdown, dropped when any ticket changes
+        for ticket in tickets:
+            self.add(ticket)
+
+    # Method to add a ticket (its current price is the first version when it has no history yet)
+    def add(self, ticket):
+        self.__tickets[ticket.get_ticket_id()] = ticket
+        self.__history.setdefault(ticket.get_ticket_id(), [(1, ticket.get_price(), None)])
+        self.__choices = None
+
+    # Method to find a ticket by ID in constant time
+    def get(self, ticket_id):
+        return self.__tickets.get(ticket_id)
+
+    # Method to check whether a ticket ID is in the catalogue
+    def __contains__(self, ticket_id):
+        return ticket_id in self.__tickets
+
+    # Method to change a ticket's price, recording the new version and forgetting the old rendered text
+    def set_price(self, ticket_id, price, changed_at=None):
+        ticket = self.__tickets.get(ticket_id)
+        if ticket is None:
+            return None
+        ticket.set_price(price)
+        history = self.__history.setdefault(ticket_id, [])
+        history.append((len(history) + 1, price, changed_at))
+        self.__rendered.pop(ticket_id, None)
+        self.__choices = None
+        return ticket
+
+    # Method to retrieve a ticket's prices as [(version, price, changed at)], oldest first
+    def get_price_history(self, ticket_id):
+        return list(self.__history.get(ticket_id, ()))
+
+    # Method to format a ticket's label and detail lines once per price
+    def __render(self, ticket_id):
+        rendered = self.__rendered.get(ticket_id)
+        if rendered is None:
+            ticket = self.__tickets[ticket_id]
+            details = [f"Price: ${ticket.get_price()}", f"Validity: {ticket.get_validity()}",
+                       f"Description: {ticket.get_description()}", f"Limitations: {ticket.get_limitations()}"]
+            if ticket.get_discount():  # If a discount is available, show it too
+                details.append(f"Discount: {ticket.get_discount()}")
+            rendered = self.__rendered[ticket_id] = (str(ticket), details)
+        return rendered
+
+    # Method to retrieve a ticket's label, such as "Single-Day Pass - 275 DHS"
+    def get_label(self, ticket_id):
+        return self.__render(ticket_id)[0]
+
+    # Method to retrieve the lines describing a ticket on the purchase page
+    def get_details(self, ticket_id):
+        return self.__render(ticket_id)[1]
+
+    # Method to retrieve (ticket ID, label) for every ticket, in catalogue order
+    def get_choices(self):
+        choices = self.__choices
+        if choices is None:
+            choices = self.__choices = [(ticket_id, self.get_label(ticket_id)) for ticket_id in list(self.__tickets)]
+        return choices
+
+    # Method to retrieve the price history for saving (the tickets themselves are in the ticket snapshot)
+    def get_state(self):
+        return {key: list(value) for key, value in self.__history.items()}
+
+
+# Name of the file holding the daily capacity caps that match the snapshots
+CAPACITY_FILE = "capacity.pkl"
+
+# Daily caps used until an admin changes them (ticket types without a cap are unlimited)
+DEFAULT_DAILY_CAPACITY = {"VIP Experience Pass": 50}
+
+
+# Class representing the seats sold and the daily cap for each (ticket type, visit date)
+class CapacityInventory:
+    # Constructor to initialize the caps, optionally from a saved state
+    def __init__(self, caps=None):
+        self.__caps = dict(caps or {})  # Ticket type -> daily cap
+        self.__booked = {}  # (ticket type, visit date) -> seats sold
+
+    # Method to set a ticket type's daily cap (None removes the cap)
+    def set_capacity(self, ticket_type, capacity):
+        if capacity is None:
+            self.__caps.pop(ticket_type, None)
+        else:
+            self.__caps[ticket_type] = capacity
+
+    # Method to retrieve a ticket type's daily cap, or None if it is unlimited
+    def get_capacity(self, ticket_type):
+        return self.__caps.get(ticket_type)
+
+    # Method to retrieve the seats sold for a ticket type on a visit date
+    def get_booked(self, ticket_type, date):
+        return self.__booked.get((ticket_type, date), 0)
+
+    # Method to retrieve the seats left for a ticket type on a visit date, or None if it is unlimited
+    def get_available(self, ticket_type, date):
+        capacity = self.__caps.get(ticket_type)
+        if capacity is None:
+            return None
+        return max(capacity - self.__booked.get((ticket_type, date), 0), 0)
+
+    # Method to check whether a number of seats can still be sold
+    def has_room(self, ticket_type, date, quantity=1):
+        available = self.get_available(ticket_type, date)
+        return available is None or available >= quantity
+
+    # Method to count seats as sold (replayed sales are counted even past a cap lowered later)
+    def reserve(self, ticket_type, date, quantity=1):
+        key = (ticket_type, date)
+        self.__booked[key] = self.__booked.get(key, 0) + quantity
+
+    # Method to give seats back when a reservation is cancelled
+    def release(self, ticket_type, date, quantity=1):
+        key = (ticket_type, date)
+        booked = self.__booked.get(key, 0) - quantity
+        if booked > 0:
+            self.__booked[key] = booked
+        else:
+            self.__booked.pop(key, None)
+
+    # Method to retrieve the caps for saving (seats sold are rebuilt from the reservations)
+    def get_state(self):
+        return dict(self.__caps)
+
+
+# Number of customers whose search text is kept in one block
+SEARCH_BLOCK_SIZE = 2048
+
+# Character written before each searchable field, so prefix searches can anchor on it
+SEARCH_FIELD_MARK = "\x1f"
+
+
+# Class representing a substring and prefix search index over customer names, emails and phone numbers
+class CustomerSearchIndex:
+    # Constructor to initialize the empty blocks and prefix list
+    def __init__(self, block_size=SEARCH_BLOCK_SIZE):
+        self.__block_size = block_size
+        self.__lines = []  # Per block: the lowercased search line of each slot ("" once removed)
+        self.__items = []  # Per block: the customer in each slot (None once removed)
+        self.__texts = []  # Per block: the lines joined into one string, or None until the next search
+        self.__offsets = []  # Per block: where each line starts in the joined string
+        self.__slots = {}  # Customer ID -> (block, position)
+        self.__tokens = []  # Sorted "token<mark>ID" keys for prefix searches: each name word, the email, the phone
+        self.__keys = {}  # Customer ID -> its keys in the sorted list
+
+    # Method to build the search line of a customer: every field marked, one line per customer
+    def __line(self, customer):
+        mark = SEARCH_FIELD_MARK
+        return (f"{mark}{customer.get_name().lower()}{mark}{customer.get_email().lower()}"
+                f"{mark}{customer.get_phone_number()}\n")
+
+    # Method to build the sorted-list keys of a customer
+    def __token_keys(self, customer):
+        tokens = set(customer.get_name().lower().split())
+        tokens.update((customer.get_email().lower(), customer.get_phone_number()))
+        return [f"{token}{SEARCH_FIELD_MARK}{customer.get_user_id()}" for token in tokens if token]
+
+    # Method to write a customer's search line into its slot, taking a new slot the first time
+    def __place(self, customer):
+        slot = self.__slots.get(customer.get_user_id())
+        if slot is None:
+            if not self.__lines or len(self.__lines[-1]) >= self.__block_size:
+                for blocks in (self.__lines, self.__items):
+                    blocks.append([])
+                self.__texts.append(None)
+                self.__offsets.append(None)
+            block = len(self.__lines) - 1
+            slot = self.__slots[customer.get_user_id()] = (block, len(self.__lines[block]))
+            self.__lines[block].append("")
+            self.__items[block].append(None)
+        block, position = slot
+        self.__lines[block][position] = self.__line(customer)
+        self.__items[block][position] = customer
+        self.__texts[block] = None  # Only this block is joined again
+
+    # Method to take a customer's keys out of the sorted list (binary search, one list shift per key)
+    def __forget_tokens(self, customer_id):
+        for key in self.__keys.pop(customer_id, ()):
+            position = bisect_left(self.__tokens, key)
+            if position < len(self.__tokens) and self.__tokens[position] == key:
+                del self.__tokens[position]
+
+    # Method to add a customer, or refresh it if it is already indexed
+    def add(self, customer):
+        self.__place(customer)
+        self.__forget_tokens(customer.get_user_id())
+        keys = self.__keys[customer.get_user_id()] = self.__token_keys(customer)
+        for key in keys:
+            self.__tokens.insert(bisect_left(self.__tokens, key), key)
+
+    # Method to index many customers at once, sorting the prefix keys a single time
+    def add_all(self, customers):
+        for customer in customers:
+            self.__place(customer)
+            self.__forget_tokens(customer.get_user_id())
+            self.__keys[customer.get_user_id()] = keys = self.__token_keys(customer)
+            self.__tokens.extend(keys)
+        self.__tokens.sort()
+
+    # Method to drop a customer from the index
+    def remove(self, customer):
+        slot = self.__slots.pop(customer.get_user_id(), None)
+        if slot is not None:
+            block, position = slot
+            self.__lines[block][position] = ""
+            self.__items[block][position] = None
+            self.__texts[block] = None
+        self.__forget_tokens(customer.get_user_id())
+
+    # Method to retrieve a block's joined text, joining it again if it changed
+    def __text(self, block):
+        if self.__texts[block] is None:
+            lines = self.__lines[block]
+            self.__texts[block] = "".join(lines)
+            self.__offsets[block] = [0] + list(accumulate(len(line) for line in lines))[:-1]
+        return self.__texts[block]
+
+    # Method to find customers whose name, email or phone contains the query (or starts with it)
+    def search(self, query, limit=100, prefix=False):
+        query = query.strip().lower().replace(SEARCH_FIELD_MARK, "").replace("\n", "")
+        if not query:
+            return []
+        if prefix and not any(character.isspace() for character in query):
+            return self.__search_prefix(query, limit)
+        needle = SEARCH_FIELD_MARK + query if prefix else query
+        results = []
+        for block in range(len(self.__lines)):
+            text = self.__text(block)
+            offsets, items = self.__offsets[block], self.__items[block]
+            position = text.find(needle)  # One C-level scan per block
+            while position != -1:
+                slot = bisect_right(offsets, position) - 1
+                results.append(items[slot])
+                if len(results) >= limit:
+                    return results
+                next_line = offsets[slot + 1] if slot + 1 < len(offsets) else len(text)
+                position = text.find(needle, next_line)  # At most one result per customer
+        return results
+
+    # Method to find customers with a name word, email or phone starting with the query, by binary search
+    def __search_prefix(self, query, limit):
+        results, seen = [], set()
+        position = bisect_left(self.__tokens, query)
+        while position < len(self.__tokens) and len(results) < limit:
+            key = self.__tokens[position]
+            if not key.startswith(query):
+                break
+            customer_id = int(key.rpartition(SEARCH_FIELD_MARK)[2])
+            if customer_id not in seen:
+                seen.add(customer_id)
+                block, slot = self.__slots[customer_id]
+                results.append(self.__items[block][slot])
+            position += 1
+        return results
+
+
+# Class representing an index of reservations by visit date and ticket type, for range and filter queries
+class ReservationSearchIndex:
+    # Constructor to initialize the empty index
+    def __init__(self):
+        self.__by_date = {}  # Visit date -> ticket type -> {reservation ID: reservation}
+        self.__dates = []  # Visit dates with reservations, sorted ("YYYY-MM-DD" sorts by date)
+
+    # Method to add a reservation
+    def add(self, reservation):
+        date = reservation.get_date()
+        by_type = self.__by_date.get(date)
+        if by_type is None:
+            by_type = self.__by_date[date] = {}
+            self.__dates.insert(bisect_left(self.__dates, date), date)
+        by_type.setdefault(reservation.get_ticket().get_ticket_type(), {})[
+            reservation.get_reservation_id()] = reservation
+
+    # Method to drop a reservation
+    def remove(self, reservation):
+        date, ticket_type = reservation.get_date(), reservation.get_ticket().get_ticket_type()
+        by_type = self.__by_date.get(date, {})
+        reservations = by_type.get(ticket_type, {})
+        reservations.pop(reservation.get_reservation_id(), None)
+        if not reservations:
+            by_type.pop(ticket_type, None)
+        if not by_type and date in self.__by_date:
+            del self.__by_date[date]
+            del self.__dates[bisect_left(self.__dates, date)]
+
+    # Method to find reservations by visit date range, ticket type and customers, ordered by date
+    def search(self, start_date=None, end_date=None, ticket_type=None, customers=None, limit=None):
+        results = []
+        if customers is not None:
+            # A few customers: check their own reservations instead of walking the dates
+            for customer in customers:
+                for reservation in customer.get_reservations():
+                    date = reservation.get_date()
+                    if ((start_date is None or date >= start_date) and (end_date is None or date <= end_date)
+                            and (ticket_type is None or reservation.get_ticket().get_ticket_type() == ticket_type)):
+                        results.append(reservation)
+            results.sort(key=lambda reservation: (reservation.get_date(), reservation.get_reservation_id()))
+            return results if limit is None else results[:limit]
+
+        # Walk only the dates in the range, found by binary search
+        first = 0 if start_date is None else bisect_left(self.__dates, start_date)
+        last = len(self.__dates) if end_date is None else bisect_right(self.__dates, end_date)
+        for date in self.__dates[first:last]:
+            by_type = self.__by_date[date]
+            for reservations in ([by_type.get(ticket_type, {})] if ticket_type else by_type.values()):
+                for reservation in reservations.values():
+                    results.append(reservation)
+                    if limit is not None and len(results) >= limit:
+                        return results
+        return results
+
+    # Method to count the reservations in a visit date range without building the list
+    def count(self, start_date=None, end_date=None, ticket_type=None):
+        first = 0 if start_date is None else bisect_left(self.__dates, start_date)
+        last = len(self.__dates) if end_date is None else bisect_right(self.__dates, end_date)
+        total = 0
+        for date in self.__dates[first:last]:
+            by_type = self.__by_date[date]
+            total += (len(by_type.get(ticket_type, ())) if ticket_type
+                      else sum(len(reservations) for reservations in by_type.values()))
+        return total
+
+
+# Class representing the active reservations as column arrays, for group-by and aggregate reports
+class SalesColumns:
+    # Constructor to initialize the empty columns
+    def __init__(self):
+        # (ticket type code, payment method code) -> [payment days, visit days, reservation IDs, seat amounts],
+        # each partition kept in payment date order so a date range is a slice found by bisection
+        self.__partitions = {}
+        self.__ticket_types = []
+        self.__ticket_type_codes = {}
+        self.__methods = []
+        self.__method_codes = {}
+        self.__seats_by_visit_day = Counter()  # Visit day -> seats
+        self.__leads_by_visit_day = {}  # Visit day -> Counter of days booked ahead -> seats
+        self.__leads = Counter()  # Days booked ahead -> seats, over every visit day
+        self.__day_numbers = {}  # Date string -> day number, as only a few thousand dates ever occur
+        self.__count = 0
+
+    # Method to encode a name as a small integer code, adding it to the dictionary if new
+    @staticmethod
+    def __code(names, codes, name):
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    # Method to encode a "YYYY-MM-DD" date as a day number (its ordinal)
+    def __day(self, date):
+        day = self.__day_numbers.get(date)
+        if day is None:
+            day = self.__day_numbers[date] = datetime.strptime(date, "%Y-%m-%d").toordinal()
+        return day
+
+    # Method to encode a reservation as (partition key, payment day, visit day, seat amount)
+    def __encode(self, reservation):
+        payment = reservation.get_payment()
+        ticket_code = self.__code(self.__ticket_types, self.__ticket_type_codes,
+                                  reservation.get_ticket().get_ticket_type())
+        if payment is None:  # Sold before payments were recorded
+            return (ticket_code, self.__code(self.__methods, self.__method_codes, "")), 0, \
+                self.__day(reservation.get_date()), 0.0
+        return ((ticket_code, self.__code(self.__methods, self.__method_codes, payment.get_payment_method())),
+                self.__day(payment.get_date()), self.__day(reservation.get_date()), payment.get_seat_amount())
+
+    # Method to find a reservation's row in its partition, or None
+    @staticmethod
+    def __find(partition, payment_day, reservation_id):
+        payment_days, _, reservation_ids, _ = partition
+        try:
+            return reservation_ids.index(reservation_id, bisect_left(payment_days, payment_day),
+                                         bisect_right(payment_days, payment_day))
+        except ValueError:
+            return None
+
+    # Method to add a reservation as a new row
+    def add(self, reservation):
+        key, payment_day, visit_day, amount = self.__encode(reservation)
+        partition = self.__partitions.get(key)
+        if partition is None:
+            partition = self.__partitions[key] = [array("i"), array("i"), array("q"), array("d")]
+        elif self.__find(partition, payment_day, reservation.get_reservation_id()) is not None:
+            return
+        payment_days = partition[0]
+        values = (payment_day, visit_day, reservation.get_reservation_id(), amount)
+        if not payment_days or payment_days[-1] <= payment_day:
+            for column, value in zip(partition, values):
+                column.append(value)  # Sales arrive in payment date order, so this is the usual case
+        else:
+            row = bisect_right(payment_days, payment_day)
+            for column, value in zip(partition, values):
+                column.insert(row, value)
+        self.__count_visit(visit_day, payment_day, 1)
+        self.__count += 1
+
+    # Method to add many reservations at once, sorted by payment date first so every row is appended
+    def add_all(self, reservations):
+        rows = sorted(((self.__encode(reservation), reservation.get_reservation_id()) for reservation in reservations),
+                      key=lambda row: row[0][1])
+        if self.__count:
+            raise ValueError("add_all() builds empty columns only")
+        visits = Counter()  # (visit day, payment day) -> seats, counted into the per-day counters at the end
+        for (key, payment_day, visit_day, amount), reservation_id in rows:
+            partition = self.__partitions.get(key)
+            if partition is None:
+                partition = self.__partitions[key] = [array("i"), array("i"), array("q"), array("d")]
+            partition[0].append(payment_day)
+            partition[1].append(visit_day)
+            partition[2].append(reservation_id)
+            partition[3].append(amount)
+            visits[visit_day, payment_day] += 1
+        for (visit_day, payment_day), seats in visits.items():
+            self.__count_visit(visit_day, payment_day, seats)
+        self.__count = len(rows)
+
+    # Method to drop a reservation's row
+    def remove(self, reservation):
+        key, payment_day, visit_day, _ = self.__encode(reservation)
+        partition = self.__partitions.get(key)
+        row = None if partition is None else self.__find(partition, payment_day, reservation.get_reservation_id())
+        if row is None:
+            return
+        for column in partition:
+            del column[row]
+        self.__count_visit(visit_day, payment_day, -1)
+        self.__count -= 1
+
+    # Method to count seats for a visit day and how far ahead they were booked
+    def __count_visit(self, visit_day, payment_day, seats):
+        self.__seats_by_visit_day[visit_day] += seats
+        if payment_day:
+            lead = max(visit_day - payment_day, 0)
+            leads = self.__leads_by_visit_day.get(visit_day)
+            if leads is None:
+                leads = self.__leads_by_visit_day[visit_day] = Counter()
+            leads[lead] += seats
+            self.__leads[lead] += seats
+
+    # Method to retrieve the number of rows
+    def get_count(self):
+        return self.__count
+
+    # Method to total seats and revenue per ticket type or payment method over a range of payment dates
+    def __group(self, by_method, start_date=None, end_date=None):
+        low = self.__day(start_date) if start_date else 1
+        high = self.__day(end_date) if end_date else datetime.max.toordinal()
+        totals = {}
+        for (ticket_code, method_code), (payment_days, _, _, amounts) in self.__partitions.items():
+            start, end = bisect_left(payment_days, low), bisect_right(payment_days, high)
+            if start == end:
+                continue
+            if numpy is not None:
+                revenue = float(numpy.frombuffer(amounts, dtype=amounts.typecode)[start:end].sum())
+            else:
+                revenue = sum(amounts[start:end])  # One pass over a slice of the column
+            name = self.__methods[method_code] if by_method else self.__ticket_types[ticket_code]
+            seats_total, revenue_total = totals.get(name, (0, 0.0))
+            totals[name] = (seats_total + end - start, revenue_total + revenue)
+        return totals
+
+    # Method to total seats and revenue by ticket type, optionally for a range of payment dates
+    def by_ticket_type(self, start_date=None, end_date=None):
+        return self.__group(False, start_date, end_date)
+
+    # Method to total seats and revenue by payment method, optionally for a range of payment dates
+    def by_payment_method(self, start_date=None, end_date=None):
+        totals = self.__group(True, start_date, end_date)
+        totals.pop("", None)  # Reservations sold before payments were recorded
+        return totals
+
+    # Method to count the seats booked for each visit date between two dates, inclusive
+    def attendance(self, start_date, end_date):
+        low, high = self.__day(start_date), self.__day(end_date)
+        return [(datetime.fromordinal(day).strftime("%Y-%m-%d"), self.__seats_by_visit_day.get(day, 0))
+                for day in range(low, high + 1)]
+
+    # Method to work out, from past visits, the share of seats that were booked at least N days ahead
+    def __booked_ahead_shares(self, before_day, max_days):
+        leads = Counter(self.__leads)
+        for visit_day, visit_leads in self.__leads_by_visit_day.items():
+            if visit_day >= before_day:
+                leads.subtract(visit_leads)  # Still to come: their bookings are not complete yet
+        histogram = [0] * (max_days + 1)
+        for lead, seats in leads.items():
+            histogram[min(lead, max_days)] += seats
+        total = sum(histogram)
+        if not total:
+            return None
+        return [seats / total for seats in reversed(list(accumulate(reversed(histogram))))]
+
+    # Method to forecast attendance for the coming days from the seats booked so far and past booking lead times
+    def forecast(self, today, days=14):
+        low = today.toordinal()
+        shares = self.__booked_ahead_shares(low, days)
+        forecast = []
+        for offset in range(days):
+            booked = self.__seats_by_visit_day.get(low + offset, 0)
+            share = shares[offset] if shares is not None else 0
+            expected = booked / share if share > 0 else booked  # No history yet: what is booked is the forecast
+            forecast.append(((today + timedelta(days=offset)).strftime("%Y-%m-%d"), booked, round(expected)))
+        return forecast
+
+
+# Name of the append-only change journal kept next to the snapshot files
+JOURNAL_FILE = "adventureland.journal"
+
+# Name of the file recording the last journal record folded into the snapshots
+SNAPSHOT_META_FILE = "snapshot.meta"
+
+# Snapshot file used for each in-memory collection
+SNAPSHOT_FILES = {
+    "customers": "customers.pkl",
+    "admins": "admins.pkl",
+    "tickets": "tickets.pkl",
+    "reservations": "reservations.pkl",
+    "payments": "payments.pkl",
+}
+
+# Files a compaction writes together, all tagged with the same generation (the meta file is installed last)
+SNAPSHOT_SET = tuple(SNAPSHOT_FILES.values()) + (METRICS_FILE, CAPACITY_FILE, PRICE_HISTORY_FILE,
+                                                 SNAPSHOT_META_FILE)
+
+# Size prefix written before every journal record
+RECORD_HEADER = struct.Struct(">I")
+
+
+# Function to read one size-prefixed journal record: EOFError at a clean end, None for a torn record
+def read_journal_record(file):
+    header = file.read(RECORD_HEADER.size)
+    if not header:
+        return EOFError
+    if len(header) < RECORD_HEADER.size:
+        return None
+    payload = file.read(RECORD_HEADER.unpack(header)[0])
+    try:
+        return pickle.loads(payload)
+    except Exception:
+        return None
+
+
+# Function to read a journal segment's header, or return None for a segment written without one
+def read_journal_header(file):
+    record = read_journal_record(file)
+    if isinstance(record, tuple) and record[:1] == ("segment",):
+        return record[1]
+    file.seek(0)  # Older segment: its first record is a change
+    return None
+
+
+# Function to read the complete records of one journal segment without changing it (a torn tail is left for the
+# store to cut off; a missing segment has no records)
+def read_journal_segment(path):
+    records = []
     try:
-        with open(filename, 'rb') as file:  # Open file in read-binary mode
-            return pickle.load(file)  # Load and deserialize data from the file
+        with open(path, 'rb') as file:
+            read_journal_header(file)
+            record = read_journal_record(file)
+            while record is not None and record is not EOFError:
+                records.append(record)
+                record = read_journal_record(file)
     except FileNotFoundError:
-        # If the file doesn't exist, create a default admin for admin data
-        if filename == "admins.pkl":
-            default_admin = Admin(1, "Admin", "admin@admin.com", "test1234", "Admin")
-            save_data(filename, [default_admin])  # Save the default admin to the file
-            return [default_admin]
-        # Return an empty list for other data files
-        return []
+        pass
+    return records
+
+
+# Function to read the journal without a Journal, which would start its sync thread and repair or create segments
+# (for readers such as the export); given a position, retired segments are read back to it as Journal.recover does
+def read_journal(path, after=None):
+    records = read_journal_segment(path + ".old") + read_journal_segment(path)
+    for number in range(1, SNAPSHOT_BACKUPS + 1 if after is not None else 1):
+        if records and records[0][0] <= after + 1:
+            break
+        records = read_journal_segment(f"{path}.old.{number}") + records
+    return records
+
+
+# Class representing the append-only change journal (write-ahead log), shared by every terminal
+class Journal:
+    # Constructor to initialize the journal location and the fsync batching policy
+    def __init__(self, path, sync_batch=32, sync_interval=1.0):
+        self.__path = path  # Path of the active journal segment
+        self.__old_path = path + ".old"  # Segment being compacted into the snapshots
+        self.__sync_batch = sync_batch  # Number of unsynced records that forces an fsync
+        self.__sync_interval = sync_interval  # Seconds an unsynced record may wait for an fsync
+        self.__segment_id = None  # Header of the active segment as last seen by this process
+        self.__offset = 0  # Bytes of that segment already read or written by this process
+        self.__file = None  # Append handle, opened lazily on the segment it was opened for
+        self.__file_segment_id = None
+        self.__written = 0  # Records appended by this process
+        self.__synced = 0  # Records appended by this process that are on stable storage
+        self.__record_count = 0  # Records in the active segment
+        self.__lock = threading.Lock()  # Serializes appends and rotation within this process
+        self.__sync_lock = threading.Lock()  # Serializes fsyncs, which run without holding the append lock
+
+        # Start the write-behind worker that fsyncs appended records off the caller's thread
+        self.__appended = queue.Queue()  # One item per append, None to stop
+        self.__syncer = threading.Thread(target=self.__sync_appended, name="journal-sync", daemon=True)
+        self.__syncer.start()
+
+    # Method to read every complete record, oldest segment first, repairing torn tails (caller holds the store lock);
+    # given a position, segments retired by earlier compactions are read too until the records reach back to it
+    def recover(self, after=None):
+        old_records = self.__read_segment(self.__old_path, 0)[1]
+        segment_id, records, offset = self.__read_segment(self.__path, 0)
+        if segment_id is None:
+            # A missing segment, or one written before segments had headers, is rewritten with a header
+            self.__create_segment(records)
+            segment_id, records, offset = self.__read_segment(self.__path, 0)
+        self.__segment_id, self.__offset = segment_id, offset
+        self.__record_count = len(records)
+        records = old_records + records
+        for number in range(1, SNAPSHOT_BACKUPS + 1 if after is not None else 1):
+            if records and records[0][0] <= after + 1:
+                break
+            records = self.__read_segment(f"{self.__old_path}.{number}", 0)[1] + records
+        return records
+
+    # Method to read the records other terminals appended since the last read (caller holds the store lock)
+    def read_new(self):
+        segment_id, records, offset = self.__read_segment(self.__path, self.__offset, self.__segment_id)
+        if records is not None:
+            self.__offset = offset
+            self.__record_count += len(records)
+            return records
+
+        # The segment was retired by a compaction: finish it, then read the new one from the start
+        old_id, old_records, _ = self.__read_segment(self.__old_path, self.__offset, self.__segment_id)
+        if segment_id is None or old_records is None:
+            return None  # The records in between are only in the snapshots now
+        self.__segment_id, self.__offset, self.__record_count = segment_id, 0, 0
+        new_records = self.read_new()
+        return None if new_records is None else old_records + new_records
+
+    # Method to read one segment from an offset, cutting off a record torn by a crash mid-write
+    def __read_segment(self, path, offset, expected_id=None):
+        records = []
+        try:
+            with open(path, 'r+b') as file:
+                segment_id = read_journal_header(file)
+                if expected_id is not None and segment_id != expected_id:
+                    return segment_id, None, 0  # A different segment than the one being followed
+                file.seek(max(offset, file.tell()))
+                while True:
+                    offset = file.tell()  # Start of the record being read
+                    record = read_journal_record(file)
+                    if record is None:
+                        file.truncate(offset)  # Drop a torn tail so later appends start on a record boundary
+                        break
+                    if record is EOFError:
+                        break
+                    records.append(record)
+        except FileNotFoundError:
+            return None, (None if expected_id is not None else records), 0
+        return segment_id, records, offset
+
+    # Method to start a new active segment with a unique header and the given records
+    def __create_segment(self, records=()):
+        temp_path = self.__path + ".tmp"
+        with open(temp_path, 'wb') as file:
+            for record in (("segment", os.urandom(8).hex()),) + tuple(records):
+                payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+                file.write(RECORD_HEADER.pack(len(payload)) + payload)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.__path)
+
+    # Method to append one record to the journal (caller holds the store lock and has read every new record)
+    def append(self, record):
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)  # Serialize only the change itself
+        data = RECORD_HEADER.pack(len(payload)) + payload  # Size prefix and record in one write
+        with self.__lock:
+            if self.__file is None or self.__file_segment_id != self.__segment_id:
+                self.__close_file()
+                self.__file = open(self.__path, 'ab')  # Open the active segment for appending
+                self.__file_segment_id = self.__segment_id
+            self.__file.write(data)
+            self.__file.flush()  # Hand the record to the OS so other terminals see it
+            self.__offset += len(data)
+            self.__written += 1
+            self.__record_count += 1
+        self.__appended.put(self.__written)  # The fsync happens on the worker, not on the caller's thread
+
+    # Method run by the write-behind worker: one fsync per batch of records or per interval, whichever comes first
+    def __sync_appended(self):
+        stopping = False
+        while not stopping:
+            if self.__appended.get() is None:
+                break
+            # Coalesce every record appended within the interval into the same fsync
+            deadline = time.monotonic() + self.__sync_interval
+            batch = 1
+            while batch < self.__sync_batch:
+                try:
+                    item = self.__appended.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch += 1
+            self.sync()
+
+    # Method to force every appended record to stable storage, while appends carry on
+    def sync(self):
+        with self.__sync_lock:
+            with self.__lock:
+                written = self.__written
+                # A duplicate handle stays valid even if the append handle is closed during the fsync
+                fd = os.dup(self.__file.fileno()) if self.__file is not None and written > self.__synced else None
+            if fd is not None:
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            self.__synced = max(self.__synced, written)
+
+    # Method to fsync and close the append handle (caller holds the lock)
+    def __close_file(self):
+        if self.__file is not None:
+            if self.__written > self.__synced:
+                os.fsync(self.__file.fileno())
+            self.__file.close()
+            self.__file = None
+        self.__synced = self.__written
+
+    # Method to tell whether records are waiting for an fsync
+    def has_pending(self):
+        return self.__written > self.__synced
+
+    # Method to retrieve the number of records appended by this process that are not yet on stable storage
+    def get_unsynced_count(self):
+        return self.__written - self.__synced
+
+    # Method to retrieve the number of records in the active segment
+    def get_record_count(self):
+        return self.__record_count
+
+    # Method to retire the active segment so it can be folded into a snapshot (caller holds the store lock)
+    def rotate(self):
+        with self.__lock:
+            self.__close_file()
+            os.replace(self.__path, self.__old_path)  # New appends go to a fresh segment
+            self.__create_segment()
+            self.__segment_id, _, self.__offset = self.__read_segment(self.__path, 0)
+            self.__record_count = 0
+
+    # Method to retire the compacted segment once the snapshot holding it is installed (caller holds the store
+    # lock), keeping as many earlier segments as snapshot backups so an older snapshot set can be brought up to date
+    def retire_old_segment(self):
+        for number in range(SNAPSHOT_BACKUPS, 0, -1):
+            source = f"{self.__old_path}.{number - 1}" if number > 1 else self.__old_path
+            if os.path.exists(source):
+                os.replace(source, f"{self.__old_path}.{number}")  # The oldest one is overwritten
+
+    # Method to tell whether a retired segment is still waiting to be discarded
+    def has_old_segment(self):
+        return os.path.exists(self.__old_path)
+
+    # Method to stop the write-behind worker, then fsync and close the journal
+    def close(self):
+        self.__appended.put(None)
+        self.__syncer.join()
+        with self.__lock:
+            self.__close_file()
+
+
+# Name of the file holding the highest ID handed out for each entity type
+ID_ALLOCATOR_FILE = "ids.pkl"
+
+# Name of the lock file guarding the ID high-water marks
+ID_LOCK_FILE = "ids.lock"
+
+
+# Class representing an exclusive advisory lock on a file, held across threads and processes
+class FileLock:
+    # Constructor to initialize the lock file path
+    def __init__(self, path):
+        self.__path = path
+        self.__file = None  # Open lock file while the lock is held
+        self.__thread_lock = threading.RLock()  # OS file locks do not exclude threads of the same process
+        self.__depth = 0  # Re-entrant acquisitions by the owning thread
+
+    # Method to block until the lock is held
+    def acquire(self):
+        self.__thread_lock.acquire()
+        self.__depth += 1
+        if self.__depth > 1:
+            return  # Already held by this thread
+        self.__file = open(self.__path, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:  # msvcrt gives up after about ten seconds, so keep asking
+                try:
+                    self.__file.seek(0)
+                    msvcrt.locking(self.__file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+
+    # Method to release the lock
+    def release(self):
+        self.__depth -= 1
+        if self.__depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self.__file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.__file.seek(0)
+                msvcrt.locking(self.__file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.__file.close()
+            self.__file = None
+        self.__thread_lock.release()
+
+    # Methods to use the lock in a with statement
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+# Class that hands out unique, increasing IDs per entity type in blocks
+class IdAllocator:
+    # Constructor to initialize the high-water mark file and the IDs already in use
+    def __init__(self, data_dir, block_size=32, in_use=None):
+        self.__path = os.path.join(data_dir, ID_ALLOCATOR_FILE)
+        self.__file_lock = FileLock(os.path.join(data_dir, ID_LOCK_FILE))
+        self.__lock = threading.Lock()  # Guards the blocks held by this process
+        self.__block_size = block_size  # IDs reserved per trip to the high-water mark file
+        self.__in_use = dict(in_use or {})  # Entity -> highest ID found in the loaded data
+        self.__blocks = {}  # Entity -> [next ID, end of block)
+
+    # Method to retrieve the next unused ID for an entity type
+    def next_id(self, entity):
+        with self.__lock:
+            block = self.__blocks.get(entity)
+            if block is None or block[0] >= block[1]:
+                block = self.__blocks[entity] = self.__reserve_block(entity)
+            next_id = block[0]
+            block[0] += 1
+            return next_id
+
+    # Method to reserve a block of IDs by raising the shared high-water mark
+    def __reserve_block(self, entity):
+        with self.__file_lock:  # Other processes wait here only once per block
+            try:
+                with open(self.__path, 'rb') as file:
+                    marks = pickle.load(file)
+            except FileNotFoundError:
+                marks = {}
+            start = max(marks.get(entity, 0), self.__in_use.get(entity, 0)) + 1
+            marks[entity] = start + self.__block_size - 1
+
+            # Replace the file in one step so a crash never leaves a lower mark behind
+            temp_path = self.__path + ".tmp"
+            with open(temp_path, 'wb') as file:
+                pickle.dump(marks, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.__path)
+        return [start, start + self.__block_size]
+
+
+# Class that runs a load once, in a background thread or in the first thread that needs its result
+class LoadGate:
+    # Constructor to initialize the gate around the function that does the loading
+    def __init__(self, load):
+        self.__load = load
+        self.__lock = threading.Lock()  # Makes sure the load is started only once
+        self.__loaded = threading.Event()  # Set when the load has finished or failed
+        self.__loader = None  # Thread running the load, once started
+        self.__error = None  # Exception the load raised, handed to every waiter
+
+    # Method to start the load in a background thread unless it has already started
+    def start(self):
+        with self.__lock:
+            if self.__loader is None:
+                self.__loader = threading.Thread(target=self.__run, name="history-loader", daemon=True)
+                self.__loader.start()
+
+    # Method to run the load and release every waiter, whether or not it succeeded
+    def __run(self):
+        try:
+            self.__load()
+        except BaseException as error:
+            self.__error = error
+        finally:
+            self.__loaded.set()
+
+    # Method to check whether the load has finished
+    def is_loaded(self):
+        return self.__loaded.is_set()
+
+    # Method to block until the load has finished, running it here if nothing has started it yet
+    def wait(self):
+        if not self.__loaded.is_set():
+            if threading.current_thread() is self.__loader:
+                return  # The load itself is filling the collections
+            with self.__lock:
+                run_here = self.__loader is None
+                if run_here:
+                    self.__loader = threading.current_thread()
+            if run_here:
+                self.__run()
+            self.__loaded.wait()
+        if self.__error is not None:
+            raise self.__error
 
 
-# Main Application class from tkinterto create the main application window
-class AdventureLandApp(tk.Tk):
-    # Constructor to initialize the main application window
-    def __init__(self):
-        super().__init__()  # Call the constructor of the parent Tk class
-        self.title("Adventure Land Theme Park")  # Set the title of the application window
-        self.geometry("800x700")  # Set the size of the application window (800x700 pixels)
+# Class representing a list that is filled by a LoadGate and waits for it on first access
+class LazyList(list):
+    # Constructor to initialize an empty list behind the gate
+    def __init__(self, gate):
+        super().__init__()
+        self.__gate = gate
 
-        # Load data from serialized files using the load_data function
-        self.customers = load_data("customers.pkl")  # Load customer data from file
-        self.admins = load_data("admins.pkl")  # Load admin data from file
-        self.tickets = load_data("tickets.pkl")  # Load ticket data from file
-        self.reservations = load_data("reservations.pkl")  # Load reservation data from file
-        self.payments = load_data("payments.pkl")  # Load payment data from file
+    # Methods that wait for the load before using the list
+    def __len__(self):
+        self.__gate.wait()
+        return super().__len__()
 
-        # Check if there are no tickets loaded, then initialize default tickets
-        if not self.tickets:
-            self.initialize_default_tickets()  # Initialize default tickets if none exist
+    def __iter__(self):
+        self.__gate.wait()
+        return super().__iter__()
 
-        self.current_user = None  # Set current user to None initially (no user logged in)
+    def __reversed__(self):
+        self.__gate.wait()
+        return super().__reversed__()
 
-        # Create the main menu of the application
-        self.create_main_menu()  # Call method to create and display the main menu
+    def __contains__(self, item):
+        self.__gate.wait()
+        return super().__contains__(item)
+
+    def __getitem__(self, index):
+        self.__gate.wait()
+        return super().__getitem__(index)
+
+    def __setitem__(self, index, value):
+        self.__gate.wait()
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index):
+        self.__gate.wait()
+        super().__delitem__(index)
+
+    def append(self, item):
+        self.__gate.wait()
+        super().append(item)
+
+    def extend(self, items):
+        self.__gate.wait()
+        super().extend(items)
+
+    def insert(self, index, item):
+        self.__gate.wait()
+        super().insert(index, item)
+
+    def remove(self, item):
+        self.__gate.wait()
+        super().remove(item)
+
+    def pop(self, index=-1):
+        self.__gate.wait()
+        return super().pop(index)
+
+    def index(self, item, *bounds):
+        self.__gate.wait()
+        return super().index(item, *bounds)
+
+    def count(self, item):
+        self.__gate.wait()
+        return super().count(item)
+
+    def sort(self, *, key=None, reverse=False):
+        self.__gate.wait()
+        super().sort(key=key, reverse=reverse)
+
+    def copy(self):
+        self.__gate.wait()
+        return super().copy()
+
+
+# Name of the lock file that serializes writes from every terminal sharing the data directory
+STORE_LOCK_FILE = "adventureland.lock"
+
+# Cancelled reservations (and deleted payments) left in a list before the background worker sweeps them out:
+# at least TOMBSTONE_SWEEP_MIN, or TOMBSTONE_SWEEP_RATIO of the list if that is more (deleted customers are
+# swept at the worker's next pass)
+TOMBSTONE_SWEEP_MIN = 1000
+TOMBSTONE_SWEEP_RATIO = 0.05
+
+
+# Base exception for booking requests that cannot be carried out
+class BookingError(Exception):
+    pass
+
+
+# Exception raised when a request has missing or invalid values
+class ValidationError(BookingError):
+    pass
+
+
+# Exception raised when credentials are wrong or missing
+class AuthenticationError(BookingError):
+    pass
+
+
+# Exception raised when a requested record does not exist
+class NotFoundError(BookingError):
+    pass
+
+
+# Exception raised when a ticket type has no seats left on the requested date
+class SoldOutError(BookingError):
+    pass
+
+
+# Exception raised when a record was changed or removed by another terminal since it was read
+class ConcurrencyError(BookingError):
+    pass
+
+
+# Exception raised when more logins are waiting for the password pool than it is allowed to queue
+class BusyError(BookingError):
+    pass
+
+
+# Sign-ins each password worker may have waiting before new ones are turned away
+PASSWORD_QUEUE_PER_WORKER = 8
+
+
+# Class that hashes and checks passwords on a pool of worker threads with a bounded queue
+class PasswordHasher:
+    # Constructor to initialize the work factor and start the pool (hashlib releases the GIL while hashing,
+    # so threads use every core without the pickling a process pool would need)
+    def __init__(self, cost=PASSWORD_HASH_COST, workers=None, max_pending=None):
+        self.__cost = cost
+        workers = workers or os.cpu_count() or 1
+        self.__pool = ThreadPoolExecutor(workers, thread_name_prefix="password-hasher")
+        self.__pending = threading.BoundedSemaphore(max_pending or workers * PASSWORD_QUEUE_PER_WORKER)
+        self.__dummy_hash = self.__pool.submit(hash_password, "", cost)  # Checked when there is no account
+
+    # Method to retrieve the work factor of new hashes
+    def get_cost(self):
+        return self.__cost
+
+    # Method to run a password job on the pool and return its Future, or refuse it when the queue is full
+    def submit(self, function, *args):
+        if not self.__pending.acquire(blocking=False):
+            raise BusyError("Too many sign-ins at once, please try again in a moment")
+        future = self.__pool.submit(function, *args)
+        future.add_done_callback(lambda _: self.__pending.release())
+        return future
+
+    # Method to hash a password at the current work factor (call it from a pool job)
+    def hash(self, password):
+        return hash_password(password, self.__cost)
+
+    # Method to check a password against a hash of the same work factor and fail (call it from a pool job), so
+    # an unknown or locked account takes as long to refuse as a wrong password
+    def verify_dummy(self, password):
+        verify_password(self.__dummy_hash.result(), password)
+        return False
+
+    # Method to check whether a user's stored hash is plaintext or uses another work factor
+    def needs_rehash(self, user):
+        return user.get_password_cost() != self.__cost
+
+    # Method to stop the worker threads once the queued jobs are done
+    def close(self):
+        self.__pool.shutdown()
+
+
+# Seconds a session stays valid after it was last used
+SESSION_TTL = 30 * 60
+
+# Most sessions kept at once; opening one more signs out the least recently used
+SESSION_LIMIT = 200000
+
+
+# Class that hands out signed session tokens and maps them back to (kind, user ID) in constant time
+class SessionTable:
+    # Constructor to initialize the signing key and the table, kept in least-recently-used order
+    def __init__(self, ttl=SESSION_TTL, limit=SESSION_LIMIT, secret=None):
+        self.__ttl = ttl
+        self.__limit = limit
+        self.__secret = secret or os.urandom(32)  # Tokens from another run fail their signature
+        self.__sessions = OrderedDict()  # Session ID -> [kind, user ID, expiry], oldest use first
+        self.__lock = threading.Lock()
+
+    # Method to sign a session ID
+    def __sign(self, session_id):
+        return hmac.new(self.__secret, session_id.encode(), hashlib.sha256).hexdigest()
+
+    # Method to split a token into its session ID, or None if the signature does not match (tokens handed out
+    # are ASCII; anything else is refused before the comparison, which only takes ASCII text)
+    def __verify(self, token):
+        token = token or ""
+        if not token.isascii():
+            return None
+        session_id, _, signature = token.partition(".")
+        if not hmac.compare_digest(self.__sign(session_id).encode(), signature.encode()):
+            return None
+        return session_id
+
+    # Method to open a session for a user and return its token, "session ID.signature"
+    def open(self, kind, user_id):
+        session_id = os.urandom(16).hex()
+        with self.__lock:
+            self.__sessions[session_id] = [kind, user_id, time.monotonic() + self.__ttl]
+            while len(self.__sessions) > self.__limit:
+                self.__sessions.popitem(last=False)  # Sign out the least recently used
+        return f"{session_id}.{self.__sign(session_id)}"
+
+    # Method to return a token's (kind, user ID), extending the session, or None if it is forged or expired
+    def resolve(self, token):
+        session_id = self.__verify(token)
+        if session_id is None:
+            return None  # Garbled, forged or from an earlier run: no need to touch the table
+        now = time.monotonic()
+        with self.__lock:
+            self.__expire(now)
+            session = self.__sessions.get(session_id)
+            if session is None:
+                return None
+            session[2] = now + self.__ttl
+            self.__sessions.move_to_end(session_id)  # Used now, so it is the last to be evicted
+            return session[0], session[1]
+
+    # Method to drop sessions whose time has run out (caller holds the lock)
+    def __expire(self, now):
+        # Every use moves a session to the end with a fresh expiry, so the expired ones are at the front
+        while self.__sessions:
+            session_id, session = next(iter(self.__sessions.items()))
+            if session[2] > now:
+                break
+            del self.__sessions[session_id]
+
+    # Method to end a session
+    def close(self, token):
+        session_id = self.__verify(token)
+        if session_id is not None:
+            with self.__lock:
+                self.__sessions.pop(session_id, None)
+
+    # Method to count the open sessions
+    def count(self):
+        with self.__lock:
+            self.__expire(time.monotonic())
+            return len(self.__sessions)
+
+
+# Function to read one generation of the snapshot files, the newest the journal can bring up to date, and the
+# journal records to replay on top (caller holds the store lock); a set is never mixed from several generations.
+# journal_records(after) returns the journal records, read(path) a snapshot file's contents (or an open file to stream)
+def read_snapshot_set(data_dir, journal_records, read=read_snapshot):
+    versions = {}  # File name -> {generation: newest readable copy of the file with that generation}
+    on_disk = set()  # File names with at least one copy, readable or not
+    for filename in SNAPSHOT_SET:
+        path = os.path.join(data_dir, filename)
+        versions[filename] = {}
+        for copy in [path] + [f"{path}.{number}" for number in range(1, SNAPSHOT_BACKUPS + 1)]:
+            try:
+                generation = read_snapshot_generation(copy)
+            except FileNotFoundError:
+                continue
+            except CorruptSnapshotError:
+                on_disk.add(filename)
+                continue
+            on_disk.add(filename)
+            if generation is not None or copy == path:  # Copies without a generation can't be matched up
+                versions[filename].setdefault(generation, copy)
+    generations = sorted({generation for found in versions.values() for generation in found
+                          if generation is not None}, reverse=True)
+    latest = generations[0] if generations else 0
+
+    # Try the newest generation first; files written before generations form a set of the current files only
+    for generation in generations + [None]:
+        paths = {}
+        for filename, found in versions.items():
+            if generation in found:
+                paths[filename] = found[generation]
+            elif generation is not None or filename in on_disk:
+                break  # Missing or damaged in this generation
+        else:
+            # The journal must still hold every change from this generation up to the newest one
+            records = journal_records(generation if generation is not None and generation < latest else None)
+            replay = [record for record in records if record[0] > (generation or 0)]
+            if generation is not None and generation < latest and not (
+                    replay and replay[0][0] == generation + 1 and replay[-1][0] - generation == len(replay)
+                    and replay[-1][0] >= latest):
+                continue
+            snapshots = {}
+            try:
+                for filename, path in paths.items():
+                    snapshots[filename] = read(path)
+            except CorruptSnapshotError:
+                for data in snapshots.values():
+                    if isinstance(data, io.IOBase):
+                        data.close()  # Files already opened for streaming
+                continue  # A copy with a sound header but a damaged payload
+            if generation != (generations[0] if generations else None):
+                print(f"Warning: the newest snapshot files are damaged or incomplete; recovered generation "
+                      f"{generation} and replayed the journal from there", file=sys.stderr)
+            return snapshots, records
+    raise CorruptSnapshotError(f"No consistent set of snapshot files could be read in {data_dir} "
+                               f"(newest generation {latest}); restore the directory from a backup")
+
+
+# Function to retrieve the flat records held by a snapshot file's data, converting snapshots of pickled objects
+def snapshot_records(filename, data):
+    if isinstance(data, tuple) and data[:1] == (RECORD_SNAPSHOT_TAG,):
+        tag, version, records = data
+        if version > RECORD_FORMAT_VERSION:
+            raise ValueError(f"{filename} was written by a newer version (format {version})")
+        return records
+    return [item.to_record() for item in data]  # Older snapshot holding pickled objects
+
+
+# Class that owns the application's collections and journals every change made to them
+class DataStore:
+    # Constructor to load the snapshots, replay the journal and start the background worker
+    def __init__(self, data_dir=".", compact_threshold=1000, sync_batch=32, sync_interval=1.0, lazy=False):
+        self.__data_dir = data_dir  # Directory holding the snapshot files and the journal
+        self.__compact_threshold = compact_threshold  # Journal records that trigger a compaction
+        self.__sync_interval = sync_interval  # How often the worker picks up other terminals' changes
+        self.__lock = threading.RLock()  # Guards the collections within this process
+        self.__store_lock = FileLock(self.__path(STORE_LOCK_FILE))  # Serializes writers across processes
+        self.__journal = Journal(self.__path(JOURNAL_FILE), sync_batch, sync_interval)
+        self.__closed = threading.Event()
+        self.__worker = None  # Background worker, started once everything is loaded
+        self.__compacting = threading.Lock()
+        self.__loads = 0  # Times the lists were (re)filled from the snapshots, so a sweep can tell they were replaced
+        self.__gate = LoadGate(self.__load_all)  # Loads everything once, now or on first use
+
+        # The collections are filled in place, so references handed out stay valid after a reload
+        self.customers = LazyList(self.__gate)
+        self.admins = LazyList(self.__gate)
+        self.tickets = []
+        self.reservations = LazyList(self.__gate)
+        self.payments = LazyList(self.__gate)
+
+        if lazy:
+            # Only the ticket catalogue is read now; the rest loads by start_loading() or on first use
+            self.tickets[:] = [Ticket.from_record(record) for record in self.__read_records("tickets")]
+        else:
+            self.__gate.wait()
+
+    # Method to load the snapshots and the journal, then start the background worker
+    def __load_all(self):
+        # Load the snapshots and the journal while no other terminal is writing
+        with self.__lock, self.__store_lock:
+            self.__load()
+
+        # Hand out new IDs above every ID already in use, in this and any other process
+        self.ids = IdAllocator(self.__data_dir, in_use={
+            name: max((item_id(item) for item in getattr(self, name)), default=0)
+            for name, item_id in (("customers", User.get_user_id), ("tickets", Ticket.get_ticket_id),
+                                  ("reservations", Reservation.get_reservation_id),
+                                  ("payments", Payment.get_payment_id))})
+
+        # Start the worker that follows other terminals and compacts the journal (the journal fsyncs on its own)
+        if self.__closed.is_set():
+            return  # Closed while loading: nothing was written, so there is nothing to maintain
+        self.__worker = threading.Thread(target=self.__maintain, name="journal-maintenance", daemon=True)
+        self.__worker.start()
+
+    # Method to load the customers, reservations and payments in a background thread
+    def start_loading(self):
+        self.__gate.start()
+
+    # Method to check whether everything has been loaded
+    def is_loaded(self):
+        return self.__gate.is_loaded()
+
+    # Method to build the full path of a file in the data directory
+    def __path(self, filename):
+        return os.path.join(self.__data_dir, filename)
+
+    # Method to load the snapshots, the metrics saved with them and the journal on top (caller holds both locks)
+    def __load(self):
+        snapshots, records = read_snapshot_set(self.__data_dir, self.__journal.recover)
+        self.__loads += 1
+        self.__load_snapshots(snapshots)
+
+        # Load the sales metrics saved with that snapshot
+        metrics_state = snapshots.get(METRICS_FILE)
+        self.metrics = SalesMetrics(metrics_state or None)
+
+        # Load the daily caps saved with that snapshot (data saved before caps existed starts with the defaults)
+        self.inventory = CapacityInventory(snapshots.get(CAPACITY_FILE, DEFAULT_DAILY_CAPACITY))
+        # Count the seats already sold
+        for reservation in self.reservations:
+            self.inventory.reserve(reservation.get_ticket().get_ticket_type(), reservation.get_date())
+
+        # Data saved before metrics existed has its counters built once from the snapshot's payments, before the
+        # journal is replayed onto them (a rebuild afterwards would lose the cancellations replayed)
+        if not metrics_state:
+            self.__rebuild_metrics()
+
+        # Replay the changes journaled since that snapshot was written
+        self.__lsn = snapshots.get(SNAPSHOT_META_FILE) or 0  # Last record held by the snapshots
+        for record in records:
+            self.__apply(record)
+
+    # Method to read the records of one snapshot file, converting snapshots of pickled objects
+    # (from the snapshot set being loaded, or from the newest copy of the file on its own)
+    def __read_records(self, name, snapshots=None):
+        filename = SNAPSHOT_FILES[name]
+        data = snapshots[filename] if snapshots and filename in snapshots else load_data(self.__path(filename))
+        return snapshot_records(filename, data)
+
+    # Method to load the snapshots and link the records to each other by ID
+    def __load_snapshots(self, snapshots):
+        self.tickets[:] = [Ticket.from_record(record) for record in self.__read_records("tickets", snapshots)]
+        self.customers[:] = [Customer.from_record(record) for record in self.__read_records("customers", snapshots)]
+        self.admins[:] = [Admin.from_record(record) for record in self.__read_records("admins", snapshots)]
+
+        # Index customers, admins and tickets by ID and by case-normalised email
+        self.__customers_by_id = {}
+        self.__customers_by_email = {}
+        for customer in self.customers:
+            self.__customers_by_id.setdefault(customer.get_user_id(), customer)
+            self.__customers_by_email.setdefault(normalize_email(customer.get_email()), customer)
+        self.__admins_by_id = {}
+        self.__admins_by_email = {}
+        for admin in self.admins:
+            self.__admins_by_id.setdefault(admin.get_user_id(), admin)
+            self.__admins_by_email.setdefault(normalize_email(admin.get_email()), admin)
+        self.catalog = TicketCatalog(self.tickets, snapshots.get(PRICE_HISTORY_FILE) or None)
+
+        # Link each reservation to the one shared customer, ticket and payment object with its ID
+        self.payments[:] = [Payment.from_record(record) for record in self.__read_records("payments", snapshots)]
+        payments_by_id = {payment.get_payment_id(): payment for payment in self.payments}
+        self.reservations[:] = []
+        self.__reservations_by_id = {}
+        self.__checked_in_by_date = Counter()  # Visit date -> reservations checked in at the gate
+        self.__tombstones = {"reservations": 0, "customers": 0, "payments": 0}  # Removed items still in the lists
+        self.__tombstone_customers = set()  # Customers whose own lists hold cancelled reservations
+        for record in self.__read_records("reservations", snapshots):
+            reservation = Reservation.from_record(record, self.__customers_by_id, self.catalog,
+                                                  payments_by_id)
+            if reservation is None:
+                continue  # Its customer was deleted
+            self.reservations.append(reservation)
+            self.__reservations_by_id.setdefault(reservation.get_reservation_id(), reservation)
+            reservation.get_customer().add_reservation(reservation)
+            if reservation.get_checked_in() is not None:
+                self.__checked_in_by_date[reservation.get_date()] += 1
+
+        # Link payments to reservations written before reservations named their payment
+        for payment in self.payments:
+            reservation = self.__reservations_by_id.get(payment.get_reservation_id())
+            if reservation is not None and reservation.get_payment() is None:
+                reservation.set_payment(payment)
+                payment.set_reservation(reservation)
+
+        # The admin search indexes are built on first use, then kept up to date by __apply
+        self.__customer_index = None
+        self.__reservation_index = None
+        self.__sales_columns = None  # The analytics columns are built the same way
+
+    # Method to write a collection as a versioned list of flat records
+    def __write_records(self, path, items, generation):
+        write_snapshot(path, (RECORD_SNAPSHOT_TAG, RECORD_FORMAT_VERSION, [item.to_record() for item in items]),
+                       generation)
+
+    # Method to hold both locks and catch up with other terminals before a change is made
+    @contextmanager
+    def __writing(self):
+        self.__gate.wait()  # Changes are made to the fully loaded collections
+        with self.__lock, self.__store_lock:
+            self.__catch_up()
+            yield
+
+    # Method to apply the records other terminals journaled since this process last looked (caller holds both
+    # locks); after a compaction retired the segment being followed, the retired segments are read back to this
+    # process's position, and only changes no segment holds any more make it reload the snapshots
+    def __catch_up(self):
+        records = self.__journal.read_new()
+        if records is None or (records and records[0][0] > self.__lsn + 1):
+            records = [record for record in self.__journal.recover(self.__lsn) if record[0] > self.__lsn]
+            start = records[0][0] if records else (load_data(self.__path(SNAPSHOT_META_FILE)) or 0) + 1
+            if start > self.__lsn + 1:
+                self.__load()  # Those records are only in the snapshots now: start again from them
+                return
+        for record in records:
+            self.__apply(record)
+
+    # Method to wait until every change made by this process is on stable storage
+    def flush(self):
+        self.__journal.sync()
+
+    # Method to retrieve the number of changes made by this process that are still being written to disk
+    def get_unsaved_count(self):
+        return self.__journal.get_unsynced_count()
+
+    # Method to bring this process's view up to date with every terminal's changes
+    def refresh(self):
+        with self.__writing():
+            pass
+
+    # Method to journal a change and then apply it to the collections (caller is inside __writing)
+    def __commit(self, op, *args):
+        record = (self.__lsn + 1, op) + args
+        self.__journal.append(record)  # Write ahead: the change is logged before memory reflects it
+        self.__apply(record)
+
+    # Methods to retrieve records by ID in constant time
+    def get_customer(self, customer_id):
+        self.__gate.wait()
+        return self.__customers_by_id.get(customer_id)
+
+    def get_ticket(self, ticket_id):
+        self.__gate.wait()
+        return self.catalog.get(ticket_id)
+
+    def get_reservation(self, reservation_id):
+        self.__gate.wait()
+        return self.__reservations_by_id.get(reservation_id)
+
+    # Method to retrieve the stored version of a customer, ticket or reservation, to pass back with a later change
+    # (0 once it no longer exists)
+    def get_version(self, kind, key):
+        self.__gate.wait()
+        index = {"customer": self.__customers_by_id, "ticket": self.catalog,
+                 "reservation": self.__reservations_by_id}[kind]
+        item = index.get(key)
+        return 0 if item is None else item.get_version()
+
+    # Method to raise if a record changed since the caller read the given version
+    def __check_version(self, kind, key, expected_version):
+        if expected_version is not None and self.get_version(kind, key) != expected_version:
+            raise ConcurrencyError(f"This {kind} was changed on another terminal. Please review it and try again.")
+
+    # Method to look up a record the caller still holds, raising if another terminal removed it
+    def __require(self, index, key, kind):
+        item = index.get(key)
+        if item is None:
+            raise ConcurrencyError(f"This {kind} no longer exists. It may have been removed on another terminal.")
+        return item
+
+    # Method to find customers whose name, email or phone contains the query (or starts with it)
+    def search_customers(self, query, limit=100, prefix=False):
+        self.__gate.wait()
+        with self.__lock:  # The worker may be applying another terminal's changes
+            if self.__customer_index is None:
+                self.__customer_index = CustomerSearchIndex()
+                self.__customer_index.add_all(self.__customers_by_id.values())
+            return self.__customer_index.search(query, limit, prefix)
+
+    # Method to retrieve the reservation index, building it on first use (caller holds the lock)
+    def __reservations_index(self):
+        if self.__reservation_index is None:
+            self.__reservation_index = ReservationSearchIndex()
+            for reservation in self.__reservations_by_id.values():
+                self.__reservation_index.add(reservation)
+        return self.__reservation_index
+
+    # Method to find reservations by visit date range, ticket type and customers
+    def search_reservations(self, start_date=None, end_date=None, ticket_type=None, customers=None, limit=None):
+        self.__gate.wait()
+        with self.__lock:
+            return self.__reservations_index().search(start_date, end_date, ticket_type, customers, limit)
+
+    # Method to count the reservations in a visit date range, optionally of one ticket type
+    def count_reservations_in_range(self, start_date=None, end_date=None, ticket_type=None):
+        self.__gate.wait()
+        with self.__lock:
+            return self.__reservations_index().count(start_date, end_date, ticket_type)
+
+    # Method to run an analysis on the sales columns, building them on first use
+    def analyze_sales(self, analysis):
+        self.__gate.wait()
+        with self.__lock:  # The columns must not change during a pass
+            if self.__sales_columns is None:
+                self.__sales_columns = SalesColumns()
+                self.__sales_columns.add_all(self.__reservations_by_id.values())
+            return analysis(self.__sales_columns)
+
+    # Method to find a customer by email in constant time
+    def find_customer_by_email(self, email):
+        self.__gate.wait()
+        return self.__customers_by_email.get(normalize_email(email))
+
+    # Method to find an admin by ID
+    def get_admin(self, admin_id):
+        self.__gate.wait()
+        return self.__admins_by_id.get(admin_id)
+
+    # Method to find an admin by email in constant time
+    def find_admin_by_email(self, email):
+        self.__gate.wait()
+        return self.__admins_by_email.get(normalize_email(email))
+
+    # Method to check whether an email is already used by a customer other than the given one
+    def is_email_taken(self, email, exclude=None):
+        self.__gate.wait()
+        owner = self.__customers_by_email.get(normalize_email(email))
+        return owner is not None and (exclude is None or owner.get_user_id() != exclude.get_user_id())
+
+    # Method to register a new customer (with an already hashed password) and return it
+    def register_customer(self, name, email, password_hash, phone):
+        with self.__writing():
+            if self.is_email_taken(email):
+                raise ValidationError("An account with this email already exists")
+            customer_id = self.ids.next_id("customers")
+            self.__commit("put_customer", customer_id, name, email, password_hash, phone, 1)
+            return self.__customers_by_id[customer_id]
+
+    # Method to update a customer's profile details
+    def update_customer(self, customer, name, email, phone, expected_version=None):
+        with self.__writing():
+            customer = self.__require(self.__customers_by_id, customer.get_user_id(), "customer")
+            self.__check_version("customer", customer.get_user_id(), expected_version)
+            if self.is_email_taken(email, exclude=customer):
+                raise ValidationError("An account with this email already exists")
+            self.__commit("put_customer", customer.get_user_id(), name, email, customer.get_password(), phone,
+                          customer.get_version() + 1)  # The journal entry carries the new version
+            return customer
+
+    # Method to replace a customer's or an admin's password hash (hash it before calling: hashing is slow)
+    def set_password(self, user, password_hash):
+        kind = "admin" if isinstance(user, Admin) else "customer"
+        with self.__writing():
+            self.__require(self.__admins_by_id if kind == "admin" else self.__customers_by_id,
+                           user.get_user_id(), kind)
+            self.__commit("set_password", kind, user.get_user_id(), password_hash)
+
+    # Method to remove a customer with their reservations and payments
+    def remove_customer(self, customer, expected_version=None):
+        with self.__writing():
+            self.__require(self.__customers_by_id, customer.get_user_id(), "customer")
+            self.__check_version("customer", customer.get_user_id(), expected_version)
+            self.__commit("delete_customer", customer.get_user_id())
+
+    # Method to remove many customers with their records, or only strip their personal details, in one record
+    def purge_customers(self, customers, anonymize=False):
+        with self.__writing():
+            customer_ids = tuple(customer.get_user_id() for customer in customers
+                                 if customer.get_user_id() in self.__customers_by_id)
+            if customer_ids:
+                versions = tuple(self.__customers_by_id[customer_id].get_version() + 1 for customer_id in customer_ids)
+                self.__commit("purge_customers", customer_ids, anonymize, versions)
+            return len(customer_ids)
+
+    # Method to find the customers whose reservations are all for visits before a date (not anonymized yet)
+    def find_inactive_customers(self, before):
+        self.__gate.wait()
+        inactive = []
+        with self.__lock:
+            for customer in self.__customers_by_id.values():
+                reservations = customer.get_reservations()
+                if reservations and not customer.is_locked() and \
+                        max(reservation.get_date() for reservation in reservations) < before:
+                    inactive.append(customer)  # Accounts that never booked have no activity to go by
+        return inactive
+
+    # Method to retrieve a page of the customers (all of them by default), skipping deleted ones
+    def get_customers(self, offset=0, limit=None):
+        self.__gate.wait()
+        customers = self.customers
+        if self.__tombstones["customers"]:
+            customers = [customer for customer in customers if customer.get_deleted() is None]  # Until swept
+        return customers[offset:] if limit is None else customers[offset:offset + limit]
+
+    # Method to count the customers
+    def count_customers(self):
+        self.__gate.wait()
+        return len(self.customers) - self.__tombstones["customers"]
+
+    # Method to add a ticket to the catalog
+    def add_ticket(self, ticket):
+        with self.__writing():
+            self.__commit("put_ticket", *ticket.to_record())
+
+    # Method to change the price of a ticket
+    def set_ticket_price(self, ticket, price, expected_version=None):
+        with self.__writing():
+            ticket = self.__require(self.catalog, ticket.get_ticket_id(), "ticket")
+            self.__check_version("ticket", ticket.get_ticket_id(), expected_version)
+            self.__commit("set_ticket_price", ticket.get_ticket_id(), price,
+                          datetime.now().strftime("%Y-%m-%d %H:%M:%S"),  # Kept in the price history
+                          ticket.get_version() + 1)
+
+    # Method to set the daily cap of a ticket type (None for unlimited)
+    def set_capacity(self, ticket_type, capacity):
+        with self.__writing():
+            self.__commit("set_capacity", ticket_type, capacity)
+
+    # Method to retrieve the seats left for a ticket on a visit date in constant time, or None if unlimited
+    def get_availability(self, ticket, date):
+        self.__gate.wait()
+        return self.inventory.get_available(ticket.get_ticket_type(), date)
+
+    # Method to sell a ticket to a customer for a visit date and return the paid reservation
+    def add_reservation(self, customer, ticket, date, payment_method):
+        with self.__writing():  # Every terminal's sales are applied before the seat check
+            customer = self.__require(self.__customers_by_id, customer.get_user_id(), "customer")
+            ticket = self.__require(self.catalog, ticket.get_ticket_id(), "ticket")
+            if not self.inventory.has_room(ticket.get_ticket_type(), date):
+                raise SoldOutError(f"{ticket.get_ticket_type()} is sold out for {date}")
+            reservation_id = self.ids.next_id("reservations")
+            self.__commit("add_reservation", reservation_id, customer.get_user_id(), ticket.get_ticket_id(), date,
+                          self.ids.next_id("payments"), ticket.get_price(), payment_method,
+                          datetime.now().strftime("%Y-%m-%d"))
+            return self.__reservations_by_id[reservation_id]
+
+    # Method to sell several seats of a ticket in one transaction and return the reservations
+    def add_group_reservation(self, customer, ticket, date, payment_method, quantity):
+        with self.__writing():
+            customer = self.__require(self.__customers_by_id, customer.get_user_id(), "customer")
+            ticket = self.__require(self.catalog, ticket.get_ticket_id(), "ticket")
+            if not self.inventory.has_room(ticket.get_ticket_type(), date, quantity):
+                available = self.inventory.get_available(ticket.get_ticket_type(), date)
+                raise SoldOutError(f"Only {available} {ticket.get_ticket_type()} seats are left for {date}")
+            reservation_ids = tuple(self.ids.next_id("reservations") for _ in range(quantity))
+            amount = round(ticket.get_price() * quantity * (100 - ticket.get_group_discount(quantity)) / 100, 2)
+            self.__commit("add_group_reservation", reservation_ids, customer.get_user_id(), ticket.get_ticket_id(),
+                          date, self.ids.next_id("payments"), amount, payment_method,
+                          datetime.now().strftime("%Y-%m-%d"))  # One journal record for the whole group
+            return [self.__reservations_by_id[reservation_id] for reservation_id in reservation_ids]
+
+    # Method to let a visitor in at the gate: the reservation must exist, be paid, be for today and not be used yet
+    def check_in(self, reservation_id, today=None):
+        with self.__writing():  # Every gate's scans are applied first, so a ticket is let in only once
+            reservation = self.__reservations_by_id.get(reservation_id)  # Constant-time lookup by ID
+            if reservation is None:
+                raise NotFoundError(f"Reservation {reservation_id} does not exist or was cancelled")
+            if reservation.get_payment() is None:
+                raise ValidationError(f"Reservation {reservation_id} has not been paid")
+            today = today or datetime.now().strftime("%Y-%m-%d")
+            if reservation.get_date() != today:
+                raise ValidationError(f"Reservation {reservation_id} is for {reservation.get_date()}, not today")
+            if reservation.get_checked_in() is not None:
+                raise ValidationError(f"Reservation {reservation_id} was already checked in at "
+                                      f"{reservation.get_checked_in()}")
+            self.__commit("check_in", reservation_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                          reservation.get_version() + 1)
+            return reservation
+
+    # Method to count the reservations for a visit date and how many of them have been checked in
+    def count_check_ins(self, date):
+        self.__gate.wait()
+        with self.__lock:
+            return self.__reservations_index().count(date, date), self.__checked_in_by_date.get(date, 0)
+
+    # Method to remove a reservation from the store and from its customer
+    def remove_reservation(self, reservation, expected_version=None):
+        with self.__writing():
+            reservation = self.__require(self.__reservations_by_id, reservation.get_reservation_id(), "reservation")
+            self.__check_version("reservation", reservation.get_reservation_id(), expected_version)
+            refund_id = self.ids.next_id("payments") if reservation.get_payment() is not None else None
+            self.__commit("remove_reservation", reservation.get_reservation_id(), refund_id,
+                          datetime.now().strftime("%Y-%m-%d"))
+
+    # Method to count the active reservations (the list also holds cancelled ones until they are swept)
+    def count_reservations(self):
+        self.__gate.wait()
+        return len(self.reservations) - self.__tombstones["reservations"]
+
+    # Method to drop cancelled reservations, deleted customers and deleted payments from the lists,
+    # scanning outside the lock so sales keep flowing (a pass gives up if the lists were reloaded meanwhile)
+    def sweep_tombstones(self):
+        self.__gate.wait()
+        swept = 0
+        with self.__compacting:  # Nothing else takes items out of the lists meanwhile
+            for name, removed in (("reservations", Reservation.get_cancelled), ("customers", Customer.get_deleted),
+                                  ("payments", Payment.get_deleted)):
+                items = getattr(self, name)
+                with self.__lock:
+                    if not self.__tombstones[name]:
+                        continue
+                    count = len(items)  # Items added during the scan are appended after these
+                    loads = self.__loads
+                kept = [item for item in items[:count] if removed(item) is None]
+                with self.__lock:
+                    if self.__loads != loads:
+                        return swept  # Refilled from the snapshots by a catch-up: the scan is out of date
+                    items[:count] = kept  # One slice assignment instead of a list.remove per tombstone
+                    self.__tombstones[name] -= count - len(kept)  # Any removed during the scan wait for the next sweep
+                swept += count - len(kept)
+            with self.__lock:
+                for customer in self.__tombstone_customers:
+                    customer.sweep_cancelled()
+                self.__tombstone_customers.clear()
+        return swept
+
+    # Method to check whether a list holds enough tombstones to be worth sweeping
+    def __needs_sweep(self):
+        return self.__tombstones["customers"] > 0 or any(
+            count >= max(TOMBSTONE_SWEEP_MIN, len(getattr(self, name)) * TOMBSTONE_SWEEP_RATIO)
+            for name, count in self.__tombstones.items())
+
+    # Method to apply one journaled change to the collections, indexes and metrics
+    def __apply(self, record):
+        lsn, op, *args = record
+        if lsn <= self.__lsn:
+            return  # Already part of the snapshot
+        self.__lsn = lsn
+
+        if op == "put_customer":
+            user_id, name, email, password, phone, *version = args  # Entries journaled before versions carry none
+            customer = self.__customers_by_id.get(user_id)
+            if customer is None:
+                customer = Customer(user_id, name, email, password, phone)
+                self.__customers_by_id[user_id] = customer
+                self.customers.append(customer)
+            else:
+                self.__forget_email(customer)
+                customer.set_name(name)
+                customer.set_email(email)
+                customer.set_phone_number(phone)
+            self.__customers_by_email[normalize_email(email)] = customer
+            if self.__customer_index is not None:
+                self.__customer_index.add(customer)  # New or changed search line
+            self.__set_version(customer, version[0] if version else None)
+        elif op == "set_password":
+            kind, user_id, password_hash = args
+            user = (self.__admins_by_id if kind == "admin" else self.__customers_by_id).get(user_id)
+            if user is not None:
+                user.set_password(password_hash)  # Not a profile change, so the version is left alone
+        elif op == "delete_customer":
+            customer = self.__customers_by_id.get(args[0])
+            if customer is not None:
+                self.__delete_customer(customer, lsn)
+        elif op == "purge_customers":
+            customer_ids, anonymize, *versions = args
+            versions = versions[0] if versions else (None,) * len(customer_ids)
+            for customer_id, version in zip(customer_ids, versions):
+                customer = self.__customers_by_id.get(customer_id)
+                if customer is not None and anonymize:
+                    self.__anonymize_customer(customer, version)
+                elif customer is not None:
+                    self.__delete_customer(customer, lsn)
+        elif op == "put_ticket":
+            if args[0] not in self.catalog:
+                ticket = Ticket.from_record(args)
+                self.catalog.add(ticket)
+                self.tickets.append(ticket)
+        elif op == "set_ticket_price":
+            ticket_id, price, *rest = args  # Changes journaled before price history carry no time, nor version
+            ticket = self.catalog.set_price(ticket_id, price, rest[0] if rest else None)
+            if ticket is not None:
+                self.__set_version(ticket, rest[1] if len(rest) > 1 else None)
+        elif op == "add_reservation":
+            (reservation_id, customer_id, ticket_id, date,
+             payment_id, amount, payment_method, payment_date) = args
+            customer = self.__customers_by_id.get(customer_id)
+            ticket = self.catalog.get(ticket_id)
+            if customer is None or ticket is None:
+                return  # It refers to records that no longer exist
+            if reservation_id in self.__reservations_by_id:
+                return  # Already in a snapshot recovered from a newer generation
+            reservation = Reservation(reservation_id, customer, ticket, date)
+            payment = Payment.from_record((payment_id, amount, payment_method, payment_date, reservation_id))
+            reservation.set_payment(payment)
+            payment.set_reservation(reservation)
+            self.__reservations_by_id[reservation_id] = reservation
+            self.reservations.append(reservation)
+            self.payments.append(payment)
+            customer.add_reservation(reservation)
+            if self.__reservation_index is not None:
+                self.__reservation_index.add(reservation)
+            if self.__sales_columns is not None:
+                self.__sales_columns.add(reservation)
+            self.inventory.reserve(ticket.get_ticket_type(), reservation.get_date())
+            self.__count_sale(reservation, payment)
+        elif op == "add_group_reservation":
+            (reservation_ids, customer_id, ticket_id, date,
+             payment_id, amount, payment_method, payment_date) = args
+            customer = self.__customers_by_id.get(customer_id)
+            ticket = self.catalog.get(ticket_id)
+            if customer is None or ticket is None:
+                return  # It refers to records that no longer exist
+            if reservation_ids[0] in self.__reservations_by_id:
+                return  # Already in a snapshot recovered from a newer generation
+            payment = Payment.from_record((payment_id, amount, payment_method, payment_date, reservation_ids[0],
+                                           len(reservation_ids)))
+            self.payments.append(payment)
+            for reservation_id in reservation_ids:
+                reservation = Reservation(reservation_id, customer, ticket, date)
+                reservation.set_payment(payment)  # Every seat shares the one aggregated payment
+                self.__reservations_by_id[reservation_id] = reservation
+                self.reservations.append(reservation)
+                customer.add_reservation(reservation)
+                if self.__reservation_index is not None:
+                    self.__reservation_index.add(reservation)
+                if self.__sales_columns is not None:
+                    self.__sales_columns.add(reservation)
+            payment.set_reservation(self.__reservations_by_id[reservation_ids[0]])
+            self.inventory.reserve(ticket.get_ticket_type(), payment.get_reservation().get_date(),
+                                   len(reservation_ids))
+            self.metrics.record_sale(payment_date, ticket.get_ticket_type(), payment_method, amount,
+                                     len(reservation_ids))
+        elif op == "remove_reservation":
+            reservation_id, *refund = args  # Cancellations journaled before refunds carry only the ID
+            reservation = self.__reservations_by_id.get(reservation_id)
+            if reservation is not None:
+                self.__drop_reservation(reservation, lsn)
+                self.__tombstone_customers.add(reservation.get_customer())
+                payment = reservation.get_payment()
+                if payment is not None and refund and refund[0] is not None:
+                    self.payments.append(payment.refund(refund[0], refund[1], reservation_id))  # Money given back
+        elif op == "set_capacity":
+            self.inventory.set_capacity(*args)
+        elif op == "check_in":
+            reservation = self.__reservations_by_id.get(args[0])
+            if reservation is not None and reservation.get_checked_in() is None:
+                reservation.set_checked_in(args[1])
+                self.__checked_in_by_date[reservation.get_date()] += 1
+                self.__set_version(reservation, args[2] if len(args) > 2 else None)
+
+    # Method to give a record the version its journal entry carries (one more, for an entry journaled before
+    # records had versions)
+    def __set_version(self, item, version):
+        item.set_version(item.get_version() + 1 if version is None else version)
+
+    # Method to take a reservation out of the indexes, seats and metrics, leaving a tombstone in the lists
+    # (a cancellation is counted as one; a reservation deleted with its customer only leaves the sales)
+    def __drop_reservation(self, reservation, lsn, cancelled=True):
+        del self.__reservations_by_id[reservation.get_reservation_id()]
+        reservation.set_cancelled(lsn)  # The lists are not searched; the worker sweeps tombstones out later
+        self.__tombstones["reservations"] += 1
+        reservation.get_customer().note_cancellation()
+        if self.__reservation_index is not None:
+            self.__reservation_index.remove(reservation)
+        if self.__sales_columns is not None:
+            self.__sales_columns.remove(reservation)
+        if reservation.get_checked_in() is not None:
+            self.__checked_in_by_date[reservation.get_date()] -= 1
+        self.inventory.release(reservation.get_ticket().get_ticket_type(), reservation.get_date())
+        self.__count_cancellation(reservation, cancelled)
+
+    # Method to delete a customer with their reservations and the payments for them, in time proportional to
+    # the customer's own records (the customer's list is the customer -> reservations -> payments index).
+    # Their sales leave the figures (unlike an anonymized customer's) but are not counted as cancellations.
+    # Refunds of their earlier cancellations stay, with the sale payments they refund: the pair adds up to
+    # nothing, names no customer, and those reservations may already be swept from the customer's list.
+    def __delete_customer(self, customer, lsn):
+        del self.__customers_by_id[customer.get_user_id()]
+        customer.set_deleted(lsn)
+        self.__tombstones["customers"] += 1
+        self.__forget_email(customer)
+        if self.__customer_index is not None:
+            self.__customer_index.remove(customer)
+        for reservation in list(customer.get_reservations()):
+            self.__drop_reservation(reservation, lsn, cancelled=False)
+            payment = reservation.get_payment()
+            if payment is not None and payment.get_deleted() is None:  # A group's seats share one payment
+                payment.set_deleted(lsn)
+                self.__tombstones["payments"] += 1
+        self.__tombstone_customers.discard(customer)  # Its own list goes with it
+
+    # Method to strip a customer's personal details, keeping their reservations and payments for the figures
+    def __anonymize_customer(self, customer, version):
+        self.__forget_email(customer)
+        customer.set_name("Anonymized customer")
+        customer.set_email(f"anonymized-{customer.get_user_id()}@invalid")  # Still unique, never a real address
+        customer.set_phone_number("")
+        customer.set_password(LOCKED_PASSWORD)  # The account can no longer sign in
+        self.__customers_by_email[normalize_email(customer.get_email())] = customer
+        if self.__customer_index is not None:
+            self.__customer_index.add(customer)  # Replaces the old search line and keys
+        self.__set_version(customer, version)
+
+    # Method to drop a customer's current email from the index
+    def __forget_email(self, customer):
+        key = normalize_email(customer.get_email())
+        if self.__customers_by_email.get(key) is customer:
+            del self.__customers_by_email[key]
+
+    # Method to add a sale to the metrics
+    def __count_sale(self, reservation, payment):
+        self.metrics.record_sale(payment.get_date(), reservation.get_ticket().get_ticket_type(),
+                                 payment.get_payment_method(), payment.get_seat_amount())
+
+    # Method to take a cancelled (or deleted) reservation's sale back out of the metrics
+    def __count_cancellation(self, reservation, cancelled=True):
+        payment = reservation.get_payment()
+        if payment is not None:
+            record = self.metrics.record_cancellation if cancelled else self.metrics.record_removal
+            record(payment.get_date(), reservation.get_ticket().get_ticket_type(), payment.get_payment_method(),
+                   payment.get_seat_amount())
+
+    # Method to build the metrics from the payments of the reservations that are still active
+    def __rebuild_metrics(self):
+        self.metrics = SalesMetrics()
+        for reservation in self.__reservations_by_id.values():
+            if reservation.get_payment() is not None:
+                self.__count_sale(reservation, reservation.get_payment())  # A group's seats count a share each
+
+    # Method run by the background worker: follow other terminals, compact a long journal
+    def __maintain(self):
+        while not self.__closed.wait(self.__sync_interval):
+            self.refresh()  # Pick up other terminals' changes
+            if self.__journal.get_record_count() >= self.__compact_threshold or self.__journal.has_old_segment():
+                self.compact()
+            if self.__needs_sweep():
+                self.sweep_tombstones()
+
+    # Method to fold the journal into fresh snapshot files
+    @INSTRUMENTS.measure("compact")
+    def compact(self):
+        with self.__compacting:
+            # Retire the journal segment and copy the collections at the same instant
+            with self.__writing():
+                if not self.__journal.has_old_segment():
+                    self.__journal.rotate()  # A leftover retired segment is simply folded in again
+                lsn = self.__lsn
+                collections = {name: list(getattr(self, name)) for name in SNAPSHOT_FILES}
+                metrics_state = self.metrics.get_state()
+                capacity_state = self.inventory.get_state()
+                price_state = self.catalog.get_state()
+
+            # Write the snapshots to temporary files outside the locks so purchases keep flowing
+            suffix = f".{os.getpid()}.tmp"
+            # Items removed up to the snapshot's position are left out (later removals are replayed)
+            for name, removed in (("reservations", Reservation.get_cancelled), ("customers", Customer.get_deleted),
+                                  ("payments", Payment.get_deleted)):
+                collections[name] = [item for item in collections[name] if removed(item) is None or removed(item) > lsn]
+            files = {self.__path(SNAPSHOT_FILES[name]): items for name, items in collections.items()}
+            # Every file carries the snapshot's journal position, so a set mixed by a crash mid-install is detected
+            for path, items in files.items():
+                self.__write_records(path + suffix, items, lsn)
+            write_snapshot(self.__path(METRICS_FILE) + suffix, metrics_state, lsn)
+            write_snapshot(self.__path(CAPACITY_FILE) + suffix, capacity_state, lsn)
+            write_snapshot(self.__path(PRICE_HISTORY_FILE) + suffix, price_state, lsn)
+            write_snapshot(self.__path(SNAPSHOT_META_FILE) + suffix, lsn, lsn)
+
+            # Install them together, unless another terminal already installed a newer snapshot
+            with self.__lock, self.__store_lock:
+                paths = list(files) + [self.__path(METRICS_FILE), self.__path(CAPACITY_FILE),
+                                       self.__path(PRICE_HISTORY_FILE), self.__path(SNAPSHOT_META_FILE)]
+                if (load_data(self.__path(SNAPSHOT_META_FILE)) or 0) >= lsn:
+                    for path in paths:
+                        os.remove(path + suffix)
+                    return
+                for path in paths:
+                    install_snapshot(path + suffix, path)  # The meta file goes last and marks the snapshot complete
+                sync_directory(self.__data_dir)
+                self.__journal.retire_old_segment()  # Kept while the previous generation is still a backup
+
+    # Method to stop the background worker and make every journaled change durable
+    # (a store whose history was never loaded has written nothing, so closing does not wait for the load)
+    def close(self):
+        self.__closed.set()
+        if self.__gate.is_loaded() and self.__worker is not None:
+            self.__worker.join()
+        self.__journal.close()
+
+# Most results a search returns at once
+SEARCH_RESULT_LIMIT = 1000
+
+
+# Class representing the headless booking engine shared by the GUI and the HTTP API
+class BookingService:
+    # Constructor to initialize the service on top of a data store, a password pool and a session table
+    def __init__(self, store, hasher=None, sessions=None):
+        self.store = store
+        self.hasher = hasher or PasswordHasher()
+        self.sessions = sessions or SessionTable()
+
+    # Method to validate the email format
+    @staticmethod
+    def validate_email(email):
+        return "@" in email and "." in email  # True if both "@" and "." are present
+
+    # Method to validate the phone number format
+    @staticmethod
+    def validate_phone(phone):
+        return phone.isdigit() and len(phone) == 10  # True if numeric and exactly 10 characters long
 
     # Method to initialize default ticket data if no tickets exist
     def initialize_default_tickets(self):
@@ -249,17 +3119,1359 @@ class AdventureLandApp(tk.Tk):
             Ticket(6, "VIP Experience Pass", 550, "1 Day", "Includes expedited access and reserved seating for shows",
                    "Limited availability, must be purchased", None)
         ]
-        # Add the default tickets to the tickets list
-        self.tickets.extend(default_tickets)  # Append the default tickets to the existing ticket list
-        # Save the updated tickets list to the file "tickets.pkl"
-        save_data("tickets.pkl", self.tickets)  # Call save_data function to serialize and save the updated tickets list
+        # Add the default tickets to the tickets list through the data store
+        for ticket in default_tickets:
+            if self.store.get_ticket(ticket.get_ticket_id()) is None:  # The journal may hold them already
+                self.store.add_ticket(ticket)  # Append the ticket and journal it
+
+    # Method to retrieve every ticket on sale
+    def get_tickets(self):
+        return list(self.store.tickets)
+
+    # Method to retrieve a ticket by ID
+    def get_ticket(self, ticket_id):
+        ticket = self.store.get_ticket(ticket_id)
+        if ticket is None:
+            raise NotFoundError("Invalid ticket selection")
+        return ticket
+
+    # Method to retrieve a ticket's price history, oldest first
+    def get_price_history(self, ticket_id):
+        self.get_ticket(ticket_id)  # Unknown tickets are an error rather than an empty history
+        return [{"version": version, "price": price, "changed_at": changed_at}
+                for version, price, changed_at in self.store.catalog.get_price_history(ticket_id)]
+
+    # Method to retrieve a customer by ID
+    def get_customer(self, customer_id):
+        customer = self.store.get_customer(customer_id)
+        if customer is None:
+            raise NotFoundError("Customer not found")
+        return customer
+
+    # Method to retrieve the seats left for a ticket on a visit date, or None if it is unlimited
+    def get_availability(self, ticket_id, date):
+        return self.store.get_availability(self.get_ticket(ticket_id), date)
+
+    # Method to set the daily cap of a ticket's type (blank or None for unlimited)
+    def set_capacity(self, ticket_id, capacity):
+        ticket = self.get_ticket(ticket_id)
+        if capacity in (None, ""):
+            capacity = None
+        else:
+            try:
+                capacity = int(capacity)
+            except (TypeError, ValueError):
+                raise ValidationError("Invalid capacity value")
+            if capacity < 0:
+                raise ValidationError("Invalid capacity value")
+        self.store.set_capacity(ticket.get_ticket_type(), capacity)
+
+    # Method to validate a new customer account, then hash its password and save it on the password pool
+    def start_register(self, name, email, password, phone):
+        if not all([name, email, password, phone]):
+            raise ValidationError("All fields are required")
+        if not self.validate_email(email):
+            raise ValidationError("Invalid email format")
+        if self.store.is_email_taken(email):
+            raise ValidationError("An account with this email already exists")
+        if not self.validate_phone(phone):
+            raise ValidationError("Invalid phone number format")
+        return self.hasher.submit(
+            lambda: self.store.register_customer(name, email, self.hasher.hash(password), phone))
+
+    # Method to register a new customer account
+    def register(self, name, email, password, phone):
+        return self.start_register(name, email, password, phone).result()
+
+    # Method to check a customer's or an admin's credentials on the password pool; the Future gives the user
+    def start_login(self, email, password, admin=False):
+        if admin:
+            return self.hasher.submit(self.__authenticate, self.store.find_admin_by_email(email), password,
+                                      "Invalid admin credentials")
+        return self.hasher.submit(self.__authenticate, self.store.find_customer_by_email(email), password,
+                                  "Invalid email or password")
+
+    # Method run on the password pool to check a password, upgrading a plaintext or outdated hash it matches
+    def __authenticate(self, user, password, message):
+        if user is None or user.is_locked():
+            self.hasher.verify_dummy(password)  # The time taken must not tell whether the account exists
+            raise AuthenticationError(message)
+        if not user.check_password(password):
+            raise AuthenticationError(message)
+        if self.hasher.needs_rehash(user):
+            self.store.set_password(user, self.hasher.hash(password))
+        return user
+
+    # Method to check a customer's credentials and return the customer
+    def login(self, email, password):
+        return self.start_login(email, password).result()
+
+    # Method to check an admin's credentials and return the admin
+    def admin_login(self, email, password):
+        return self.start_login(email, password, admin=True).result()
+
+    # Method to open a session for a logged-in customer or admin and return its token
+    def open_session(self, user):
+        return self.sessions.open("admin" if isinstance(user, Admin) else "customer", user.get_user_id())
+
+    # Method to find the user a session token belongs to (admin=None accepts either kind)
+    def get_session_user(self, token, admin=None):
+        session = self.sessions.resolve(token)
+        if session is not None and admin in (None, session[0] == "admin"):
+            kind, user_id = session
+            user = self.store.get_admin(user_id) if kind == "admin" else self.store.get_customer(user_id)
+            if user is not None and not user.is_locked():  # Anonymized accounts are signed out
+                return user
+        raise AuthenticationError("Your session has expired, please log in again")
+
+    # Method to end a session
+    def end_session(self, token):
+        self.sessions.close(token)
+
+    # Method to update a customer's profile and return the updated customer
+    def update_profile(self, customer, name, email, phone, expected_version=None):
+        if not self.validate_email(email):
+            raise ValidationError("Invalid email format")
+        if not self.validate_phone(phone):
+            raise ValidationError("Invalid phone number format")
+        if self.store.is_email_taken(email, exclude=customer):
+            raise ValidationError("An account with this email already exists")
+        return self.store.update_customer(customer, name, email, phone, expected_version)
+
+    # Method to delete a customer account with its reservations and payments
+    def delete_customer(self, customer_id, expected_version=None):
+        self.store.remove_customer(self.get_customer(customer_id), expected_version)
+
+    # Method to delete (or anonymize) the customers with no reservations on or after a date; returns the count
+    def apply_retention(self, before, anonymize=False):
+        try:
+            before = datetime.strptime(str(before), "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            raise ValidationError("Invalid date format")
+        return self.store.purge_customers(self.store.find_inactive_customers(before), anonymize)
+
+    # Method to buy a ticket for a visit date and return the paid reservation
+    def purchase(self, customer, ticket_id, date, payment_method):
+        if not all([ticket_id, date, payment_method]):
+            raise ValidationError("All fields are required")
+        try:
+            datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            raise ValidationError("Invalid date format")
+        return self.store.add_reservation(customer, self.get_ticket(ticket_id), date, payment_method)
+
+    # Method to buy several seats for a group in one transaction and return the reservations
+    def purchase_group(self, customer, ticket_id, date, payment_method, quantity):
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            raise ValidationError("Invalid quantity")
+        if quantity < 1:
+            raise ValidationError("Invalid quantity")
+        if quantity == 1:
+            return [self.purchase(customer, ticket_id, date, payment_method)]
+        if not all([ticket_id, date, payment_method]):
+            raise ValidationError("All fields are required")
+        try:
+            datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            raise ValidationError("Invalid date format")
+        return self.store.add_group_reservation(customer, self.get_ticket(ticket_id), date, payment_method, quantity)
+
+    # Method to retrieve a page of a customer's reservations (all of them by default)
+    def get_reservations(self, customer, offset=0, limit=None):
+        customer = self.store.get_customer(customer.get_user_id()) or customer  # The store's current copy
+        reservations = customer.get_reservations()
+        return reservations[offset:] if limit is None else reservations[offset:offset + limit]
+
+    # Method to count a customer's reservations
+    def count_reservations(self, customer):
+        customer = self.store.get_customer(customer.get_user_id()) or customer
+        return customer.count_reservations()
+
+    # Method to retrieve a page of the customer accounts (all of them by default)
+    def get_customers(self, offset=0, limit=None):
+        return self.store.get_customers(offset, limit)
+
+    # Method to count the customer accounts
+    def count_customers(self):
+        return self.store.count_customers()
+
+    # Method to find customers by the start of a name word, email or phone number (or by any part of them)
+    def search_customers(self, query, limit=SEARCH_RESULT_LIMIT, prefix=True):
+        return self.store.search_customers(query, limit, prefix)
+
+    # Method to find reservations by visit date range, ticket type and customer search text
+    def search_reservations(self, start_date="", end_date="", ticket_type="", customer_query="",
+                            limit=SEARCH_RESULT_LIMIT, prefix=True):
+        try:  # Written back as YYYY-MM-DD so the dates compare like the stored ones
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%Y-%m-%d") if start_date else None
+            end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%Y-%m-%d") if end_date else None
+        except ValueError:
+            raise ValidationError("Invalid date format")
+        customers = self.search_customers(customer_query, limit, prefix) if customer_query.strip() else None
+        return self.store.search_reservations(start_date, end_date, ticket_type or None, customers, limit)
+
+    # Method to check a visitor in at the gate by the reservation number on their ticket
+    def check_in(self, reservation_id, today=None):
+        try:
+            reservation_id = int(str(reservation_id).strip())
+        except ValueError:
+            raise ValidationError("Invalid reservation number")
+        return self.store.check_in(reservation_id, today)
+
+    # Method to count the visitors expected on a date (today by default) and how many have checked in
+    def get_gate_summary(self, date=None):
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        expected, checked_in = self.store.count_check_ins(date)
+        return {"date": date, "expected": expected, "checked_in": checked_in}
+
+    # Method to cancel one of a customer's reservations
+    def cancel_reservation(self, customer, reservation_id, expected_version=None):
+        reservation = self.store.get_reservation(reservation_id)
+        if reservation is None or reservation.get_customer().get_user_id() != customer.get_user_id():
+            raise NotFoundError("Reservation not found")
+        self.store.remove_reservation(reservation, expected_version)
+
+    # Method to change a ticket's price
+    def update_ticket_price(self, ticket_id, new_price, expected_version=None):
+        try:
+            price = float(new_price)
+        except (TypeError, ValueError):
+            raise ValidationError("Invalid price value")
+        if price <= 0:
+            raise ValidationError("Invalid price value")
+        self.store.set_ticket_price(self.get_ticket(ticket_id), price, expected_version)
+
+    # Method to summarize sales from the running counters
+    def get_sales_summary(self, today=None):
+        self.store.refresh()  # Include sales made on other terminals
+        metrics = self.store.metrics
+        today = today or datetime.now().date()
+        summary = {
+            "today": metrics.get_day(today),
+            "last_7_days": metrics.get_last_days(7, today),
+            "last_30_days": metrics.get_last_days(30, today),
+            "month_to_date": metrics.get_month_to_date(today),
+            "all_time": metrics.get_totals(),
+        }
+        return {key: {"tickets": tickets, "revenue": revenue} for key, (tickets, revenue) in summary.items()}
+
+    # Method to report revenue by ticket type, the payment-method mix, cancellation rates and attendance forecasts
+    def get_sales_analytics(self, start_date="", end_date="", today=None, forecast_days=14):
+        try:  # Payment date range for the revenue and mix, written back as YYYY-MM-DD
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%Y-%m-%d") if start_date else None
+            end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%Y-%m-%d") if end_date else None
+        except ValueError:
+            raise ValidationError("Invalid date format")
+        self.store.refresh()  # Include sales made on other terminals
+        today = today or datetime.now().date()
+        by_ticket_type, by_method, forecast = self.store.analyze_sales(lambda columns: (
+            columns.by_ticket_type(start_date, end_date), columns.by_payment_method(start_date, end_date),
+            columns.forecast(today, forecast_days)))
+
+        # Cancellations are counted as they happen, as cancelled reservations leave the columns; like the sales,
+        # they are filtered by the payment date of the sale cancelled
+        cancelled = self.store.metrics.get_cancelled_by_ticket_type(start_date, end_date)
+        ticket_types = {}
+        for ticket_type in sorted(set(by_ticket_type) | set(cancelled)):
+            tickets, revenue = by_ticket_type.get(ticket_type, (0, 0))
+            cancelled_tickets = cancelled.get(ticket_type, (0, 0))[0]
+            sold = tickets + cancelled_tickets
+            ticket_types[ticket_type] = {"tickets": tickets, "revenue": round(revenue, 2),
+                                         "cancelled": cancelled_tickets,
+                                         "cancellation_rate": cancelled_tickets / sold if sold else 0.0}
+        total = sum(revenue for _, revenue in by_method.values())
+        payment_methods = {method: {"tickets": tickets, "revenue": round(revenue, 2),
+                                    "share": revenue / total if total else 0.0}
+                           for method, (tickets, revenue) in sorted(by_method.items())}
+        return {"ticket_types": ticket_types, "payment_methods": payment_methods,
+                "forecast": [{"date": date, "booked": booked, "forecast": expected}
+                             for date, booked, expected in forecast]}
+
+
+# HTTP status used for each kind of booking error
+HTTP_ERROR_STATUS = {
+    ValidationError: 400,
+    AuthenticationError: 401,
+    NotFoundError: 404,
+    SoldOutError: 409,
+    ConcurrencyError: 409,
+    BusyError: 503,
+}
+
+# Reason phrases for the HTTP statuses the API sends
+HTTP_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+                405: "Method Not Allowed", 409: "Conflict", 500: "Internal Server Error",
+                503: "Service Unavailable"}
+
+
+# Class representing the asyncio HTTP/JSON front end of the booking service
+class BookingHTTPServer:
+    # Constructor to initialize the service and the address to listen on
+    def __init__(self, service, host="127.0.0.1", port=8080):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.__routes = [  # (method, path pattern, handler)
+            ("GET", re.compile(r"^/tickets$"), self.__list_tickets),
+            ("PUT", re.compile(r"^/tickets/(\d+)/price$"), self.__update_price),
+            ("GET", re.compile(r"^/tickets/(\d+)/prices$"), self.__price_history),
+            ("GET", re.compile(r"^/tickets/(\d+)/availability/(\d{4}-\d{2}-\d{2})$"), self.__availability),
+            ("PUT", re.compile(r"^/tickets/(\d+)/capacity$"), self.__update_capacity),
+            ("POST", re.compile(r"^/customers$"), self.__register),
+            ("DELETE", re.compile(r"^/customers/(\d+)$"), self.__delete_customer),
+            ("POST", re.compile(r"^/customers/retention$"), self.__retention),
+            ("POST", re.compile(r"^/login$"), self.__login),
+            ("POST", re.compile(r"^/admin/login$"), self.__admin_login),
+            ("POST", re.compile(r"^/logout$"), self.__logout),
+            ("GET", re.compile(r"^/reservations$"), self.__list_reservations),
+            ("POST", re.compile(r"^/reservations$"), self.__purchase),
+            ("POST", re.compile(r"^/reservations/group$"), self.__purchase_group),
+            ("DELETE", re.compile(r"^/reservations/(\d+)$"), self.__cancel),
+            ("POST", re.compile(r"^/reservations/(\d+)/check-in$"), self.__check_in),
+            ("GET", re.compile(r"^/gate$"), self.__gate_summary),
+            ("GET", re.compile(r"^/sales$"), self.__sales),
+            ("GET", re.compile(r"^/sales/analytics$"), self.__sales_analytics),
+            ("GET", re.compile(r"^/diagnostics$"), self.__diagnostics),
+        ]
+
+    # Method to run the server until interrupted
+    def serve_forever(self):
+        asyncio.run(self.__serve())
+
+    # Method to accept connections
+    async def __serve(self):
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        async with server:
+            await server.serve_forever()
+
+    # Method to answer every request on one keep-alive connection
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break  # Client closed the connection
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                # Handlers may wait on the password pool, so they run off the event loop
+                status, payload = await asyncio.get_running_loop().run_in_executor(
+                    None, self.dispatch, method, target, headers, body)
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                writer.write(f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass  # Malformed request or dropped connection
+        finally:
+            writer.close()
+
+    # Method to route one request to its handler and turn booking errors into HTTP errors
+    @INSTRUMENTS.measure("http_request")
+    def dispatch(self, method, target, headers, body):
+        path, _, query = target.partition("?")
+        allowed = False
+        for route_method, pattern, handler in self.__routes:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            allowed = True
+            if route_method != method:
+                continue
+            try:
+                data = json.loads(body) if body else {}
+                if query:
+                    data = {**dict(parse_qsl(query)), **data}  # Query parameters, e.g. a GET's date range
+                return handler(headers, data, *match.groups())
+            except BookingError as error:
+                return HTTP_ERROR_STATUS.get(type(error), 400), {"error": str(error)}
+            except (ValueError, TypeError, KeyError) as error:
+                return 400, {"error": f"Malformed request: {error}"}
+            except Exception:
+                # Anything else is a fault on this side (a journal write that failed, a body of the wrong shape):
+                # log it and still answer, so the client is not left with a dropped connection
+                print(f"Error handling {method} {path}:", file=sys.stderr)
+                traceback.print_exc()
+                return 500, {"error": "Internal server error"}
+        return (405, {"error": "Method not allowed"}) if allowed else (404, {"error": "Not found"})
+
+    # Method to read the caller's session token, or HTTP Basic credentials, from the request headers
+    def __credentials(self, headers):
+        scheme, _, encoded = headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer":
+            return encoded.strip(), None  # Session token from /login or /admin/login
+        if scheme.lower() != "basic":
+            raise AuthenticationError("Credentials required")
+        try:
+            email, _, password = base64.b64decode(encoded).decode().partition(":")
+        except ValueError:
+            raise AuthenticationError("Credentials required")
+        return email, password
+
+    # Methods to authenticate the caller as a customer or as an admin (a token skips the password check)
+    def __customer(self, headers):
+        email_or_token, password = self.__credentials(headers)
+        if password is None:
+            return self.service.get_session_user(email_or_token, admin=False)
+        return self.service.login(email_or_token, password)
+
+    def __admin(self, headers):
+        email_or_token, password = self.__credentials(headers)
+        if password is None:
+            return self.service.get_session_user(email_or_token, admin=True)
+        return self.service.admin_login(email_or_token, password)
+
+    # Methods to convert domain objects into JSON-ready dictionaries
+    def __ticket_json(self, ticket):
+        return {"ticket_id": ticket.get_ticket_id(), "ticket_type": ticket.get_ticket_type(),
+                "price": ticket.get_price(), "validity": ticket.get_validity(),
+                "description": ticket.get_description(), "limitations": ticket.get_limitations(),
+                "discount": ticket.get_discount(), "version": ticket.get_version()}
+
+    def __customer_json(self, customer):
+        return {"customer_id": customer.get_user_id(), "name": customer.get_name(),
+                "email": customer.get_email(), "phone_number": customer.get_phone_number(),
+                "version": customer.get_version()}
+
+    def __reservation_json(self, reservation):
+        payment = reservation.get_payment()
+        return {"reservation_id": reservation.get_reservation_id(),
+                "customer_id": reservation.get_customer().get_user_id(),
+                "ticket_id": reservation.get_ticket().get_ticket_id(), "date": reservation.get_date(),
+                "checked_in": reservation.get_checked_in(), "version": reservation.get_version(),
+                "payment": None if payment is None else {
+                    "payment_id": payment.get_payment_id(), "amount": payment.get_amount(),
+                    "quantity": payment.get_quantity(),
+                    "payment_method": payment.get_payment_method(), "date": payment.get_date()}}
+
+    # Request handlers, each returning (status, JSON payload)
+    def __list_tickets(self, headers, data):
+        return 200, [self.__ticket_json(ticket) for ticket in self.service.get_tickets()]
+
+    def __update_price(self, headers, data, ticket_id):
+        self.__admin(headers)
+        self.service.update_ticket_price(int(ticket_id), data["price"], data.get("version"))
+        return 200, self.__ticket_json(self.service.get_ticket(int(ticket_id)))
+
+    def __price_history(self, headers, data, ticket_id):
+        return 200, self.service.get_price_history(int(ticket_id))
+
+    def __availability(self, headers, data, ticket_id, date):
+        ticket = self.service.get_ticket(int(ticket_id))
+        return 200, {"ticket_id": ticket.get_ticket_id(), "date": date,
+                     "capacity": self.service.store.inventory.get_capacity(ticket.get_ticket_type()),
+                     "available": self.service.get_availability(int(ticket_id), date)}
+
+    def __update_capacity(self, headers, data, ticket_id):
+        self.__admin(headers)
+        self.service.set_capacity(int(ticket_id), data.get("capacity"))
+        return 200, {"ticket_id": int(ticket_id), "capacity": data.get("capacity")}
+
+    def __register(self, headers, data):
+        customer = self.service.register(data.get("name", ""), data.get("email", ""), data.get("password", ""),
+                                         data.get("phone_number", ""))
+        return 201, self.__customer_json(customer)
+
+    def __delete_customer(self, headers, data, customer_id):
+        self.__admin(headers)
+        self.service.delete_customer(int(customer_id), data.get("version"))
+        return 200, {"deleted": int(customer_id)}
+
+    def __retention(self, headers, data):
+        self.__admin(headers)
+        anonymize = bool(data.get("anonymize"))
+        count = self.service.apply_retention(data.get("before", ""), anonymize)
+        return 200, {"anonymized" if anonymize else "deleted": count}
+
+    def __login(self, headers, data):
+        customer = self.service.login(data.get("email", ""), data.get("password", ""))
+        return 200, {**self.__customer_json(customer), "token": self.service.open_session(customer)}
+
+    def __admin_login(self, headers, data):
+        admin = self.service.admin_login(data.get("email", ""), data.get("password", ""))
+        return 200, {"admin_id": admin.get_user_id(), "name": admin.get_name(),
+                     "token": self.service.open_session(admin)}
+
+    def __logout(self, headers, data):
+        token, password = self.__credentials(headers)
+        if password is None:
+            self.service.end_session(token)
+        return 200, {"logged_out": True}
+
+    def __list_reservations(self, headers, data):
+        customer = self.__customer(headers)
+        return 200, [self.__reservation_json(reservation) for reservation in self.service.get_reservations(customer)]
+
+    def __purchase(self, headers, data):
+        customer = self.__customer(headers)
+        reservation = self.service.purchase(customer, data.get("ticket_id"), data.get("date", ""),
+                                            data.get("payment_method", ""))
+        return 201, self.__reservation_json(reservation)
+
+    def __purchase_group(self, headers, data):
+        customer = self.__customer(headers)
+        reservations = self.service.purchase_group(customer, data.get("ticket_id"), data.get("date", ""),
+                                                   data.get("payment_method", ""), data.get("quantity"))
+        return 201, [self.__reservation_json(reservation) for reservation in reservations]
+
+    def __cancel(self, headers, data, reservation_id):
+        self.service.cancel_reservation(self.__customer(headers), int(reservation_id), data.get("version"))
+        return 200, {"cancelled": int(reservation_id)}
+
+    def __check_in(self, headers, data, reservation_id):
+        self.__admin(headers)
+        return 200, self.__reservation_json(self.service.check_in(reservation_id))
+
+    def __gate_summary(self, headers, data):
+        self.__admin(headers)
+        return 200, self.service.get_gate_summary()
+
+    def __sales(self, headers, data):
+        self.__admin(headers)
+        return 200, self.service.get_sales_summary()
+
+    def __sales_analytics(self, headers, data):
+        self.__admin(headers)
+        return 200, self.service.get_sales_analytics(data.get("start", ""), data.get("end", ""))
+
+    def __diagnostics(self, headers, data):
+        self.__admin(headers)
+        return 200, INSTRUMENTS.get_snapshot()
+
+
+# Default SQLite database written by --migrate-sqlite
+DATABASE_FILE = "adventureland.db"
+
+# Tables and indexes of the SQLite database (an email belongs to one customer, as in the data store)
+DATABASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    customer_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL,
+    phone_number TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_email_unique ON customers (email COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS admins (
+    admin_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_admins_email ON admins (email COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket_id INTEGER PRIMARY KEY,
+    ticket_type TEXT NOT NULL,
+    price NUMERIC NOT NULL,
+    validity TEXT,
+    description TEXT,
+    limitations TEXT,
+    discount TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS reservations (
+    reservation_id INTEGER PRIMARY KEY,
+    customer_id INTEGER NOT NULL,
+    ticket_id INTEGER NOT NULL,
+    visit_date TEXT NOT NULL,
+    payment_id INTEGER,
+    checked_in TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_customer ON reservations (customer_id);
+CREATE INDEX IF NOT EXISTS idx_reservations_visit_date ON reservations (visit_date);
+
+CREATE TABLE IF NOT EXISTS payments (
+    payment_id INTEGER PRIMARY KEY,
+    reservation_id INTEGER,
+    amount NUMERIC NOT NULL,
+    payment_method TEXT NOT NULL,
+    payment_date TEXT NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    refund_of INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_payments_reservation ON payments (reservation_id);
+CREATE INDEX IF NOT EXISTS idx_payments_date ON payments (payment_date);
+
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Columns added to the tables since the first schema, with the record format that added them; a database
+# created earlier gets them on open (keep in step with RECORD_FORMAT_VERSION and the records' to_record)
+DATABASE_UPGRADES = (
+    (2, "payments", "quantity", "INTEGER NOT NULL DEFAULT 1"),
+    (2, "reservations", "payment_id", "INTEGER"),
+    (3, "reservations", "checked_in", "TEXT"),
+    (4, "payments", "refund_of", "INTEGER"),
+    (5, "customers", "version", "INTEGER NOT NULL DEFAULT 1"),
+    (5, "tickets", "version", "INTEGER NOT NULL DEFAULT 1"),
+    (5, "reservations", "version", "INTEGER NOT NULL DEFAULT 1"),
+)
+
+# Columns of each table in the order of the matching record, so rows and records convert directly
+DATABASE_RECORD_COLUMNS = {
+    "customers": "customer_id, name, email, password, phone_number, version",
+    "admins": "admin_id, name, email, password, role",
+    "tickets": "ticket_id, ticket_type, price, validity, description, limitations, discount, version",
+    "reservations": "reservation_id, customer_id, ticket_id, visit_date, payment_id, checked_in, version",
+    "payments": "payment_id, amount, payment_method, payment_date, reservation_id, quantity, refund_of",
+}
+
+
+# Class representing the SQLite database the pickle data is migrated to: the one-off import, and the reads that
+# check it (the application itself runs on the DataStore)
+class SQLiteRepository:
+    # Constructor to open the database and make sure the schema exists
+    def __init__(self, path=DATABASE_FILE):
+        self.__connection = sqlite3.connect(path, check_same_thread=False)  # Usable from any thread
+        self.__connection.execute("PRAGMA journal_mode=WAL")  # Readers are not blocked by a writer
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.executescript(DATABASE_SCHEMA)
+        self.__lock = threading.Lock()  # sqlite3 connections must not be used by two threads at once
+        self.__tickets = None  # Ticket objects are few, so they are cached after the first read
+        self.__upgrade()
+
+    # Method to add the columns a database created by an earlier version is missing, and record the format
+    def __upgrade(self):
+        stored = self.__query("SELECT value FROM metadata WHERE key = 'record_format_version'")
+        version = int(stored[0][0]) if stored else 1
+        if version > RECORD_FORMAT_VERSION:
+            raise ValueError(f"This database was written by a newer version (format {version})")
+        statements = [("DROP INDEX IF EXISTS idx_customers_email", ())]  # Not unique: replaced by the schema's
+        for added_in, table, column, declaration in DATABASE_UPGRADES:
+            if column not in [row[1] for row in self.__query(f"PRAGMA table_info({table})")]:
+                statements.append((f"ALTER TABLE {table} ADD COLUMN {column} {declaration}", ()))
+                if (table, column) == ("reservations", "payment_id"):
+                    # Earlier rows paid with the payment that names them
+                    statements.append(("UPDATE reservations SET payment_id = (SELECT p.payment_id FROM payments p "
+                                       "WHERE p.reservation_id = reservations.reservation_id LIMIT 1)", ()))
+        statements.append(("INSERT OR REPLACE INTO metadata VALUES ('record_format_version', ?)",
+                           (str(RECORD_FORMAT_VERSION),)))
+        self.__write(statements)
+
+    # Method to run a query and return every row
+    def __query(self, sql, params=()):
+        with self.__lock:
+            return self.__connection.execute(sql, params).fetchall()
+
+    # Method to run one or more statements inside a single transaction
+    def __write(self, statements):
+        with self.__lock, self.__connection:  # The connection context commits, or rolls back on error
+            for sql, params in statements:
+                self.__connection.execute(sql, params)
+
+    # Method to build a customer from a table row
+    def __customer_from_row(self, row):
+        return Customer.from_record(row)
+
+    # Method to build a reservation from a table row
+    # (the customer and payment columns come from the same row, so a list of reservations is one query)
+    def __reservation_from_row(self, row, customers):
+        reservation_record, customer_record, payment_record = row[:7], row[7:13], row[13:]
+        customer = customers.get(reservation_record[1])
+        if customer is None:
+            customer = customers[reservation_record[1]] = Customer.from_record(customer_record)
+        payments = {}
+        if payment_record[0] is not None:
+            payments[payment_record[0]] = Payment.from_record(payment_record)  # Keeps the stored payment date
+        if self.__tickets is None:
+            self.list_tickets()
+        return Reservation.from_record(reservation_record, customers, self.__tickets, payments)
+
+    # Columns selected for a reservation together with its customer and its payment
+    RESERVATION_COLUMNS = """
+        SELECT r.reservation_id, r.customer_id, r.ticket_id, r.visit_date, r.payment_id, r.checked_in, r.version,
+               c.customer_id, c.name, c.email, c.password, c.phone_number, c.version,
+               p.payment_id, p.amount, p.payment_method, p.payment_date, p.reservation_id, p.quantity, p.refund_of
+        FROM reservations r JOIN customers c ON c.customer_id = r.customer_id
+        LEFT JOIN payments p ON p.payment_id = r.payment_id
+    """
+
+    # Method to retrieve one page of customers ordered by ID
+    def list_customers(self, offset=0, limit=100):
+        rows = self.__query(f"SELECT {DATABASE_RECORD_COLUMNS['customers']} FROM customers "
+                            "ORDER BY customer_id LIMIT ? OFFSET ?", (limit, offset))
+        return [self.__customer_from_row(row) for row in rows]
+
+    # Method to count the stored customers
+    def count_customers(self):
+        return self.__query("SELECT COUNT(*) FROM customers")[0][0]
+
+    # Method to retrieve every ticket
+    def list_tickets(self):
+        if self.__tickets is None:
+            rows = self.__query(f"SELECT {DATABASE_RECORD_COLUMNS['tickets']} FROM tickets ORDER BY ticket_id")
+            self.__tickets = {row[0]: Ticket.from_record(row) for row in rows}
+        return list(self.__tickets.values())
+
+    # Method to build the statement inserting a record into a table
+    def __insert(self, table, record):
+        return (f"INSERT INTO {table} ({DATABASE_RECORD_COLUMNS[table]}) VALUES ({', '.join('?' * len(record))})",
+                record)
+
+    # Method to retrieve the reservations for one visit date (served by the visit_date index)
+    def reservations_on(self, visit_date):
+        rows = self.__query(self.RESERVATION_COLUMNS + " WHERE r.visit_date = ? ORDER BY r.reservation_id",
+                            (visit_date,))
+        customers = {}  # One object per customer, built from the joined columns
+        return [self.__reservation_from_row(row, customers) for row in rows]
+
+    # Method to retrieve the payments made between two dates, inclusive (served by the payment_date index)
+    def payments_between(self, start_date, end_date):
+        rows = self.__query(f"SELECT {DATABASE_RECORD_COLUMNS['payments']} FROM payments "
+                            "WHERE payment_date BETWEEN ? AND ? ORDER BY payment_id", (start_date, end_date))
+        return [Payment.from_record(row) for row in rows]
+
+    # Method to copy every record of a data store into the database, once
+    def import_store(self, store):
+        if self.__query("SELECT value FROM metadata WHERE key = 'migrated_from_pickles'"):
+            raise ValueError("This database has already been migrated from the pickle files")
+
+        # Records refer to each other by ID; the first record seen for an ID wins, as in the store's indexes
+        # (each table takes the same records as the snapshot files, so nothing in the current format is left out)
+        statements = []
+        for table, items, removed in (("customers", store.customers, Customer.get_deleted),
+                                      ("admins", store.admins, None),
+                                      ("tickets", store.tickets, None),
+                                      ("reservations", store.reservations, Reservation.get_cancelled),
+                                      ("payments", store.payments, Payment.get_deleted)):
+            seen = set()
+            for item in items:
+                if removed is not None and removed(item) is not None:
+                    continue  # Tombstone of a deleted or cancelled record (a refund is among the payments)
+                record = item.to_record()
+                if record[0] not in seen:
+                    seen.add(record[0])
+                    statements.append(self.__insert(table, record))  # A constraint failure aborts the migration
+        statements.append(("INSERT INTO metadata VALUES ('migrated_from_pickles', ?)",
+                           (datetime.now().isoformat(timespec="seconds"),)))
+        self.__write(statements)  # All or nothing
+        self.__tickets = None
+
+    # Method to close the database connection
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+
+# Function to migrate the pickle files (and any journaled changes) into a SQLite database
+def migrate_pickles_to_sqlite(data_dir=".", database=DATABASE_FILE):
+    store = DataStore(data_dir)  # Loads the snapshots and replays the journal
+    repository = SQLiteRepository(os.path.join(data_dir, database))
+    try:
+        repository.import_store(store)
+        payments = sum(1 for payment in store.payments if payment.get_deleted() is None)
+        return repository.count_customers(), store.count_reservations(), payments
+    finally:
+        repository.close()
+        store.close()
+
+
+# Columns written by the reservation exporter, with their types
+EXPORT_COLUMNS = (("reservation_id", "int"), ("customer_id", "int"), ("ticket_id", "int"), ("ticket_type", "str"),
+                  ("price", "float"), ("visit_date", "str"), ("payment_id", "int"), ("payment_date", "str"),
+                  ("payment_method", "str"), ("refund_of", "int"))
+
+# Rows formatted and written at a time (the rows of an extract are never all held at once)
+EXPORT_CHUNK_SIZE = 10000
+
+# Magic bytes that start a columnar export file
+COLUMNAR_MAGIC = b"ALCOLS\r\n"
+
+# Array type codes of the numeric export column types
+COLUMN_TYPECODES = {"int": "q", "float": "d"}
+
+
+# Function to retrieve the share of a payment record's amount paid for one seat
+def seat_amount(payment):
+    return payment[1] if payment[5] == 1 else payment[1] / payment[5]
+
+
+# Function to flatten a reservation record and a payment into one export row: a seat sold, or a refund (its
+# price is negative and refund_of names the payment refunded)
+def export_row(reservation_id, reservation, tickets, payment):
+    if reservation is None:  # Cancelled before the last compaction: only its payments are left to describe it
+        customer_id, ticket_id, date, ticket_type = 0, 0, "", ""
+    else:
+        customer_id, ticket_id, date = reservation[:3]
+        ticket_type, price = tickets[ticket_id]
+    if payment is None:  # Sold before payments were linked: list price, no payment details
+        return reservation_id, customer_id, ticket_id, ticket_type, float(price), date, 0, "", "", 0
+    return (reservation_id, customer_id, ticket_id, ticket_type, float(seat_amount(payment)), date, payment[0],
+            payment[3], payment[2], payment[6] or 0)
+
+
+# Exception raised when snapshot records are not in the ID order the streaming export joins them in
+class UnorderedSnapshotError(ValueError):
+    pass
+
+
+# Function to join streamed reservation and payment records by payment ID, yielding (payment, seats) with the
+# reservation records each payment paid for (None for reservations without a payment); the store appends both in
+# ID order, so only the current payment's seats are held
+def join_snapshot_records(reservation_chunks, payment_chunks):
+    payments = (record for chunk in payment_chunks for record in chunk)
+    payment, seats = next(payments, None), []
+    last = -1  # Payment ID of the last reservation with one
+    for chunk in reservation_chunks:
+        for reservation in chunk:
+            if len(reservation) < 5:
+                raise UnorderedSnapshotError("reservations written before they named their payment")
+            payment_id = reservation[4]
+            if payment_id is None:
+                yield None, [reservation]  # Sold before payments were linked
+                continue
+            if payment_id < last:
+                raise UnorderedSnapshotError("reservations out of payment order")
+            last = payment_id
+            while payment is not None and payment[0] < payment_id:
+                yield tuple(payment) + (1, None)[len(payment) - 5:], seats
+                following = next(payments, None)
+                if following is not None and following[0] <= payment[0]:
+                    raise UnorderedSnapshotError("payments out of ID order")
+                payment, seats = following, []
+            if payment is not None and payment[0] == payment_id:
+                seats.append(reservation)
+            else:
+                yield None, [reservation]  # Its payment is missing: listed at list price, as the store does
+    while payment is not None:
+        yield tuple(payment) + (1, None)[len(payment) - 5:], seats
+        following = next(payments, None)
+        if following is not None and following[0] <= payment[0]:
+            raise UnorderedSnapshotError("payments out of ID order")
+        payment, seats = following, []
+
+
+# Class representing the journal changes made after the snapshot an export streams, replayed at record level:
+# only what alters the exported rows (mirrors DataStore.__apply), held until the snapshot rows have gone past
+class ExportJournalTail:
+    # Constructor to replay the journal records after a snapshot's position onto its tickets
+    def __init__(self, tickets, records, snapshot_lsn):
+        self.__tickets = tickets  # Ticket ID -> (type, price)
+        self.__deleted = set()  # Customers deleted in the tail (their active reservations and sales go with them)
+        self.__cancelled = {}  # Reservation ID -> [refund ID, refund date, (reservation, payment) once streamed]
+        self.__reservations = {}  # Payment ID -> reservation records added in the tail
+        self.__payments = {}  # Payment ID -> payment record added in the tail
+        for lsn, op, *args in (record for record in records if record[0] > snapshot_lsn):
+            if op == "delete_customer" or (op == "purge_customers" and not args[1]):  # Anonymizing keeps the rows
+                self.__deleted.update(args[:1] if op == "delete_customer" else args[0])
+            elif op == "put_ticket":
+                tickets.setdefault(args[0], (args[1], args[2]))
+            elif op == "set_ticket_price":
+                if args[0] in tickets:
+                    tickets[args[0]] = (tickets[args[0]][0], args[1])
+            elif op in ("add_reservation", "add_group_reservation"):
+                reservation_ids, customer_id, ticket_id, date, payment_id, amount, payment_method, payment_date = args
+                if op == "add_reservation":
+                    reservation_ids = (reservation_ids,)
+                self.__payments[payment_id] = (payment_id, amount, payment_method, payment_date, reservation_ids[0],
+                                               len(reservation_ids), None)
+                self.__reservations[payment_id] = [(reservation_id, customer_id, ticket_id, date, payment_id, None)
+                                                   for reservation_id in reservation_ids]
+            elif op == "remove_reservation":
+                reservation_id, *refund = args
+                self.__cancelled.setdefault(reservation_id, (refund + [None, None])[:2] + [None])
+
+    # Method to build the rows of one payment and the seats it paid for: the active seats for a full export, or
+    # for an incremental one (since and until set) the payment's rows if it falls between them
+    def rows(self, payment, seats, since=None, until=None):
+        seats = [seat for seat in seats if seat[2] in self.__tickets]
+        for seat in seats:
+            cancelled = self.__cancelled.get(seat[0])
+            if cancelled is not None:
+                cancelled[2] = (seat, payment)  # Describes its refund, once the snapshot rows are written
+        if since is None:  # The active reservations (a cancelled sale and its refund cancel out)
+            return [export_row(seat[0], seat[1:], self.__tickets, payment) for seat in seats
+                    if seat[0] not in self.__cancelled and seat[1] not in self.__deleted]
+        if payment is None or not since < payment[3] < until or any(
+                seat[1] in self.__deleted and seat[0] not in self.__cancelled for seat in seats):
+            return []  # Outside the window, or deleted along with its customer, not refunded
+        if payment[6] is not None:  # Refund of a seat cancelled before the last compaction
+            return [export_row(payment[4], None, self.__tickets, payment)]
+        # A cancelled seat of a deleted customer is left undescribed, as it is once compacted
+        seats = [seat for seat in seats if seat[1] not in self.__deleted]
+        rows = [export_row(seat[0], seat[1:], self.__tickets, payment) for seat in seats]
+        for _ in range(payment[5] - len(seats)):  # Seats cancelled before the last compaction
+            rows.append(export_row(payment[4] if payment[5] == 1 else 0, None, self.__tickets, payment))
+        return rows
+
+    # Method to build the rows of the sales made in the tail, then of the refunds it gave (for an incremental export)
+    def tail_rows(self, since=None, until=None):
+        rows = []
+        for payment_id, payment in self.__payments.items():
+            rows += self.rows(payment, self.__reservations[payment_id], since, until)
+        if since is not None:
+            for reservation_id, (refund_id, date, sold) in self.__cancelled.items():
+                if refund_id is not None and sold is not None and sold[1] is not None and since < date < until:
+                    seat, payment = sold
+                    refund = (refund_id, -seat_amount(payment), payment[2], date, reservation_id, 1, payment[0])
+                    seat = None if seat[1] in self.__deleted else seat[1:]
+                    rows.append(export_row(reservation_id, seat, self.__tickets, refund))
+        return rows
+
+
+# Function to stream the rows of an export from one consistent snapshot set, with the journal tail replayed on top:
+# the snapshots and journal are only read (no Journal, no file created), and the reservations and payments are
+# joined a chunk at a time; in_memory loads and sorts them first, for files not written in ID order
+def export_rows(data_dir=".", since=None, until=None, in_memory=False):
+    lock_path = os.path.join(data_dir, STORE_LOCK_FILE)
+    journal_path = os.path.join(data_dir, JOURNAL_FILE)
+    # No terminal compacts while the set is picked and opened; the open files stay readable once replaced
+    with FileLock(lock_path) if os.path.exists(lock_path) else nullcontext():
+        files, records = read_snapshot_set(data_dir, lambda after: read_journal(journal_path, after), open_snapshot)
+    try:
+        def chunks(name):
+            filename = SNAPSHOT_FILES[name]
+            if filename not in files:
+                return iter(())
+            payloads = iter_snapshot_records(filename, files[filename])
+            data = next(payloads)
+            if isinstance(data, tuple) and data[:1] == (RECORD_CHUNKS_TAG,):
+                if data[1] > RECORD_FORMAT_VERSION:
+                    raise ValueError(f"{filename} was written by a newer version (format {data[1]})")
+                return payloads
+            return iter([snapshot_records(filename, data)])  # Written in one piece: every record at once
+
+        # Ticket ID -> (type, price); the journal position the snapshots were written at
+        tickets = {}
+        for chunk in chunks("tickets"):
+            for record in chunk:
+                tickets.setdefault(record[0], (record[1], record[2]))
+        lsn = 0
+        if SNAPSHOT_META_FILE in files:
+            lsn = load_snapshot_payload(SNAPSHOT_META_FILE, files[SNAPSHOT_META_FILE]) or 0
+        tail = ExportJournalTail(tickets, records, lsn)
+
+        reservations, payments = chunks("reservations"), chunks("payments")
+        if in_memory:
+            # The first record seen for an ID wins, as in the store's indexes; reservations written before they
+            # named their payment are linked through the payment's reservation ID
+            payments = {record[0]: record for chunk in reversed(list(payments)) for record in reversed(chunk)}
+            reservations = {record[0]: list(record) + [None] * (5 - len(record))
+                            for chunk in reversed(list(reservations)) for record in reversed(chunk)}
+            for payment in payments.values():
+                reservation = reservations.get(payment[4])
+                if reservation is not None and reservation[4] not in payments:
+                    reservation[4] = payment[0]
+            reservations = [sorted(reservations.values(), key=lambda record: -1 if record[4] is None else record[4])]
+            payments = [sorted(payments.values())]
+        for payment, seats in join_snapshot_records(reservations, payments):
+            yield from tail.rows(payment, seats, since, until)
+        yield from tail.tail_rows(since, until)
+    finally:
+        for file in files.values():
+            file.close()
+
+
+# Class representing an export file in CSV format
+class CsvExportWriter:
+    # Constructor to initialize the writer on a text file and write the header row
+    def __init__(self, file):
+        self.__writer = csv.writer(file)
+        self.__writer.writerow([name for name, _ in EXPORT_COLUMNS])
+
+    # Method to write a chunk of rows
+    def write_rows(self, rows):
+        self.__writer.writerows(rows)
+
+
+# Class representing an export file in a compact columnar format: one compressed block per column per chunk
+class ColumnarExportWriter:
+    # Constructor to initialize the writer on a binary file and write the schema
+    def __init__(self, file):
+        self.__file = file
+        schema = json.dumps({"columns": EXPORT_COLUMNS, "byteorder": sys.byteorder}).encode()
+        file.write(COLUMNAR_MAGIC + RECORD_HEADER.pack(len(schema)) + schema)
+
+    # Method to write a chunk of rows as a row group: its row count, then each column
+    def write_rows(self, rows):
+        if not rows:
+            return
+        self.__file.write(RECORD_HEADER.pack(len(rows)))
+        for (name, kind), values in zip(EXPORT_COLUMNS, zip(*rows)):
+            if kind == "str":
+                # Dictionary-encode the column: its few distinct values, then one code per row
+                words = list(dict.fromkeys(values))
+                codes = {word: code for code, word in enumerate(words)}
+                dictionary = json.dumps(words).encode()
+                block = RECORD_HEADER.pack(len(dictionary)) + dictionary + array("I", map(codes.get, values)).tobytes()
+            else:
+                block = array(COLUMN_TYPECODES[kind], values).tobytes()
+            block = zlib.compress(block, 1)
+            self.__file.write(RECORD_HEADER.pack(len(block)) + block)
+
+
+# Function to read a columnar export one row group at a time, as a dict of column name -> values
+def read_columnar(path):
+    with open(path, 'rb') as file:
+        if file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} is not a columnar export")
+        schema = json.loads(file.read(RECORD_HEADER.unpack(file.read(RECORD_HEADER.size))[0]))
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if not header:
+                return
+            rows = RECORD_HEADER.unpack(header)[0]
+            group = {}
+            for name, kind in schema["columns"]:
+                block = zlib.decompress(file.read(RECORD_HEADER.unpack(file.read(RECORD_HEADER.size))[0]))
+                if kind == "str":
+                    size = RECORD_HEADER.unpack_from(block)[0]
+                    words = json.loads(block[RECORD_HEADER.size:RECORD_HEADER.size + size])
+                    codes = array("I")
+                    codes.frombytes(block[RECORD_HEADER.size + size:])
+                    values = [words[code] for code in codes]
+                else:
+                    values = array(COLUMN_TYPECODES[kind])
+                    values.frombytes(block)
+                    if schema["byteorder"] != sys.byteorder:
+                        values.byteswap()
+                if len(values) != rows:
+                    raise ValueError(f"{path} is damaged: column {name} has {len(values)} of {rows} values")
+                group[name] = values
+            yield group
+
+
+# Function to export reservations with their payments to CSV or columnar format, chunk by chunk
+# (streamed from the snapshot records, so the memory used is that of a chunk and the journal tail)
+def export_reservations(path, data_dir=".", export_format="csv", watermark_file=None, today=None):
+    # A full export lists the active reservations (a cancelled sale and its refund cancel out). An incremental
+    # export writes every payment of the complete days after the watermark, up to yesterday: the seats sold then,
+    # even if cancelled since, and the refunds, so the extracts add up to the revenue
+    since = until = None
+    if watermark_file is not None:
+        try:
+            with open(watermark_file) as file:
+                since = file.read().strip()
+        except FileNotFoundError:
+            since = ""  # First run: every complete day
+        until = (today or datetime.now().date()).strftime("%Y-%m-%d")
+
+    # Write to a temporary file and rename it, so a nightly job never picks up half an extract
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    for in_memory in (False, True):
+        try:
+            rows = 0
+            with (open(temp_path, 'w', newline='') if export_format == "csv" else open(temp_path, 'wb')) as file:
+                writer = CsvExportWriter(file) if export_format == "csv" else ColumnarExportWriter(file)
+                selected = export_rows(data_dir, since, until, in_memory)
+                chunk = list(islice(selected, EXPORT_CHUNK_SIZE))
+                while chunk:
+                    writer.write_rows(chunk)
+                    rows += len(chunk)
+                    chunk = list(islice(selected, EXPORT_CHUNK_SIZE))
+                file.flush()
+                os.fsync(file.fileno())
+            break
+        except UnorderedSnapshotError:
+            continue  # Records out of ID order (an older or hand-written file): start over, sorting them in memory
+    os.replace(temp_path, path)
+
+    # Move the watermark on only once the extract is in place
+    watermark = None
+    if watermark_file is not None:
+        watermark = (datetime.strptime(until, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+        watermark = max(since, watermark)
+        with open(watermark_file + ".tmp", 'w') as file:
+            file.write(watermark + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(watermark_file + ".tmp", watermark_file)
+    return rows, watermark
+
+
+# Most screens kept built at once, and how long a screen may go unused before it is destroyed
+SCREEN_CACHE_SIZE = 8
+SCREEN_IDLE_SECONDS = 300
+
+
+# Class representing the screens of the window: each is built once, then hidden and raised again
+class ScreenManager:
+    # Constructor to initialize the cache for a window
+    def __init__(self, root, capacity=SCREEN_CACHE_SIZE, idle_seconds=SCREEN_IDLE_SECONDS):
+        self.__root = root
+        self.__capacity = capacity
+        self.__idle_seconds = idle_seconds
+        self.__screens = {}  # Name -> [container, refresh callback, key, last shown], least recently used first
+        self.__current = None  # Container on screen
+        self.__transient = None  # Container of an uncached screen, destroyed when it is left
+
+    # Method to raise a cached screen, returning False if it has to be built (not cached or built for another key)
+    @INSTRUMENTS.measure("screen_show")
+    def show(self, name, key=None):
+        screen = self.__screens.pop(name, None)
+        if screen is None:
+            return False
+        if screen[2] != key:
+            self.__destroy(screen[0])  # Built for other data (another user, changed tickets)
+            return False
+        self.__screens[name] = screen  # Most recently used
+        self.__leave()
+        screen[3] = time.monotonic()
+        screen[0].pack(expand=True, fill='both')
+        self.__current = screen[0]
+        if screen[1] is not None:
+            screen[1]()  # Update only what may have changed while it was hidden
+        self.__evict()
+        return True
+
+    # Method to start building a screen and return the container its widgets go into
+    @INSTRUMENTS.measure("screen_create")
+    def create(self, name, key=None, cache=True):
+        self.__leave()
+        container = ttk.Frame(self.__root)
+        container.pack(expand=True, fill='both')
+        self.__current = container
+        if cache:
+            old = self.__screens.pop(name, None)
+            if old is not None:
+                self.__destroy(old[0])
+            self.__screens[name] = [container, None, key, time.monotonic()]
+            self.__evict()
+        else:
+            self.__transient = container
+        return container
+
+    # Method to set what to update when a cached screen is raised again
+    def on_show(self, name, refresh):
+        if name in self.__screens:
+            self.__screens[name][1] = refresh
+
+    # Method to destroy cached screens (all of them if no names are given), e.g. when the user logs out
+    def discard(self, *names):
+        for name in names or list(self.__screens):
+            screen = self.__screens.pop(name, None)
+            if screen is not None:
+                self.__destroy(screen[0])
+
+    # Method to destroy a screen's container, forgetting it if it is on display
+    def __destroy(self, container):
+        if container is self.__current:
+            self.__current = None
+        container.destroy()
+
+    # Method to hide the screen on display, destroying it if it is not cached
+    def __leave(self):
+        if self.__transient is not None:
+            self.__transient.destroy()
+            self.__transient = None
+        elif self.__current is not None:
+            self.__current.pack_forget()
+        self.__current = None
+
+    # Method to destroy the least recently used screens beyond the capacity, and screens unused for too long
+    def __evict(self):
+        oldest = time.monotonic() - self.__idle_seconds
+        for name, screen in list(self.__screens.items()):
+            if screen[0] is self.__current:
+                continue
+            if len(self.__screens) > self.__capacity or screen[3] < oldest:
+                del self.__screens[name]
+                screen[0].destroy()
+
+    # Method to retrieve the names of the cached screens, least recently used first
+    def get_cached(self):
+        return list(self.__screens)
+
+
+# Class representing a list that shows one page of rows at a time in a Treeview, fetching pages on demand
+class PagedTreeview(ttk.Frame):
+    # Constructor to initialize the table, its scrollbar and the page controls
+    def __init__(self, master, columns, fetch, count, row_values, row_key, page_size=100, height=15,
+                 discard=None):
+        super().__init__(master)
+        self.__discard = discard  # discard(item) drops a removed item from a list the caller owns
+        self.__fetch = fetch  # fetch(offset, limit) -> items on a page
+        self.__count = count  # count() -> number of items in the whole list
+        self.__row_values = row_values  # row_values(item) -> tuple of column values
+        self.__row_key = row_key  # row_key(item) -> unique row ID
+        self.__page_size = page_size  # Rows created at once, however long the list is
+        self.__offset = 0  # Position of the first row on the current page
+        self.__items = {}  # Row ID -> item shown in that row
+
+        # Table with one heading per column and a vertical scrollbar
+        table_frame = ttk.Frame(self)
+        table_frame.pack(fill='both', expand=True)
+        self.tree = ttk.Treeview(table_frame, columns=[name for name, _ in columns], show="headings",
+                                 height=height, selectmode="browse")
+        for name, width in columns:
+            self.tree.heading(name, text=name)
+            self.tree.column(name, width=width, anchor='w')
+        scrollbar = ttk.Scrollbar(table_frame, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+
+        # Page controls
+        controls = ttk.Frame(self)
+        controls.pack(fill='x', pady=5)
+        ttk.Button(controls, text="< Previous", command=self.previous_page).pack(side='left')
+        ttk.Button(controls, text="Next >", command=self.next_page).pack(side='right')
+        self.__status = ttk.Label(controls, text="")
+        self.__status.pack()
+
+        self.load_page(0)
+
+    # Method to show the page starting at an offset (clamped to the list)
+    def load_page(self, offset):
+        total = self.__count()
+        last_page = max((total - 1) // self.__page_size * self.__page_size, 0)
+        self.__offset = max(min(offset, last_page), 0)
+        self.tree.delete(*self.tree.get_children())
+        self.__items.clear()
+        for item in self.__fetch(self.__offset, self.__page_size):
+            self.__insert(item)
+        self.__update_status(total)
+
+    # Methods to move between pages
+    def next_page(self):
+        self.load_page(self.__offset + self.__page_size)
+
+    def previous_page(self):
+        self.load_page(self.__offset - self.__page_size)
+
+    # Method to add a row for an item at the end of the page
+    def __insert(self, item):
+        key = str(self.__row_key(item))
+        if key not in self.__items:
+            self.__items[key] = item
+            self.tree.insert("", 'end', iid=key, values=self.__row_values(item))
+
+    # Method to show which rows are on screen
+    def __update_status(self, total):
+        shown = len(self.__items)
+        first = self.__offset + 1 if shown else 0
+        self.__status.config(text=f"{first}-{self.__offset + shown} of {total}")
+
+    # Method to retrieve the item in the selected row, or None
+    def get_selected(self):
+        selection = self.tree.selection()
+        return self.__items.get(selection[0]) if selection else None
+
+    # Method to remove one item's row in place, pulling the next item up to keep the page full
+    def remove_row(self, item):
+        key = str(self.__row_key(item))
+        if self.__discard is not None:
+            self.__discard(item)
+        if self.__items.pop(key, None) is not None:
+            self.tree.delete(key)
+        if not self.__items and self.__offset > 0:
+            self.load_page(self.__offset - self.__page_size)  # The last row of the last page went
+            return
+        for next_item in self.__fetch(self.__offset + len(self.__items), 1):
+            self.__insert(next_item)
+        self.__update_status(self.__count())
+
+    # Method to redraw one item's row in place after it changed
+    def refresh_row(self, item):
+        key = str(self.__row_key(item))
+        if key in self.__items:
+            self.__items[key] = item
+            self.tree.item(key, values=self.__row_values(item))
+
+
+# Function to empty entry fields
+def clear_entries(*entries):
+    for entry in entries:
+        entry.delete(0, 'end')
+
+
+# Milliseconds between checks of whether every change has been written to disk
+SAVE_STATUS_INTERVAL_MS = 250
+
+# Scans listed on the gate check-in screen
+GATE_RECENT_SCANS = 10
+
+# Milliseconds between checks of whether a sign-in on the password pool has finished
+PASSWORD_POLL_INTERVAL_MS = 20
+
+
+# Main Application class from tkinterto create the main application window
+class AdventureLandApp(tk.Tk):
+    # Constructor to initialize the main application window
+    def __init__(self):
+        super().__init__()  # Call the constructor of the parent Tk class
+        self.title("Adventure Land Theme Park")  # Set the title of the application window
+        self.geometry("800x700")  # Set the size of the application window (800x700 pixels)
+
+        # Load the ticket catalogue now; customers and their history load once the window is up
+        self.store = DataStore(lazy=True)  # Every change is appended to the journal instead of rewriting files
+        self.customers = self.store.customers  # Customer data
+        self.admins = self.store.admins  # Admin data
+        self.tickets = self.store.tickets  # Ticket data
+        self.reservations = self.store.reservations  # Reservation data
+        self.payments = self.store.payments  # Payment data
+        self.service = BookingService(self.store)  # Booking rules shared with the HTTP API
+        self.screens = ScreenManager(self)  # Screens are built once and raised again
+        self.protocol("WM_DELETE_WINDOW", self.exit_app)  # Flush the journal when the window is closed
+        self.bind("<Control-D>", self.open_diagnostics)  # Ctrl+Shift+D: no button leads to the Diagnostics screen
+
+        # Status bar showing whether every change has reached the disk, which happens off the event loop
+        self.save_status = ttk.Label(self, anchor='e')
+        self.save_status.pack(side='bottom', fill='x', padx=5)
+        self.update_save_status()
+
+        # Check if there are no tickets loaded, then initialize default tickets
+        if not self.tickets:
+            self.initialize_default_tickets()  # Initialize default tickets if none exist
+
+        self.session = None  # Session token of the logged-in user (None until someone logs in)
+
+        # Create the main menu of the application
+        self.create_main_menu()  # Call method to create and display the main menu
+        self.after_idle(self.store.start_loading)  # Load the rest once the menu has been drawn
+
+    # Property resolving the session token to the logged-in customer or admin, as the store has it now
+    @property
+    def current_user(self):
+        return None if self.session is None else self.service.get_session_user(self.session)
+
+    # Method to return to the main menu when a session runs out in the middle of a screen
+    def report_callback_exception(self, exc_type, value, traceback):
+        if isinstance(value, AuthenticationError) and self.session is not None:
+            messagebox.showinfo("Session Expired", str(value))
+            self.logout()
+            return
+        super().report_callback_exception(exc_type, value, traceback)
+
+    # Method to show whether the journal has reached the disk, checking again shortly
+    def update_save_status(self):
+        unsaved = self.store.get_unsaved_count()
+        self.save_status.config(text=f"Saving {unsaved} change(s)..." if unsaved else "All changes saved")
+        self.after(SAVE_STATUS_INTERVAL_MS, self.update_save_status)
+
+    # Method to initialize default ticket data if no tickets exist
+    def initialize_default_tickets(self):
+        self.service.initialize_default_tickets()  # The same catalogue the HTTP API starts with
 
     # Method to create and display the main menu of the application
     def create_main_menu(self):
-        self.clear_window()  # Clear the window before creating a new layout
+        if self.screens.show("main_menu"):
+            return  # Raise the menu built earlier
 
         # Create a frame for the main menu
-        main_frame = ttk.Frame(self)  # Create a ttk.Frame to hold the menu content
+        main_frame = ttk.Frame(self.screens.create("main_menu"))  # Create a ttk.Frame to hold the menu content
         main_frame.pack(expand=True, fill='both', padx=20, pady=20)  # Pack the frame with padding and expansion
 
         # Create a title label for the main menu
@@ -280,15 +4492,16 @@ class AdventureLandApp(tk.Tk):
                                                                                          fill='x')  # Button to show admin login
         ttk.Button(button_frame, text="View Ticket Information", command=self.show_ticket_info).pack(pady=5,
                                                                                                      fill='x')  # Button to show ticket info
-        ttk.Button(button_frame, text="Exit", command=self.quit).pack(pady=5,
+        ttk.Button(button_frame, text="Exit", command=self.exit_app).pack(pady=5,
                                                                       fill='x')  # Button to exit the application
 
     # Method to display the customer login page
     def show_login_page(self):
-        self.clear_window()  # Clear the window before displaying the login page
+        if self.screens.show("login"):
+            return  # Raise the login page built earlier, with its fields emptied
 
         # Create a frame for the login page
-        login_frame = ttk.Frame(self)  # Create a ttk.Frame to hold the login form
+        login_frame = ttk.Frame(self.screens.create("login"))  # Create a ttk.Frame to hold the login form
         login_frame.pack(expand=True, padx=20, pady=20)  # Pack the login frame with padding
 
         # Create and display a label for the login page title
@@ -314,12 +4527,16 @@ class AdventureLandApp(tk.Tk):
         ttk.Button(login_frame, text="Back to Main Menu",
                    command=self.create_main_menu).pack(pady=5)  # Button to go back to the main menu
 
+        # Empty the fields whenever the page is shown again
+        self.screens.on_show("login", lambda: clear_entries(email_entry, password_entry))
+
     # Method to display the registration page for creating a new account
     def show_register_page(self):
-        self.clear_window()  # Clear the window before displaying the registration page
+        if self.screens.show("register"):
+            return  # Raise the registration form built earlier, with its fields emptied
 
         # Create a frame for the registration form
-        register_frame = ttk.Frame(self)  # Create a ttk.Frame to hold the registration form
+        register_frame = ttk.Frame(self.screens.create("register"))  # Create a ttk.Frame to hold the registration form
         register_frame.pack(expand=True, padx=20, pady=20)  # Pack the registration frame with padding
 
         # Create and display a label for the registration page title
@@ -349,12 +4566,16 @@ class AdventureLandApp(tk.Tk):
         ttk.Button(register_frame, text="Back to Main Menu",
                    command=self.create_main_menu).pack(pady=5)  # Button to navigate back to the main menu
 
+        # Empty the fields whenever the form is shown again
+        self.screens.on_show("register", lambda: clear_entries(*fields.values()))
+
     # Method to display the admin login page
     def show_admin_login(self):
-        self.clear_window()  # Clear the window before displaying the admin login page
+        if self.screens.show("admin_login"):
+            return  # Raise the admin login built earlier, with its fields emptied
 
         # Create a frame for the admin login form
-        admin_frame = ttk.Frame(self)  # Create a ttk.Frame to hold the admin login form
+        admin_frame = ttk.Frame(self.screens.create("admin_login"))  # Create a ttk.Frame to hold the admin login form
         admin_frame.pack(expand=True, padx=20, pady=20)  # Pack the admin frame with padding
 
         # Create and display a label for the admin login page title
@@ -380,12 +4601,18 @@ class AdventureLandApp(tk.Tk):
         ttk.Button(admin_frame, text="Back to Main Menu",
                    command=self.create_main_menu).pack(pady=5)  # Button to go back to the main menu
 
+        # Empty the fields whenever the page is shown again
+        self.screens.on_show("admin_login", lambda: clear_entries(email_entry, password_entry))
+
     # Method to display ticket information for available tickets
     def show_ticket_info(self):
-        self.clear_window()  # Clear the window before displaying ticket information
+        # Raise the page built earlier unless a ticket was added or repriced since
+        catalog = tuple(ticket.to_record() for ticket in self.tickets)
+        if self.screens.show("ticket_info", catalog):
+            return
 
         # Create a frame to display ticket details
-        ticket_frame = ttk.Frame(self)  # Create a ttk.Frame to hold the ticket display
+        ticket_frame = ttk.Frame(self.screens.create("ticket_info", catalog))  # Create a ttk.Frame to hold the ticket display
         ticket_frame.pack(expand=True, padx=20, pady=20)  # Pack the ticket frame with padding
 
         # Create and display a label for the "Available Tickets" title
@@ -412,90 +4639,85 @@ class AdventureLandApp(tk.Tk):
         ttk.Button(ticket_frame, text="Back to Main Menu",
                    command=self.create_main_menu).pack(pady=20)  # Button to navigate back to the main menu
 
+    # Method to wait for a job on the password pool without blocking the window, then pass on its result
+    # (operation names the instrumented operation the whole wait counts towards)
+    def when_done(self, start_job, on_success, error_title, operation=None):
+        started = INSTRUMENTS.start() if operation else None
+        try:
+            future = start_job()
+        except BookingError as error:
+            messagebox.showerror(error_title, str(error))  # Refused before any hashing started
+            return
+        self.config(cursor="watch")  # Hashing takes a noticeable moment
+
+        # Check back until the job has finished, keeping the window responsive in between
+        def poll():
+            if not future.done():
+                self.after(PASSWORD_POLL_INTERVAL_MS, poll)
+                return
+            self.config(cursor="")
+            INSTRUMENTS.stop(operation, started)  # Wrong passwords take as long as right ones
+            try:
+                result = future.result()
+            except BookingError as error:
+                messagebox.showerror(error_title, str(error))  # Display error message box
+                return
+            on_success(result)
+        poll()
+
     # Method to process customer login
     def process_login(self, email, password):
-        # Loop through all customers to find a match based on email and password
-        for customer in self.customers:
-            if customer.get_email() == email and customer.check_password(password):  # Check if email and password match
-                self.current_user = customer  # Set the current user as the matched customer
-                self.show_customer_dashboard()  # Show the customer dashboard after successful login
-                return  # Exit the method after successful login
-
-        # Show an error message if no matching customer is found
-        messagebox.showerror("Login Failed", "Invalid email or password")  # Display error message box
+        # Check the credentials through the booking service
+        def logged_in(customer):
+            self.session = self.service.open_session(customer)  # Log the matched customer in
+            self.show_customer_dashboard()  # Show the customer dashboard after successful login
+        self.when_done(lambda: self.service.start_login(email, password), logged_in, "Login Failed",
+                       "process_login")
 
     # Method to process admin login
     def process_admin_login(self, email, password):
-        # Loop through all admins to find a match based on email and password
-        for admin in self.admins:
-            if admin.get_email() == email and admin.check_password(password):  # Check if email and password match
-                self.current_user = admin  # Set the current user as the matched admin
-                self.show_admin_dashboard()  # Show the admin dashboard after successful login
-                return  # Exit the method after successful login
-
-        # Show an error message if no matching admin is found
-        messagebox.showerror("Login Failed", "Invalid admin credentials")  # Display error message box
+        # Check the credentials through the booking service
+        def logged_in(admin):
+            self.session = self.service.open_session(admin)  # Log the matched admin in
+            self.show_admin_dashboard()  # Show the admin dashboard after successful login
+        self.when_done(lambda: self.service.start_login(email, password, admin=True), logged_in, "Login Failed")
 
     # Method to process customer registration
     def process_registration(self, name, email, password, phone):
-        # Validate if all fields are filled
-        if not all([name, email, password, phone]):  # Check if any field is empty
-            messagebox.showerror("Registration Error",
-                                 "All fields are required")  # Show error message if any field is empty
-            return  # Exit the method if validation fails
-
-        # Validate email format
-        if not self.validate_email(email):  # Check if email format is valid
-            messagebox.showerror("Registration Error", "Invalid email format")  # Show error message for invalid email
-            return  # Exit the method if validation fails
-
-        # Validate phone number format
-        if not self.validate_phone(phone):  # Check if phone number format is valid
-            messagebox.showerror("Registration Error",
-                                 "Invalid phone number format")  # Show error message for invalid phone
-            return  # Exit the method if validation fails
-
-        # Create new customer object
-        new_customer = Customer(
-            len(self.customers) + 1,  # Set a unique customer ID
-            name,  # Customer's name
-            email,  # Customer's email
-            password,  # Customer's password
-            phone  # Customer's phone number
-        )
-
-        # Add the new customer to the customers list and save the data
-        self.customers.append(new_customer)  # Add the new customer to the list
-        save_data("customers.pkl", self.customers)  # Save the updated customers list
-
         # Show success message and redirect to login page
-        messagebox.showinfo("Success",
-                            "Registration successful! Please login.")  # Inform user of successful registration
-        self.show_login_page()  # Show the login page after registration
+        def registered(customer):
+            messagebox.showinfo("Success",
+                                "Registration successful! Please login.")  # Inform user of successful registration
+            self.show_login_page()  # Show the login page after registration
+
+        # Validate the fields and create the new customer (the email is checked against every terminal's accounts)
+        self.when_done(lambda: self.service.start_register(name, email, password, phone), registered,
+                       "Registration Error")
 
     # Method to validate the email format
     def validate_email(self, email):
-        # Check if the email contains "@" and "."
-        return "@" in email and "." in email  # Return True if both "@" and "." are present in the email, otherwise False
+        return self.service.validate_email(email)  # Same rule as the booking service
 
     # Method to validate the phone number format
     def validate_phone(self, phone):
-        # Check if the phone number contains only digits and has a length of 10
-        return phone.isdigit() and len(
-            phone) == 10  # Return True if the phone number is numeric and exactly 10 characters long
+        return self.service.validate_phone(phone)  # Same rule as the booking service
 
     # Method to show the customer dashboard after successful login
     def show_customer_dashboard(self):
-        self.clear_window()  # Clear the current window to set up the new screen
+        if self.screens.show("customer_dashboard", self.current_user.get_user_id()):
+            return  # Raise this customer's dashboard built earlier
 
         # Create frame for the dashboard
-        dashboard_frame = ttk.Frame(self)
+        dashboard_frame = ttk.Frame(self.screens.create("customer_dashboard", self.current_user.get_user_id()))
         dashboard_frame.pack(expand=True, padx=20, pady=20)  # Pack the frame with padding
 
         # Display a welcome message with the customer's name
-        ttk.Label(dashboard_frame,
-                  text=f"Welcome, {self.current_user.get_name()}",  # Display the customer's name
-                  font=("Arial", 18, "bold")).pack(pady=10)  # Bold text for the welcome message with padding
+        welcome_label = ttk.Label(dashboard_frame,
+                                  text=f"Welcome, {self.current_user.get_name()}",  # Display the customer's name
+                                  font=("Arial", 18, "bold"))  # Bold text for the welcome message
+        welcome_label.pack(pady=10)  # Pack with padding
+        self.screens.on_show("customer_dashboard",  # The name may have been edited meanwhile
+                             lambda: welcome_label.config(text=f"Welcome, {self.current_user.get_name()}"))
 
         # Create frame for the customer options
         options_frame = ttk.Frame(dashboard_frame)
@@ -513,10 +4735,11 @@ class AdventureLandApp(tk.Tk):
 
     # Method to show the admin dashboard after successful login
     def show_admin_dashboard(self):
-        self.clear_window()  # Clear the current window to set up the new screen
+        if self.screens.show("admin_dashboard"):
+            return  # Raise the dashboard built earlier
 
         # Create frame for the dashboard
-        dashboard_frame = ttk.Frame(self)
+        dashboard_frame = ttk.Frame(self.screens.create("admin_dashboard"))
         dashboard_frame.pack(expand=True, padx=20, pady=20)  # Pack the frame with padding
 
         # Display the "Admin Dashboard" title
@@ -531,19 +4754,28 @@ class AdventureLandApp(tk.Tk):
         # Buttons for admin options
         ttk.Button(options_frame, text="View Sales Report",
                    command=self.show_sales_report).pack(pady=5, fill='x')  # Button to view the sales report
+        ttk.Button(options_frame, text="View Analytics",
+                   command=self.show_analytics_report).pack(pady=5, fill='x')  # Button to view the analytics
         ttk.Button(options_frame, text="Manage Tickets",
                    command=self.show_ticket_management).pack(pady=5, fill='x')  # Button to manage tickets
         ttk.Button(options_frame, text="Manage Users",
                    command=self.show_user_management).pack(pady=5, fill='x')  # Button to manage users
+        ttk.Button(options_frame, text="Search Reservations",
+                   command=self.show_reservation_search).pack(pady=5, fill='x')  # Button to find reservations
+        ttk.Button(options_frame, text="Gate Check-In",
+                   command=self.show_gate_check_in).pack(pady=5, fill='x')  # Button to let visitors in
         ttk.Button(options_frame, text="Logout",
                    command=self.logout).pack(pady=5, fill='x')  # Button to log out the admin
 
     # Method to show the ticket purchase page
     def show_ticket_purchase(self):
-        self.clear_window()  # Clear the current window to set up the new screen
+        # Raise the page built earlier for this customer (the ticket list is refreshed when it is shown)
+        key = self.current_user.get_user_id()
+        if self.screens.show("ticket_purchase", key):
+            return
 
         # Create frame for the ticket purchase page
-        purchase_frame = ttk.Frame(self)
+        purchase_frame = ttk.Frame(self.screens.create("ticket_purchase", key))
         purchase_frame.pack(expand=True, padx=20, pady=20)  # Pack the frame with padding
 
         # Display the "Purchase Tickets" title
@@ -554,39 +4786,106 @@ class AdventureLandApp(tk.Tk):
         ticket_info_frame = ttk.Frame(purchase_frame)
         ticket_info_frame.pack(pady=10, fill='x')  # Pack the frame with padding and stretch it horizontally
 
+        # IDs of the tickets in the dropdown, in the order of its entries
+        ticket_ids = []
+
+        # Find the selected ticket by the position of the dropdown entry (a constant-time lookup by ID)
+        def selected_ticket_id():
+            index = ticket_dropdown.current()
+            return ticket_ids[index] if 0 <= index < len(ticket_ids) else None
+
+        # Fill the dropdown from the catalogue, whose labels are only formatted again after a price change
+        def load_ticket_choices():
+            choices = self.store.catalog.get_choices()
+            ticket_ids[:] = [ticket_id for ticket_id, _ in choices]
+            ticket_dropdown.config(values=[label for _, label in choices])
+
         # Update ticket information when a ticket is selected
         def update_ticket_info(*args):
             # Clear previous ticket info
             for widget in ticket_info_frame.winfo_children():
                 widget.destroy()
 
-            # Get the selected ticket based on the dropdown selection
-            selected_ticket_str = ticket_var.get()
-            selected_ticket = next((t for t in self.tickets if str(t) == selected_ticket_str), None)
-
-            if selected_ticket:  # If a ticket is selected, display its details
-                ttk.Label(ticket_info_frame, text=selected_ticket.get_ticket_type(),
+            ticket_id = selected_ticket_id()
+            ticket = self.store.get_ticket(ticket_id)
+            if ticket:  # If a ticket is selected, display its details
+                ttk.Label(ticket_info_frame, text=ticket.get_ticket_type(),
                           font=("Arial", 12, "bold")).pack(pady=5)
-                ttk.Label(ticket_info_frame, text=f"Price: ${selected_ticket.get_price()}").pack()
-                ttk.Label(ticket_info_frame, text=f"Validity: {selected_ticket.get_validity()}").pack()
-                ttk.Label(ticket_info_frame, text=f"Description: {selected_ticket.get_description()}").pack()
-                ttk.Label(ticket_info_frame, text=f"Limitations: {selected_ticket.get_limitations()}").pack()
-                if selected_ticket.get_discount():  # If a discount is available, display it
-                    ttk.Label(ticket_info_frame, text=f"Discount: {selected_ticket.get_discount()}").pack()
+                for line in self.store.catalog.get_details(ticket_id):  # Formatted once per price
+                    ttk.Label(ticket_info_frame, text=line).pack()
 
         # Dropdown to select the ticket
         ticket_var = tk.StringVar()
         ticket_var.trace('w', update_ticket_info)  # Bind the function to update info when the selection changes
-        ticket_dropdown = ttk.Combobox(purchase_frame,
-                                       textvariable=ticket_var,
-                                       values=[str(ticket) for ticket in self.tickets])  # List all ticket types
+        ticket_dropdown = ttk.Combobox(purchase_frame, textvariable=ticket_var,
+                                       state='readonly')  # Entries map to ticket IDs, so they are picked, not typed
         ticket_dropdown.pack(pady=10)  # Pack the dropdown with padding
+        load_ticket_choices()  # List all ticket types
 
         # Input field for the visit date
         ttk.Label(purchase_frame, text="Visit Date (YYYY-MM-DD):").pack()  # Label for the date input
         date_entry = ttk.Entry(purchase_frame)  # Entry field for the date
         date_entry.pack(pady=5)  # Pack the entry with padding
 
+        # Input field for the number of tickets (group discounts apply automatically)
+        ttk.Label(purchase_frame, text="Quantity:").pack()
+        quantity_entry = ttk.Entry(purchase_frame, width=6)
+        quantity_entry.insert(0, "1")
+        quantity_entry.pack(pady=5)
+
+        # Label showing the seats left for the selected ticket on the entered date
+        availability_label = ttk.Label(purchase_frame, text="")
+        availability_label.pack()
+
+        # Update the seats left from the inventory (a dictionary lookup, so it can follow every keystroke)
+        def update_availability(*args):
+            if not availability_label.winfo_exists():
+                return  # The purchase screen was closed
+            ticket = self.store.get_ticket(selected_ticket_id())
+            date = date_entry.get()
+            try:
+                datetime.strptime(date, "%Y-%m-%d")
+            except ValueError:
+                ticket = None  # Wait for a complete date
+            if ticket is None:
+                availability_label.config(text="")
+                return
+            available = self.store.get_availability(ticket, date)
+            if available is None:
+                availability_label.config(text="Availability: open")
+            elif available == 0:
+                availability_label.config(text="Sold out for this date")
+            else:
+                availability_label.config(text=f"Availability: {available} left")
+
+        # Keep the count live while other terminals sell for the same day (only while the page is on screen)
+        poll_job = [None]  # Pending after() call, so raising the page again never starts a second loop
+
+        def poll_availability():
+            poll_job[0] = None
+            if availability_label.winfo_exists() and availability_label.winfo_ismapped():
+                update_availability()
+                poll_job[0] = self.after(2000, poll_availability)
+
+        def start_polling():
+            if poll_job[0] is not None:
+                self.after_cancel(poll_job[0])
+            poll_job[0] = self.after(2000, poll_availability)
+
+        ticket_var.trace('w', update_availability)  # Recount when the ticket changes
+        date_entry.bind("<KeyRelease>", update_availability)  # Recount when the date changes
+        start_polling()
+
+        # Start a fresh order whenever the page is shown again
+        def reset_purchase():
+            ticket_var.set("")
+            load_ticket_choices()  # Show prices changed since the page was built
+            payment_var.set("")
+            clear_entries(date_entry, quantity_entry)
+            quantity_entry.insert(0, "1")
+            start_polling()
+        self.screens.on_show("ticket_purchase", reset_purchase)
+
         # Radio buttons for payment method selection
         payment_var = tk.StringVar()  # Variable to store the selected payment method
         ttk.Label(purchase_frame, text="Payment Method:").pack()  # Label for payment method
@@ -598,9 +4897,10 @@ class AdventureLandApp(tk.Tk):
         # Button to complete the ticket purchase
         ttk.Button(purchase_frame, text="Complete Purchase",
                    command=lambda: self.process_purchase(
-                       ticket_var.get(),
+                       selected_ticket_id(),
                        date_entry.get(),
-                       payment_var.get()
+                       payment_var.get(),
+                       quantity_entry.get()
                    )).pack(pady=10)  # Trigger the process_purchase method with entered data
 
         # Button to go back to the customer dashboard
@@ -608,77 +4908,43 @@ class AdventureLandApp(tk.Tk):
                    command=self.show_customer_dashboard).pack()  # Go back to the dashboard page
 
     # Method to process ticket purchase
-    def process_purchase(self, ticket_str, date, payment_method):
-        # Check if all fields are filled
-        if not all([ticket_str, date, payment_method]):
-            messagebox.showerror("Purchase Error", "All fields are required")  # Display error if any field is missing
-            return
-
-        # Validate date format
+    def process_purchase(self, ticket_id, date, payment_method, quantity="1"):
+        # Validate the fields, then create the reservations and one payment through the booking service
+        started = INSTRUMENTS.start()  # Timed up to the message box, which waits for the visitor
         try:
-            datetime.strptime(date, "%Y-%m-%d")  # Attempt to convert date to datetime object
-        except ValueError:
-            messagebox.showerror("Purchase Error", "Invalid date format")  # Display error if date format is incorrect
-            return
-
-        # Find the selected ticket
-        ticket = next((t for t in self.tickets if str(t) == ticket_str), None)
-        if not ticket:  # If ticket is not found, display error
-            messagebox.showerror("Purchase Error", "Invalid ticket selection")
+            reservations = self.service.purchase_group(self.current_user, ticket_id, date, payment_method,
+                                                       quantity)  # One journal record, however many seats
+        except BookingError as error:
+            INSTRUMENTS.stop("process_purchase", started)
+            messagebox.showerror("Purchase Error", str(error))  # Invalid input or account removed on another terminal
             return
-
-        # Create a reservation object with the selected details
-        reservation = Reservation(
-            len(self.reservations) + 1,  # Reservation ID
-            self.current_user,  # Associated customer
-            ticket,  # Selected ticket
-            date  # Selected date
-        )
-
-        # Create a payment object for the reservation
-        payment = Payment(
-            len(self.payments) + 1,  # Payment ID
-            ticket.get_price(),  # Ticket price
-            payment_method  # Selected payment method
-        )
-
-        # Link the reservation and payment
-        reservation.set_payment(payment)  # Attach the payment to the reservation
-        payment.set_reservation(reservation)  # Attach the reservation to the payment
-
-        # Save the reservation and payment to the respective lists
-        self.reservations.append(reservation)
-        self.payments.append(payment)
-        self.current_user.add_reservation(reservation)  # Add the reservation to the customer's profile
-
-        # Save all data to storage files
-        save_data("reservations.pkl", self.reservations)
-        save_data("payments.pkl", self.payments)
-        save_data("customers.pkl", self.customers)
+        INSTRUMENTS.stop("process_purchase", started)
 
         # Show success message and return to customer dashboard
-        messagebox.showinfo("Success", "Ticket purchased successfully!")
+        if len(reservations) > 1:
+            messagebox.showinfo("Success", f"{len(reservations)} tickets purchased successfully! "
+                                           f"Total paid: {reservations[0].get_payment().get_amount()} DHS")
+        else:
+            messagebox.showinfo("Success", "Ticket purchased successfully!")
         self.show_customer_dashboard()  # Display the dashboard after successful purchase
 
     # Method to show the sales report to admin
+    @INSTRUMENTS.measure("show_sales_report")
     def show_sales_report(self):
-        self.clear_window()  # Clear the current window
-
-        # Create a frame to hold the report
-        report_frame = ttk.Frame(self)
+        # Create a frame to hold the report (rebuilt each time: the figures change with every sale)
+        report_frame = ttk.Frame(self.screens.create("sales_report", cache=False))
         report_frame.pack(expand=True, padx=20, pady=20)
 
         # Add title to the report
         ttk.Label(report_frame, text="Sales Report",
                   font=("Arial", 18, "bold")).pack(pady=10)
 
-        # Calculate statistics
+        # Read the statistics from the running sales counters
+        self.store.refresh()  # Include sales made on other terminals
+        metrics = self.store.metrics
         today = datetime.now().date()  # Get today's date
-        today_sales = sum(1 for payment in self.payments
-                          if datetime.strptime(payment.get_date(),
-                                               "%Y-%m-%d").date() == today)  # Count payments made today
-        total_revenue = sum(
-            payment.get_amount() for payment in self.payments)  # Calculate total revenue from all payments
+        today_sales, today_revenue = metrics.get_day(today)  # Tickets sold and revenue today
+        total_sales, total_revenue = metrics.get_totals()  # All-time tickets sold and revenue
 
         # Display statistics
         ttk.Label(report_frame,
@@ -686,16 +4952,163 @@ class AdventureLandApp(tk.Tk):
         ttk.Label(report_frame,
                   text=f"Total Revenue: ${total_revenue:.2f}").pack(pady=5)  # Show total revenue in formatted currency
 
+        # Display the date-range summaries
+        for label, (tickets, revenue) in (("Today", (today_sales, today_revenue)),
+                                          ("Last 7 Days", metrics.get_last_days(7, today)),
+                                          ("Last 30 Days", metrics.get_last_days(30, today)),
+                                          ("Month to Date", metrics.get_month_to_date(today)),
+                                          ("All Time", (total_sales, total_revenue))):
+            ttk.Label(report_frame, text=f"{label}: {tickets} tickets, ${revenue:.2f}").pack()
+
+        # Display the breakdowns by ticket type and by payment method
+        for title, breakdown in (("By Ticket Type", metrics.get_by_ticket_type()),
+                                 ("By Payment Method", metrics.get_by_payment_method())):
+            ttk.Label(report_frame, text=title, font=("Arial", 12, "bold")).pack(pady=(10, 0))
+            for key, (tickets, revenue) in sorted(breakdown.items()):
+                ttk.Label(report_frame, text=f"{key}: {tickets} tickets, ${revenue:.2f}").pack()
+
+        # Back button to return to the admin dashboard
+        ttk.Button(report_frame, text="Back to Dashboard",
+                   command=self.show_admin_dashboard).pack(pady=20)
+
+    # Method to open the Diagnostics screen from its shortcut, for a logged-in admin only
+    def open_diagnostics(self, event=None):
+        if isinstance(self.current_user, Admin):
+            self.show_diagnostics()
+
+    # Method to show the operation timings, the bytes written per snapshot file and the profiler controls
+    def show_diagnostics(self, profile_report=None):
+        # Create a frame for the screen (rebuilt each time: the figures change with every call)
+        diagnostics_frame = ttk.Frame(self.screens.create("diagnostics", cache=False))
+        diagnostics_frame.pack(expand=True, fill='both', padx=20, pady=20)
+
+        ttk.Label(diagnostics_frame, text="Diagnostics",
+                  font=("Arial", 18, "bold")).pack(pady=10)
+        snapshot = INSTRUMENTS.get_snapshot()
+        if not INSTRUMENTS.is_enabled():
+            ttk.Label(diagnostics_frame,
+                      text=f"Measurements are off: start the program with {INSTRUMENT_ENV}=1 to take them").pack()
+        else:
+            ttk.Label(diagnostics_frame, text=f"Measured since {snapshot['since']}").pack()
+
+        # Show each table in its own Treeview
+        tables = (
+            ("Operations", [("Operation", 150), ("Calls", 70), ("Mean (ms)", 80), ("p50 (ms)", 80),
+                            ("p95 (ms)", 80), ("Max (ms)", 80)],
+             [(name, row["calls"], f"{row['mean_ms']:.2f}", f"{row['p50_ms']:.2f}", f"{row['p95_ms']:.2f}",
+               f"{row['max_ms']:.2f}") for name, row in snapshot["operations"].items()]),
+            ("Snapshot Files Written", [("File", 200), ("Writes", 80), ("Bytes", 120)],
+             [(name, row["writes"], row["bytes"]) for name, row in snapshot["files"].items()]),
+        )
+        for title, columns, rows in tables:
+            ttk.Label(diagnostics_frame, text=title, font=("Arial", 12, "bold")).pack(pady=(10, 0))
+            table = ttk.Treeview(diagnostics_frame, columns=[name for name, _ in columns], show='headings',
+                                 height=min(max(len(rows), 1), 8))
+            for name, width in columns:
+                table.heading(name, text=name)
+                table.column(name, width=width)
+            for row in rows:
+                table.insert('', 'end', values=row)
+            table.pack(fill='x')
+
+        # Buttons to refresh, export or reset the figures and to start or stop a profile
+        button_frame = ttk.Frame(diagnostics_frame)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="Refresh", command=self.show_diagnostics).pack(side='left', padx=5)
+        for label, path in DIAGNOSTICS_FILES.items():
+            ttk.Button(button_frame, text=f"Export {label}",
+                       command=lambda path=path: messagebox.showinfo(
+                           "Diagnostics", f"Saved to {os.path.abspath(INSTRUMENTS.export(path))}")).pack(
+                side='left', padx=5)
+        ttk.Button(button_frame, text="Reset",
+                   command=lambda: (INSTRUMENTS.reset(), self.show_diagnostics())).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Stop Profiling" if INSTRUMENTS.is_profiling() else "Start Profiling",
+                   command=self.toggle_profile).pack(side='left', padx=5)
+
+        # The slowest functions of the last profile, by cumulative time
+        if profile_report:
+            report_text = tk.Text(diagnostics_frame, height=12, wrap='none', font=("Courier", 9))
+            report_text.insert('1.0', profile_report)
+            report_text.config(state='disabled')
+            report_text.pack(fill='both', expand=True)
+
+        # Back button to return to the admin dashboard
+        ttk.Button(diagnostics_frame, text="Back to Dashboard",
+                   command=self.show_admin_dashboard).pack(pady=10)
+
+    # Method to start a cProfile capture of the window's work, or stop it and show where the time went
+    def toggle_profile(self):
+        if INSTRUMENTS.is_profiling():
+            report = INSTRUMENTS.stop_profile(PROFILE_FILE)
+            self.show_diagnostics(f"Saved to {os.path.abspath(PROFILE_FILE)}\n\n{report}")
+            return
+        INSTRUMENTS.start_profile()
+        messagebox.showinfo("Diagnostics", "Profiling started: use the screens to profile, "
+                                           "then press Ctrl+Shift+D and Stop Profiling")
+        self.show_diagnostics()
+
+    # Method to show revenue, payment-method mix, cancellation rates and the attendance forecast
+    def show_analytics_report(self, start_date="", end_date=""):
+        # Create a frame for the report (rebuilt each time: the figures change with every sale)
+        report_frame = ttk.Frame(self.screens.create("analytics_report", cache=False))
+        report_frame.pack(expand=True, fill='both', padx=20, pady=20)
+
+        ttk.Label(report_frame, text="Sales Analytics",  # Title label
+                  font=("Arial", 18, "bold")).pack(pady=10)
+
+        # Payment date range for the revenue and payment-method tables (blank for all time)
+        filters_frame = ttk.Frame(report_frame)
+        filters_frame.pack(pady=5)
+        ttk.Label(filters_frame, text="Paid From (YYYY-MM-DD):").grid(row=0, column=0, sticky='e')
+        start_entry = ttk.Entry(filters_frame, width=12)
+        start_entry.insert(0, start_date)
+        start_entry.grid(row=0, column=1, padx=5)
+        ttk.Label(filters_frame, text="To:").grid(row=0, column=2, sticky='e')
+        end_entry = ttk.Entry(filters_frame, width=12)
+        end_entry.insert(0, end_date)
+        end_entry.grid(row=0, column=3, padx=5)
+        ttk.Button(filters_frame, text="Apply",
+                   command=lambda: self.show_analytics_report(start_entry.get(), end_entry.get())).grid(
+            row=0, column=4, padx=5)
+
+        # Compute every table in a few passes over the analytics columns
+        try:
+            analytics = self.service.get_sales_analytics(start_date, end_date)
+        except BookingError as error:
+            messagebox.showerror("Report Error", str(error))
+            analytics = {"ticket_types": {}, "payment_methods": {}, "forecast": []}
+
+        # Show each table in its own Treeview
+        tables = (
+            ("Revenue by Ticket Type", [("Ticket Type", 180), ("Tickets", 70), ("Revenue", 100), ("Cancelled", 80),
+                                        ("Cancellation Rate", 120)],
+             [(ticket_type, row["tickets"], f"${row['revenue']:.2f}", row["cancelled"],
+               f"{row['cancellation_rate']:.1%}") for ticket_type, row in analytics["ticket_types"].items()]),
+            ("Payment Method Mix", [("Method", 180), ("Tickets", 70), ("Revenue", 100), ("Share", 80)],
+             [(method, row["tickets"], f"${row['revenue']:.2f}", f"{row['share']:.1%}")
+              for method, row in analytics["payment_methods"].items()]),
+            ("Attendance Forecast", [("Visit Date", 120), ("Booked", 80), ("Forecast", 80)],
+             [(row["date"], row["booked"], row["forecast"]) for row in analytics["forecast"]]),
+        )
+        for title, columns, rows in tables:
+            ttk.Label(report_frame, text=title, font=("Arial", 12, "bold")).pack(pady=(10, 0))
+            table = ttk.Treeview(report_frame, columns=[name for name, _ in columns], show='headings',
+                                 height=min(max(len(rows), 1), 7))
+            for name, width in columns:
+                table.heading(name, text=name)
+                table.column(name, width=width)
+            for row in rows:
+                table.insert('', 'end', values=row)
+            table.pack(fill='x')
+
         # Back button to return to the admin dashboard
         ttk.Button(report_frame, text="Back to Dashboard",
                    command=self.show_admin_dashboard).pack(pady=20)
 
     # Method to show the ticket management page to admin
     def show_ticket_management(self):
-        self.clear_window()  # Clear the current window
-
-        # Create a frame to manage tickets
-        management_frame = ttk.Frame(self)
+        # Create a frame to manage tickets (rebuilt each time with the current prices and versions)
+        management_frame = ttk.Frame(self.screens.create("ticket_management", cache=False))
         management_frame.pack(expand=True, padx=20, pady=20)
 
         # Add a title for the ticket management section
@@ -707,119 +5120,319 @@ class AdventureLandApp(tk.Tk):
             ticket_frame = ttk.Frame(management_frame)  # Create a frame for each ticket
             ticket_frame.pack(pady=5, fill='x')  # Pack the frame with padding and fill horizontally
 
-            ttk.Label(ticket_frame, text=str(ticket)).pack(side='left')  # Display ticket information on the left
+            ttk.Label(ticket_frame, text=self.store.catalog.get_label(ticket.get_ticket_id())).pack(
+                side='left')  # Display ticket information on the left
+            ttk.Button(ticket_frame, text="History",
+                       command=lambda t=ticket: self.show_price_history(t)).pack(side='left', padx=5)
 
             # Create an entry field to update the ticket price
             price_var = tk.StringVar(value=str(ticket.get_price()))  # Bind the current price to the entry field
             price_entry = ttk.Entry(ticket_frame, textvariable=price_var, width=10)  # Create entry box for price
             price_entry.pack(side='right', padx=5)  # Pack entry field on the right side with padding
 
-            # Button to update the ticket price
+            # Button to update the ticket price, remembering the version of the price shown
+            version = self.store.get_version("ticket", ticket.get_ticket_id())
             ttk.Button(ticket_frame, text="Update Price",
-                       command=lambda t=ticket, p=price_var: self.update_ticket_price(t, p.get())).pack(
+                       command=lambda t=ticket, p=price_var, v=version: self.update_ticket_price(t, p.get(), v)).pack(
                 side='right')  # Button for updating the price
 
+            # Entry and button to set the daily cap of the ticket type (blank for unlimited)
+            capacity = self.store.inventory.get_capacity(ticket.get_ticket_type())
+            capacity_var = tk.StringVar(value="" if capacity is None else str(capacity))
+            ttk.Entry(ticket_frame, textvariable=capacity_var, width=6).pack(side='right', padx=5)
+            ttk.Button(ticket_frame, text="Set Daily Cap",
+                       command=lambda t=ticket, c=capacity_var: self.update_ticket_capacity(t, c.get())).pack(
+                side='right')
+
         # Back button to return to the admin dashboard
         ttk.Button(management_frame, text="Back to Dashboard",
                    command=self.show_admin_dashboard).pack(pady=20)
 
     # Method to update the price of a ticket
-    def update_ticket_price(self, ticket, new_price):
+    def update_ticket_price(self, ticket, new_price, expected_version=None):
         try:
-            price = float(new_price)  # Attempt to convert the new price to a float
-            if price <= 0:  # Check if the price is valid (greater than 0)
-                raise ValueError  # Raise an error if the price is invalid
-            ticket.set_price(price)  # Set the new price for the ticket
-            save_data("tickets.pkl", self.tickets)  # Save the updated tickets data to file
+            self.service.update_ticket_price(ticket.get_ticket_id(), new_price, expected_version)  # Journal the new price
             messagebox.showinfo("Success", "Ticket price updated successfully!")  # Show success message
-        except ValueError:  # Handle any value errors (e.g., non-numeric input or invalid price)
-            messagebox.showerror("Error", "Invalid price value")  # Show error message if price is invalid
+            self.show_ticket_management()  # Show the new price, with the version the next edit is checked against
+        except ConcurrencyError as error:  # The price was changed on another terminal meanwhile
+            messagebox.showerror("Error", str(error))
+            self.show_ticket_management()  # Show the current prices
+        except BookingError as error:  # Non-numeric input or invalid price
+            messagebox.showerror("Error", str(error))  # Show error message if price is invalid
+
+    # Method to list the prices a ticket has had
+    def show_price_history(self, ticket):
+        lines = [f"Version {entry['version']}: {entry['price']} DHS" +
+                 (f" (set {entry['changed_at']})" if entry["changed_at"] else " (original price)")
+                 for entry in self.service.get_price_history(ticket.get_ticket_id())]
+        messagebox.showinfo(f"{ticket.get_ticket_type()} Price History", "\n".join(lines))
+
+    # Method to update the daily cap of a ticket type
+    def update_ticket_capacity(self, ticket, capacity):
+        try:
+            self.service.set_capacity(ticket.get_ticket_id(), capacity.strip())  # Journal the new cap
+            messagebox.showinfo("Success", "Daily cap updated successfully!")
+        except BookingError as error:
+            messagebox.showerror("Error", str(error))  # Non-numeric or negative cap
 
     # Method to display the user management interface for admins
-    def show_user_management(self):
-        self.clear_window()  # Clear the current window
-
-        management_frame = ttk.Frame(self)  # Create a frame for user management
+    def show_user_management(self, query="", anywhere=False):
+        # Create a frame for user management (rebuilt for each search)
+        management_frame = ttk.Frame(self.screens.create("user_management", cache=False))
         management_frame.pack(expand=True, padx=20, pady=20)
 
         ttk.Label(management_frame, text="User Management",  # Title label
                   font=("Arial", 18, "bold")).pack(pady=10)
 
-        # Loop through all customers and display them with a delete option
-        for customer in self.customers:
-            user_frame = ttk.Frame(management_frame)  # Create a frame for each user
-            user_frame.pack(pady=5, fill='x')
-
-            ttk.Label(user_frame, text=str(customer)).pack(side='left')  # Show user details
-            ttk.Button(user_frame, text="Delete",  # Add a delete button for each user
-                       command=lambda c=customer: self.delete_user(c)).pack(side='right')  # Delete user when clicked
+        self.store.refresh()  # Include accounts changed on other terminals
+
+        # Search box: part of a name, email or phone number (empty shows every customer)
+        search_frame = ttk.Frame(management_frame)
+        search_frame.pack(pady=5, fill='x')
+        ttk.Label(search_frame, text="Search:").pack(side='left')
+        search_entry = ttk.Entry(search_frame, width=40)
+        search_entry.insert(0, query)
+        search_entry.pack(side='left', padx=5)
+        anywhere_var = tk.BooleanVar(value=anywhere)  # Off: match the start of a name word, email or phone
+        ttk.Checkbutton(search_frame, text="Match anywhere", variable=anywhere_var).pack(side='left', padx=5)
+        ttk.Button(search_frame, text="Search",
+                   command=lambda: self.show_user_management(search_entry.get(), anywhere_var.get())).pack(
+            side='left')
+        search_entry.bind("<Return>", lambda event: self.show_user_management(search_entry.get(), anywhere_var.get()))
+
+        # Show the customers (or the matches) one page at a time (rows are only created for the page on screen)
+        if query.strip():
+            matches = self.service.search_customers(query, prefix=not anywhere)
+            fetch = lambda offset, limit: matches[offset:offset + limit]
+            count = lambda: len(matches)
+
+            # Drop a deleted customer from the matches so the next match moves up
+            def discard(customer):
+                if customer in matches:
+                    matches.remove(customer)
+        else:
+            fetch, count, discard = self.service.get_customers, self.service.count_customers, None
+        user_list = PagedTreeview(management_frame,
+                                  columns=[("ID", 60), ("Name", 180), ("Email", 240), ("Phone", 120)],
+                                  fetch=fetch, count=count,
+                                  row_values=lambda c: (c.get_user_id(), c.get_name(), c.get_email(),
+                                                        c.get_phone_number()),
+                                  row_key=User.get_user_id, discard=discard)
+        user_list.pack(fill='both', expand=True)
+
+        # Button to delete the selected user
+        ttk.Button(management_frame, text="Delete Selected User",
+                   command=lambda: self.delete_user(user_list.get_selected(), user_list)).pack(pady=5)
 
         # Back button to return to the admin dashboard
         ttk.Button(management_frame, text="Back to Dashboard",
                    command=self.show_admin_dashboard).pack(pady=20)
 
+    # Method to display the reservation search for admins
+    def show_reservation_search(self, start_date="", end_date="", ticket_type="", customer_query=""):
+        # Create a frame for the search (rebuilt for each search)
+        search_frame = ttk.Frame(self.screens.create("reservation_search", cache=False))
+        search_frame.pack(expand=True, padx=20, pady=20)
+
+        ttk.Label(search_frame, text="Search Reservations",  # Title label
+                  font=("Arial", 18, "bold")).pack(pady=10)
+
+        self.store.refresh()  # Include reservations made on other terminals
+
+        # Filters: visit date range, ticket type and part of the customer's name, email or phone
+        filters_frame = ttk.Frame(search_frame)
+        filters_frame.pack(pady=5)
+        ttk.Label(filters_frame, text="From (YYYY-MM-DD):").grid(row=0, column=0, sticky='e')
+        start_entry = ttk.Entry(filters_frame, width=12)
+        start_entry.insert(0, start_date)
+        start_entry.grid(row=0, column=1, padx=5)
+        ttk.Label(filters_frame, text="To (YYYY-MM-DD):").grid(row=0, column=2, sticky='e')
+        end_entry = ttk.Entry(filters_frame, width=12)
+        end_entry.insert(0, end_date)
+        end_entry.grid(row=0, column=3, padx=5)
+        ttk.Label(filters_frame, text="Ticket Type:").grid(row=1, column=0, sticky='e')
+        type_var = tk.StringVar(value=ticket_type)
+        ttk.Combobox(filters_frame, textvariable=type_var, width=22,
+                     values=[""] + sorted({ticket.get_ticket_type() for ticket in self.tickets})).grid(
+            row=1, column=1, columnspan=3, sticky='w', padx=5)
+        ttk.Label(filters_frame, text="Customer:").grid(row=2, column=0, sticky='e')
+        customer_entry = ttk.Entry(filters_frame, width=30)
+        customer_entry.insert(0, customer_query)
+        customer_entry.grid(row=2, column=1, columnspan=3, sticky='w', padx=5)
+        ttk.Button(filters_frame, text="Search",
+                   command=lambda: self.show_reservation_search(start_entry.get(), end_entry.get(), type_var.get(),
+                                                                customer_entry.get())).grid(row=3, column=1,
+                                                                                            pady=5)
+
+        # Run the search through the indexes
+        try:
+            matches = self.service.search_reservations(start_date, end_date, ticket_type, customer_query)
+        except BookingError as error:
+            messagebox.showerror("Search Error", str(error))
+            matches = []
+
+        # Show the matches one page at a time
+        PagedTreeview(search_frame,
+                      columns=[("Reservation", 90), ("Customer", 180), ("Ticket", 180), ("Visit Date", 110)],
+                      fetch=lambda offset, limit: matches[offset:offset + limit], count=lambda: len(matches),
+                      row_values=lambda r: (r.get_reservation_id(), r.get_customer().get_name(),
+                                            r.get_ticket().get_ticket_type(), r.get_date()),
+                      row_key=Reservation.get_reservation_id).pack(fill='both', expand=True)
+
+        # Back button to return to the admin dashboard
+        ttk.Button(search_frame, text="Back to Dashboard",
+                   command=self.show_admin_dashboard).pack(pady=20)
+
+    # Method to show the gate screen: scan or type a reservation number and press Enter to let the visitor in
+    def show_gate_check_in(self):
+        if self.screens.show("gate_check_in"):
+            return  # Raise the gate built earlier, with the counters brought up to date
+
+        gate_frame = ttk.Frame(self.screens.create("gate_check_in"))
+        gate_frame.pack(expand=True, padx=20, pady=20)
+
+        ttk.Label(gate_frame, text="Gate Check-In",  # Title label
+                  font=("Arial", 18, "bold")).pack(pady=10)
+        summary_label = ttk.Label(gate_frame, font=("Arial", 12))  # Today's expected and checked-in visitors
+        summary_label.pack(pady=5)
+
+        # Entry the scanner types into, followed by Enter
+        ttk.Label(gate_frame, text="Reservation Number:").pack()
+        scan_entry = ttk.Entry(gate_frame, font=("Arial", 16), width=16, justify='center')
+        scan_entry.pack(pady=5)
+        result_label = tk.Label(gate_frame, text="", font=("Arial", 14, "bold"), width=50)  # Green or red result
+        result_label.pack(pady=10)
+
+        # The most recent scans, newest first
+        recent_scans = ttk.Treeview(gate_frame, columns=("Time", "Reservation", "Result"), show='headings',
+                                    height=GATE_RECENT_SCANS)
+        for column, width in (("Time", 80), ("Reservation", 100), ("Result", 380)):
+            recent_scans.heading(column, text=column)
+            recent_scans.column(column, width=width)
+        recent_scans.pack(pady=5)
+
+        # Show how many of today's visitors are in
+        def update_summary():
+            summary = self.service.get_gate_summary()
+            summary_label.config(text=f"{summary['date']}: {summary['checked_in']} of {summary['expected']} "
+                                      f"expected visitors checked in")
+
+        # Validate and record one scan, then clear the entry for the next one
+        def scan(event=None):
+            number = scan_entry.get()
+            scan_entry.delete(0, 'end')
+            try:
+                reservation = self.service.check_in(number)
+                result = f"Welcome {reservation.get_customer().get_name()}: {reservation.get_ticket().get_ticket_type()}"
+                result_label.config(text=result, bg="green", fg="white")
+            except BookingError as error:
+                result = str(error)  # Wrong date, already used, unpaid, cancelled or unknown
+                result_label.config(text=result, bg="red", fg="white")
+            recent_scans.insert('', 0, values=(datetime.now().strftime("%H:%M:%S"), number, result))
+            recent_scans.delete(*recent_scans.get_children()[GATE_RECENT_SCANS:])
+            update_summary()
+
+        scan_entry.bind("<Return>", scan)
+        ttk.Button(gate_frame, text="Check In", command=scan).pack(pady=5)
+
+        # Back button to return to the admin dashboard
+        ttk.Button(gate_frame, text="Back to Dashboard",
+                   command=self.show_admin_dashboard).pack(pady=20)
+
+        # Update the counters and put the cursor back in the entry whenever the gate is shown
+        def refresh_gate():
+            update_summary()
+            scan_entry.focus_set()
+        refresh_gate()
+        self.screens.on_show("gate_check_in", refresh_gate)
+
     # Method to delete a user from the system
-    def delete_user(self, customer):
+    def delete_user(self, customer, user_list=None):
+        if customer is None:
+            messagebox.showerror("Error", "Please select a user")  # Nothing selected in the list
+            return
         # Show a confirmation message before deleting
         if messagebox.askyesno("Confirm Delete",
-                               f"Are you sure you want to delete user {customer.get_name()}?"):
-            self.customers.remove(customer)  # Remove the customer from the list
-            save_data("customers.pkl", self.customers)  # Save the updated customer list
-            messagebox.showinfo("Success", "User deleted successfully!")  # Show success message
-            self.show_user_management()  # Refresh the user management interface
+                               f"Are you sure you want to delete user {customer.get_name()}?\n"
+                               "Their reservations and payments will be removed as well."):
+            try:
+                self.service.delete_customer(customer.get_user_id())  # Remove the customer and journal it
+                messagebox.showinfo("Success", "User deleted successfully!")  # Show success message
+            except BookingError as error:
+                messagebox.showerror("Error", str(error))  # Already deleted on another terminal
+            if user_list is not None:
+                user_list.remove_row(customer)  # Drop just this row from the list
+            else:
+                self.show_user_management()  # Refresh the user management interface
 
     # Method to display the user's reservations
     def show_reservations(self):
-        self.clear_window()  # Clear the window for the reservations page
+        # Pick up changes from other terminals (the session then resolves to the store's current copy)
+        self.store.refresh()
+        if self.screens.show("reservations", self.current_user.get_user_id()):
+            return  # Raise the list built earlier, reloading only the page on screen
 
         # Create frame to hold the reservation details
-        reservations_frame = ttk.Frame(self)
+        reservations_frame = ttk.Frame(self.screens.create("reservations", self.current_user.get_user_id()))
         reservations_frame.pack(expand=True, padx=20, pady=20)
 
         ttk.Label(reservations_frame, text="My Reservations",
                   font=("Arial", 18, "bold")).pack(pady=10)
 
-        # Loop through the current user's reservations and display them
-        for reservation in self.current_user.get_reservations():
-            reservation_frame = ttk.Frame(reservations_frame)
-            reservation_frame.pack(pady=5, fill='x')
-
-            ttk.Label(reservation_frame, text=str(reservation)).pack(side='left')
-
-            # Button to cancel the reservation
-            ttk.Button(reservation_frame, text="Cancel",
-                       command=lambda r=reservation: self.cancel_reservation(r)).pack(side='right')
+        # Show the current user's reservations one page at a time
+        reservation_list = PagedTreeview(
+            reservations_frame,
+            columns=[("Reservation", 90), ("Ticket", 200), ("Visit Date", 110), ("Paid (DHS)", 100)],
+            fetch=lambda offset, limit: self.service.get_reservations(self.current_user, offset, limit),
+            count=lambda: self.service.count_reservations(self.current_user),
+            row_values=lambda r: (r.get_reservation_id(), r.get_ticket().get_ticket_type(), r.get_date(),
+                                  r.get_payment().get_seat_amount() if r.get_payment() else ""),
+            row_key=Reservation.get_reservation_id)
+        reservation_list.pack(fill='both', expand=True)
+
+        # Button to cancel the selected reservation
+        ttk.Button(reservations_frame, text="Cancel Selected Reservation",
+                   command=lambda: self.cancel_reservation(reservation_list.get_selected(),
+                                                           reservation_list)).pack(pady=5)
 
         # Button to go back to the dashboard
         ttk.Button(reservations_frame, text="Back to Dashboard",
                    command=self.show_customer_dashboard).pack(pady=20)
 
+        # Reload the first page whenever the list is shown again (purchases may have been made meanwhile)
+        self.screens.on_show("reservations", lambda: reservation_list.load_page(0))
+
     # Method to cancel a reservation
-    def cancel_reservation(self, reservation):
+    def cancel_reservation(self, reservation, reservation_list=None):
+        if reservation is None:
+            messagebox.showerror("Error", "Please select a reservation")  # Nothing selected in the list
+            return
         # Confirm the cancellation with the user
         if messagebox.askyesno("Confirm Cancellation",
                                "Are you sure you want to cancel this reservation?"):
-            # Remove the reservation from the main list and the user's list
-            self.reservations.remove(reservation)
-            self.current_user.get_reservations().remove(reservation)
-
-            # Save updated data to files
-            save_data("reservations.pkl", self.reservations)
-            save_data("customers.pkl", self.customers)
-
-            # Inform the user that the cancellation was successful
-            messagebox.showinfo("Success", "Reservation cancelled successfully!")
-
-            # Show updated list of reservations
-            self.show_reservations()
+            # Remove the reservation from the main list and the user's list, and journal it
+            try:
+                self.service.cancel_reservation(self.current_user, reservation.get_reservation_id())
+                # Inform the user that the cancellation was successful
+                messagebox.showinfo("Success", "Reservation cancelled successfully!")
+            except BookingError as error:
+                messagebox.showerror("Error", str(error))  # Already cancelled on another terminal
+
+            # Drop just this row from the list of reservations
+            if reservation_list is not None:
+                reservation_list.remove_row(reservation)
+            else:
+                self.show_reservations()
 
     # Method to show the edit profile page
     def show_edit_profile(self):
-        # Clear the current window to prepare for the edit profile page
-        self.clear_window()
+        # Raise the form built earlier unless the profile was changed since (here or on another terminal)
+        key = (self.current_user.get_user_id(), self.store.get_version("customer", self.current_user.get_user_id()))
+        if self.screens.show("edit_profile", key):
+            return
 
         # Create a frame for the profile editing section
-        profile_frame = ttk.Frame(self)
+        profile_frame = ttk.Frame(self.screens.create("edit_profile", key))
         profile_frame.pack(expand=True, padx=20, pady=20)  # Add the frame to the window with padding
 
         # Label for the title of the page
@@ -845,39 +5458,38 @@ class AdventureLandApp(tk.Tk):
                            self.current_user.get_phone_number())  # Pre-fill the entry box with the current user's phone number
         phone_entry.pack(pady=5)  # Pack the entry box with padding
 
+        # Remember the version of the profile shown, so edits made meanwhile on another terminal are detected
+        version = self.store.get_version("customer", self.current_user.get_user_id())
+
         # Create and display the 'Save Changes' button
         ttk.Button(profile_frame, text="Save Changes",  # Button to save changes
                    command=lambda: self.save_profile_changes(  # Call save_profile_changes with current inputs
                        name_entry.get(),  # Get the name entered by the user
                        email_entry.get(),  # Get the email entered by the user
-                       phone_entry.get()  # Get the phone number entered by the user
+                       phone_entry.get(),  # Get the phone number entered by the user
+                       version  # Version of the profile the form was filled from
                    )).pack(pady=10)  # Pack the button with padding
 
         # Create and display the 'Back to Dashboard' button
         ttk.Button(profile_frame, text="Back to Dashboard",
                    command=self.show_customer_dashboard).pack()  # Button to go back to the dashboard
 
-    # Method to save changes to the user's profile
-    def save_profile_changes(self, name, email, phone):
-        # Check if the provided email format is valid using the validate_email method
-        if not self.validate_email(email):
-            # Show an error message if the email is invalid
-            messagebox.showerror("Error", "Invalid email format")
-            return  # Exit the method if the email is invalid
-
-        # Check if the provided phone number format is valid using the validate_phone method
-        if not self.validate_phone(phone):
-            # Show an error message if the phone number is invalid
-            messagebox.showerror("Error", "Invalid phone number format")
-            return  # Exit the method if the phone number is invalid
-
-        # Update the current user's information with the new values
-        self.current_user._User__name = name  # Update the user's name
-        self.current_user._User__email = email  # Update the user's email
-        self.current_user._Customer__phone_number = phone  # Update the user's phone number
+        # Put the saved values back whenever the form is shown again, dropping unsaved edits
+        def reset_profile():
+            clear_entries(name_entry, email_entry, phone_entry)
+            name_entry.insert(0, self.current_user.get_name())
+            email_entry.insert(0, self.current_user.get_email())
+            phone_entry.insert(0, self.current_user.get_phone_number())
+        self.screens.on_show("edit_profile", reset_profile)
 
-        # Save the updated list of customers to a file using the save_data function
-        save_data("customers.pkl", self.customers)
+    # Method to save changes to the user's profile
+    def save_profile_changes(self, name, email, phone, expected_version=None):
+        # Validate the new values and journal the change through the booking service
+        try:
+            self.service.update_profile(self.current_user, name, email, phone, expected_version)
+        except BookingError as error:
+            messagebox.showerror("Error", str(error))  # Invalid value, email taken or profile changed elsewhere
+            return
 
         # Display a success message to the user
         messagebox.showinfo("Success", "Profile updated successfully!")
@@ -887,23 +5499,89 @@ class AdventureLandApp(tk.Tk):
 
     # Method to log out the current user
     def logout(self):
-        # Set the current_user to None, effectively logging out the user
-        self.current_user = None
+        # End the session, effectively logging out the user
+        if self.session is not None:
+            self.service.end_session(self.session)
+            self.session = None
+
+        # Destroy the screens built for that user so they do not linger in memory
+        self.screens.discard("customer_dashboard", "ticket_purchase", "reservations", "edit_profile", "gate_check_in")
 
         # Call the method to display the main menu after logout
         self.create_main_menu()
 
-    # Method to clear all widgets from the window
-    def clear_window(self):
-        # Loop through each widget in the window and destroy it
-        for widget in self.winfo_children():
-            widget.destroy()
+    # Method to flush the data store and close the application
+    def exit_app(self):
+        self.service.hasher.close()  # Let a sign-in or registration in progress finish first
+        self.store.close()  # Make every journaled change durable before exiting
+        self.quit()
 
 
 # Check if the script is being run directly
 if __name__ == "__main__":
-    # Create an instance of the AdventureLandApp class
-    app = AdventureLandApp()
-    # Start the Tkinter event loop to run the application
-    app.mainloop()
+    # Parse the optional maintenance commands
+    parser = argparse.ArgumentParser(description="Adventure Land Theme Park")
+    parser.add_argument("--migrate-sqlite", metavar="DATABASE", nargs="?", const=DATABASE_FILE,
+                        help="copy the pickle data into a SQLite database and exit")
+    parser.add_argument("--serve", action="store_true",
+                        help="run the booking HTTP/JSON API instead of the GUI")
+    parser.add_argument("--host", default="127.0.0.1", help="address for --serve (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port for --serve (default 8080)")
+    parser.add_argument("--export", metavar="PATH",
+                        help="write the reservations and their payments to a file and exit")
+    parser.add_argument("--export-format", choices=("csv", "columnar"), default="csv",
+                        help="format for --export (default csv)")
+    parser.add_argument("--watermark", metavar="FILE",
+                        help="with --export, write only the payments (sales and refunds) of the days after the "
+                             "date in FILE, up to yesterday, then move FILE on")
+    parser.add_argument("--retention", metavar="DATE",
+                        help="delete the customers with no reservations on or after DATE (YYYY-MM-DD) and exit")
+    parser.add_argument("--anonymize", action="store_true",
+                        help="with --retention, strip the customers' personal details instead of deleting them")
+    args = parser.parse_args()
+
+    if args.migrate_sqlite:
+        # Run the one-shot migration instead of starting the GUI
+        try:
+            customers, reservations, payments = migrate_pickles_to_sqlite(database=args.migrate_sqlite)
+        except ValueError as error:
+            parser.exit(1, f"Migration failed: {error}\n")
+        print(f"Migrated {customers} customers, {reservations} reservations and {payments} payments "
+              f"to {args.migrate_sqlite}")
+    elif args.export:
+        # Write the extract instead of starting the GUI
+        rows, watermark = export_reservations(args.export, export_format=args.export_format,
+                                              watermark_file=args.watermark)
+        print(f"Exported {rows} rows to {args.export}" +
+              (f" (watermark {watermark})" if watermark else ""))
+    elif args.retention:
+        # Apply the retention policy instead of starting the GUI
+        store = DataStore()
+        try:
+            count = BookingService(store).apply_retention(args.retention, args.anonymize)
+        except ValidationError as error:
+            parser.exit(1, f"Retention failed: {error}\n")
+        finally:
+            store.close()
+        print(f"{'Anonymized' if args.anonymize else 'Deleted'} {count} customers with no reservations "
+              f"since {args.retention}")
+    elif args.serve:
+        # Serve the booking API from the same data store the GUI terminals use
+        store = DataStore()
+        service = BookingService(store)
+        if not store.tickets:
+            service.initialize_default_tickets()
+        print(f"Serving the booking API on http://{args.host}:{args.port}")
+        try:
+            BookingHTTPServer(service, args.host, args.port).serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            store.close()
+    else:
+        # Create an instance of the AdventureLandApp class
+        app = AdventureLandApp()
+        # Start the Tkinter event loop to run the application
+        app.mainloop()
+    INSTRUMENTS.write_output()  # Write the measurements if the environment names a file
 
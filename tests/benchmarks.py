@@ -0,0 +1,951 @@
+# Performance benchmarks of the Adventure Land booking system, each printing a table and exiting with an error if
+# one of its checks fails. Run one from the repository root with:  python tests/benchmarks.py NAME
+
+# Importing the standard modules the benchmarks use
+import argparse
+import asyncio
+import base64
+import csv
+import http.client
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Importing the application module from the directory above
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import (AuthenticationError, BookingError, BookingHTTPServer, BookingService, CapacityInventory, Customer,
+                  CustomerSearchIndex, DATABASE_FILE, DataStore, INSTRUMENTS, Instrumentation, JOURNAL_FILE,
+                  LATENCY_BUCKETS, PASSWORD_HASH_COST, PasswordHasher, Payment, RECORD_FORMAT_VERSION,
+                  RECORD_SNAPSHOT_TAG, Reservation, ReservationSearchIndex, SEARCH_RESULT_LIMIT, SNAPSHOT_FILES,
+                  SQLiteRepository, SalesColumns, SessionTable, SoldOutError, Ticket, TicketCatalog, ValidationError,
+                  export_reservations, hash_password, load_data, migrate_pickles_to_sqlite, numpy, save_data,
+                  verify_password)
+
+
+# Function to benchmark login lookups through the email index as the number of accounts grows
+def benchmark_login(sizes=(1000, 10000, 100000, 500000), lookups=20000):
+    print(f"{'accounts':>10} {'load (s)':>10} {'index login (us)':>18} {'list scan login (us)':>22}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            # Write a customer snapshot of the requested size
+            customers = [Customer(i, f"Guest {i}", f"guest{i}@example.com", "secret", "0500000000")
+                         for i in range(1, size + 1)]
+            save_data(os.path.join(data_dir, SNAPSHOT_FILES["customers"]), customers)
+            del customers
+
+            # Time loading the store, which builds the email index
+            start = time.perf_counter()
+            store = DataStore(data_dir)
+            load_time = time.perf_counter() - start
+
+            # Time logins through the index, using mixed-case emails spread over the whole range
+            emails = [f"Guest{random.randint(1, size)}@Example.com" for _ in range(lookups)]
+            start = time.perf_counter()
+            for email in emails:
+                customer = store.find_customer_by_email(email)
+                customer.check_password("secret")
+            index_time = (time.perf_counter() - start) / lookups
+
+            # Time the old linear scan on a small sample for comparison
+            sample = [email.lower() for email in emails[:20]]
+            start = time.perf_counter()
+            for email in sample:
+                next(c for c in store.customers if c.get_email() == email and c.check_password("secret"))
+            scan_time = (time.perf_counter() - start) / len(sample)
+
+            store.close()
+        print(f"{size:>10} {load_time:>10.2f} {index_time * 1e6:>18.2f} {scan_time * 1e6:>22.1f}")
+
+
+# Function to compare snapshot size and memory of pickled object graphs against flat records
+def benchmark_records(customers=20000, reservations_per_customer=5):
+    # Build a data set in which every customer has a few paid reservations
+    tracemalloc.start()
+    tickets = [Ticket(1, "Single-Day Pass", 275, "1 Day", "Access to the park for one day",
+                      "Valid only on selected date", None)]
+    people, reservations, payments = [], [], []
+    for i in range(1, customers + 1):
+        customer = Customer(i, f"Guest {i}", f"guest{i}@example.com", "secret", "0500000000")
+        people.append(customer)
+        for _ in range(reservations_per_customer):
+            reservation = Reservation(len(reservations) + 1, customer, tickets[0], "2025-06-01")
+            payment = Payment(len(payments) + 1, 275, "Credit Card")
+            reservation.set_payment(payment)
+            payment.set_reservation(reservation)
+            customer.add_reservation(reservation)
+            reservations.append(reservation)
+            payments.append(payment)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Compare the three snapshot files written as object graphs and as records
+    graph_bytes = sum(len(pickle.dumps(items)) for items in (people, reservations, payments))
+    record_bytes = sum(len(pickle.dumps((RECORD_SNAPSHOT_TAG, RECORD_FORMAT_VERSION,
+                                         [item.to_record() for item in items])))
+                       for items in (people, reservations, payments))
+    print(f"{customers} customers, {len(reservations)} reservations, {len(payments)} payments")
+    print(f"memory per reservation (with its payment and share of customer): "
+          f"{memory / len(reservations):.0f} bytes")
+    print(f"pickled object graphs: {graph_bytes / 1e6:.2f} MB")
+    print(f"flat record snapshots: {record_bytes / 1e6:.2f} MB ({graph_bytes / record_bytes:.1f}x smaller)")
+
+
+# Function run in each terminal process of the multi-terminal stress test
+def run_terminal_purchases(data_dir, customer_id, purchases, results):
+    store = DataStore(data_dir, compact_threshold=250)  # Small threshold so compactions happen mid-run
+    customer, ticket = store.get_customer(customer_id), store.tickets[0]
+    reservation_ids = [store.add_reservation(customer, ticket, "2025-07-01", "Credit Card").get_reservation_id()
+                       for _ in range(purchases)]
+    store.close()
+    results.put(reservation_ids)
+
+
+# Function to stress-test many terminal processes buying tickets in the same data directory at once
+def benchmark_terminals(terminal_counts=(1, 2, 4, 8), purchases=500):
+    print(f"{'terminals':>10} {'purchases':>10} {'seconds':>8} {'per second':>11} {'lost':>5} {'duplicates':>11}")
+    for terminals in terminal_counts:
+        with tempfile.TemporaryDirectory() as data_dir:
+            # Set up one ticket and one customer per terminal
+            store = DataStore(data_dir)
+            store.add_ticket(Ticket(1, "Single-Day Pass", 275, "1 Day", "Access to the park for one day",
+                                    "Valid only on selected date", None))
+            customer_ids = [store.register_customer(f"Booth {i}", f"booth{i}@example.com", "secret",
+                                                    "0500000000").get_user_id() for i in range(terminals)]
+            store.close()
+
+            # Run every terminal at once
+            results = multiprocessing.Queue()
+            processes = [multiprocessing.Process(target=run_terminal_purchases,
+                                                 args=(data_dir, customer_id, purchases, results))
+                         for customer_id in customer_ids]
+            start = time.perf_counter()
+            for process in processes:
+                process.start()
+            sold = [reservation_id for _ in processes for reservation_id in results.get()]
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+
+            # Reload from disk and check that every sale survived exactly once
+            store = DataStore(data_dir)
+            stored = [reservation.get_reservation_id() for reservation in store.reservations]
+            lost = len(set(sold) - set(stored))
+            duplicates = len(stored) - len(set(stored)) + len(sold) - len(set(sold))
+            tickets_sold = store.metrics.get_totals()[0]
+            store.close()
+        total = terminals * purchases
+        print(f"{terminals:>10} {total:>10} {elapsed:>8.2f} {total / elapsed:>11.0f} {lost:>5} {duplicates:>11}")
+        if lost or duplicates or len(stored) != total or tickets_sold != total:
+            raise SystemExit(f"Stress test failed: {len(stored)} of {total} reservations stored")
+
+
+# Function run by each terminal process in the capacity stress test: buy peak-day seats until they run out
+def run_terminal_peak_day(data_dir, customer_id, attempts, results):
+    store = DataStore(data_dir, compact_threshold=250)
+    customer, ticket = store.get_customer(customer_id), store.tickets[0]
+    sold, refused = [], 0
+    for _ in range(attempts):
+        try:
+            sold.append(store.add_reservation(customer, ticket, "2025-07-01", "Credit Card").get_reservation_id())
+        except SoldOutError:
+            refused += 1
+    store.close()
+    results.put((sold, refused))
+
+
+# Function to stress-test terminals selling the last seats of one peak day at once
+def benchmark_capacity(terminal_counts=(1, 2, 4, 8), capacity=1000, lookups=200000):
+    print(f"{'terminals':>10} {'capacity':>9} {'attempts':>9} {'sold':>6} {'refused':>8} {'seconds':>8}")
+    for terminals in terminal_counts:
+        with tempfile.TemporaryDirectory() as data_dir:
+            # Set up one capped ticket and one customer per terminal
+            store = DataStore(data_dir)
+            store.add_ticket(Ticket(1, "VIP Experience Pass", 550, "1 Day", "Reserved seating for shows",
+                                    "Limited availability, must be purchased", None))
+            store.set_capacity("VIP Experience Pass", capacity)
+            customer_ids = [store.register_customer(f"Booth {i}", f"booth{i}@example.com", "secret",
+                                                    "0500000000").get_user_id() for i in range(terminals)]
+            store.close()
+
+            # Every terminal tries to buy more than its share
+            attempts = capacity * 2 // terminals
+            results = multiprocessing.Queue()
+            processes = [multiprocessing.Process(target=run_terminal_peak_day,
+                                                 args=(data_dir, customer_id, attempts, results))
+                         for customer_id in customer_ids]
+            start = time.perf_counter()
+            for process in processes:
+                process.start()
+            outcomes = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+
+            # Reload from disk and check that exactly the capacity was sold
+            store = DataStore(data_dir)
+            sold = sum(len(ids) for ids, _ in outcomes)
+            refused = sum(refused for _, refused in outcomes)
+            stored = len(store.reservations)
+            available = store.get_availability(store.tickets[0], "2025-07-01")
+            store.close()
+        print(f"{terminals:>10} {capacity:>9} {attempts * terminals:>9} {sold:>6} {refused:>8} {elapsed:>8.2f}")
+        if sold != capacity or stored != capacity or available != 0:
+            raise SystemExit(f"Stress test failed: {stored} seats stored for a capacity of {capacity}")
+
+    # Time the availability check the purchase screen makes on every keystroke
+    inventory = CapacityInventory({"VIP Experience Pass": capacity})
+    for day in range(365):
+        inventory.reserve("VIP Experience Pass", f"2025-{day % 12 + 1:02d}-{day % 28 + 1:02d}")
+    start = time.perf_counter()
+    for _ in range(lookups):
+        inventory.get_available("VIP Experience Pass", "2025-07-01")
+    elapsed = time.perf_counter() - start
+    print(f"availability check: {elapsed / lookups * 1e6:.2f} us")
+
+
+# Function to compare a group booking with the same number of single purchases, each made durable
+def benchmark_group(group_sizes=(10, 20, 50, 200)):
+    print(f"{'seats':>6} {'single (ms)':>12} {'group (ms)':>11} {'speed-up':>9} {'single bytes':>13} {'group bytes':>12}")
+    for quantity in group_sizes:
+        timings, sizes = [], []
+        for bulk in (False, True):
+            with tempfile.TemporaryDirectory() as data_dir:
+                store = DataStore(data_dir, sync_batch=1)  # fsync every journal record
+                store.add_ticket(Ticket(5, "Group Ticket", 220, "1 Day", "Special rate for groups of 10 or more",
+                                        "Must be booked in advance", "20% off for groups of 20 or more"))
+                customer = store.register_customer("Group Lead", "lead@example.com", "secret", "0500000000")
+                ticket = store.get_ticket(5)
+                journal_path = os.path.join(data_dir, JOURNAL_FILE)
+                journal_start = os.path.getsize(journal_path)
+                start = time.perf_counter()
+                if bulk:
+                    store.add_group_reservation(customer, ticket, "2025-07-01", "Credit Card", quantity)
+                else:
+                    for _ in range(quantity):
+                        store.add_reservation(customer, ticket, "2025-07-01", "Credit Card")
+                store.flush()  # Include the time for the sale to reach the disk
+                timings.append(time.perf_counter() - start)
+                sizes.append(os.path.getsize(journal_path) - journal_start)
+                if len(store.reservations) != quantity:
+                    raise SystemExit(f"Expected {quantity} reservations, found {len(store.reservations)}")
+                store.close()
+        single, group = timings
+        print(f"{quantity:>6} {single * 1000:>12.2f} {group * 1000:>11.2f} {single / group:>8.1f}x "
+              f"{sizes[0]:>13} {sizes[1]:>12}")
+
+
+# Function to write snapshots holding the given number of paid reservations, for the benchmarks
+def write_benchmark_snapshots(data_dir, tickets, size, customers_per_reservation=0.1):
+    customer_count = max(1, int(size * customers_per_reservation))
+    records = {
+        "tickets": [ticket.to_record() for ticket in tickets],
+        "customers": [(number, f"Guest {number}", f"guest{number}@example.com", "secret", "0500000000")
+                      for number in range(1, customer_count + 1)],
+        "admins": [],
+        "reservations": [(number, number % customer_count + 1, number % len(tickets) + 1, "2025-06-01", number)
+                         for number in range(1, size + 1)],
+        "payments": [(number, 100, "Credit Card", "2025-05-01", number, 1) for number in range(1, size + 1)],
+    }
+    for name, items in records.items():
+        save_data(os.path.join(data_dir, SNAPSHOT_FILES[name]), (RECORD_SNAPSHOT_TAG, RECORD_FORMAT_VERSION, items))
+
+
+# Function to time how long the ticket catalogue takes to appear as the booking history grows
+def benchmark_startup(sizes=(0, 10000, 100000, 1000000)):
+    tickets = [Ticket(number, ticket_type, 100, "1 Day", "", "", None) for number, ticket_type in
+               enumerate(["Single-Day Pass", "Two-Day Pass", "Child Ticket", "VIP Experience Pass"], 1)]
+    print(f"{'reservations':>12} {'eager (ms)':>11} {'lazy (ms)':>10} {'background load (ms)':>21}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_benchmark_snapshots(data_dir, tickets, size)
+
+            # Everything loaded before the first screen, as before
+            start = time.perf_counter()
+            store = DataStore(data_dir)
+            eager = time.perf_counter() - start
+            store.close()
+
+            # Only the catalogue before the first screen, the history behind it
+            start = time.perf_counter()
+            store = DataStore(data_dir, lazy=True)
+            lazy = time.perf_counter() - start
+            if len(store.tickets) != len(tickets):
+                raise SystemExit(f"Expected {len(tickets)} tickets, found {len(store.tickets)}")
+            start = time.perf_counter()
+            store.start_loading()
+            if len(store.reservations) != size:
+                raise SystemExit(f"Expected {size} reservations, found {len(store.reservations)}")
+            background = time.perf_counter() - start
+            store.close()
+        print(f"{size:>12} {eager * 1000:>11.1f} {lazy * 1000:>10.2f} {background * 1000:>21.1f}")
+
+
+# Function to compare writing and reading checksummed snapshots with plain pickles
+def benchmark_snapshots(sizes=(10000, 100000, 1000000)):
+    print(f"{'records':>9} {'MB':>7} {'plain write':>12} {'atomic write':>13} {'plain read':>11} "
+          f"{'checked read':>13}   (ms)")
+    for size in sizes:
+        data = (RECORD_SNAPSHOT_TAG, RECORD_FORMAT_VERSION,
+                [(number, number, 1, "2025-06-01", number) for number in range(1, size + 1)])
+        with tempfile.TemporaryDirectory() as data_dir:
+            path = os.path.join(data_dir, "reservations.pkl")
+
+            # Write and read the same data the old way, straight through pickle
+            def plain_write():
+                with open(path + ".plain", 'wb') as file:
+                    pickle.dump(data, file)
+
+            def plain_read():
+                with open(path + ".plain", 'rb') as file:
+                    return pickle.load(file)
+
+            timings = []
+            for run in (plain_write, lambda: save_data(path, data), plain_read, lambda: load_data(path)):
+                start = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - start) * 1000)
+            megabytes = os.path.getsize(path) / 1e6
+        print(f"{size:>9} {megabytes:>7.1f} " + " ".join(f"{timing:>{width}.1f}" for timing, width in
+                                                         zip(timings, (12, 13, 11, 13))))
+
+
+# Function to compare the analytics columns with loops over the reservation objects
+def benchmark_analytics(sizes=(100000, 1000000), queries=5):
+    tickets = [Ticket(number, ticket_type, price, "1 Day", "", "", None) for number, (ticket_type, price) in
+               enumerate([("Single-Day Pass", 275), ("Two-Day Pass", 480), ("Child Ticket", 185),
+                          ("VIP Experience Pass", 550)], 1)]
+    methods = ["Credit Card", "Debit Card", "Cash", "Apple Pay"]
+    print(f"{'reservations':>12} {'build (s)':>10} {'object loop':>12} {'columns':>9} {'month':>7} "
+          f"{'forecast':>9}   (ms, {'NumPy' if numpy is not None else 'array'})")
+    for size in sizes:
+        rng = random.Random(size)
+        customer = Customer(1, "Guest", "guest@example.com", "secret", "0500000000")
+        day_zero = datetime(2023, 1, 1)
+        dates = [(day_zero + timedelta(days=day)).strftime("%Y-%m-%d") for day in range(3 * 365)]
+        reservations = []
+        for number in range(1, size + 1):  # Three years of sales, each booked up to 60 days ahead
+            visit = rng.randrange(60, len(dates))
+            reservation = Reservation(number, customer, rng.choice(tickets), dates[visit])
+            payment = Payment(number, reservation.get_ticket().get_price(), rng.choice(methods))
+            payment.set_date(dates[visit - rng.randrange(60)])
+            reservation.set_payment(payment)
+            reservations.append(reservation)
+        start = time.perf_counter()
+        columns = SalesColumns()
+        columns.add_all(reservations)
+        build = time.perf_counter() - start
+
+        # Revenue by ticket type the old way, looping over the objects
+        def object_loop():
+            totals = {}
+            for reservation in reservations:
+                counter = totals.setdefault(reservation.get_ticket().get_ticket_type(), [0, 0])
+                counter[0] += 1
+                counter[1] += reservation.get_payment().get_seat_amount()
+            return totals
+
+        timings = []
+        for run in (object_loop, columns.by_ticket_type, lambda: columns.by_payment_method("2024-06-01", "2024-06-30"),
+                    lambda: columns.forecast(datetime(2025, 6, 1).date(), 14)):
+            start = time.perf_counter()
+            for _ in range(queries):
+                run()
+            timings.append((time.perf_counter() - start) / queries * 1000)
+        print(f"{size:>12} {build:>10.2f} " + " ".join(f"{timing:>{width}.1f}" for timing, width in
+                                                      zip(timings, (12, 9, 7, 9))))
+        del reservations, columns
+
+
+# Function to time how long a purchase keeps the caller waiting, and how long until it is on disk
+def benchmark_persistence(sizes=(0, 100000, 1000000), purchases=500):
+    tickets = [Ticket(1, "Single-Day Pass", 275, "1 Day", "", "", None)]
+    print(f"{'reservations':>12} {'median (ms)':>12} {'p99 (ms)':>9} {'max (ms)':>9} {'on disk after (ms)':>19}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_benchmark_snapshots(data_dir, tickets, size)
+            store = DataStore(data_dir, sync_batch=1)  # An fsync for every record, the slowest policy
+            customer, ticket = store.get_customer(1), store.get_ticket(1)
+            timings = []
+            for _ in range(purchases):
+                start = time.perf_counter()
+                store.add_reservation(customer, ticket, "2025-07-01", "Credit Card")
+                timings.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            store.flush()
+            durable = time.perf_counter() - start
+            store.close()
+        timings.sort()
+        median, p99 = timings[len(timings) // 2], timings[len(timings) * 99 // 100]
+        print(f"{size:>12} {median * 1000:>12.3f} {p99 * 1000:>9.3f} {timings[-1] * 1000:>9.3f} "
+              f"{durable * 1000:>19.1f}")
+
+
+# Function to time customer and reservation searches as the number of records grows
+def benchmark_search(sizes=(10000, 100000, 1000000), queries=20):
+    first_names = ["Ali", "Sara", "Omar", "Fatima", "John", "Mary", "Ahmed", "Noor", "Khalid", "Layla"]
+    last_names = ["Khan", "Smith", "Alsaadi", "Haddad", "Brown", "Nasser", "Rahman", "Jones", "Mansour", "Salem"]
+    tickets = [Ticket(number, ticket_type, 100, "1 Day", "", "", None) for number, ticket_type in
+               enumerate(["Single-Day Pass", "Two-Day Pass", "Child Ticket", "VIP Experience Pass"], 1)]
+    searches = [
+        ("name prefix", lambda index, n: index.search("sara", 100, prefix=True)),
+        ("email substring", lambda index, n: index.search(f"{n // 2}@", 100)),
+        ("phone prefix", lambda index, n: index.search("0512345", 100, prefix=True)),
+        ("phone digits", lambda index, n: index.search("12345", 100)),
+        ("no match", lambda index, n: index.search("zzzz", 100)),
+    ]
+    print(f"{'records':>9} {'build (s)':>10} " + " ".join(f"{name:>16}" for name, _ in searches) +
+          f" {'date week':>10} {'type+month':>11} {'customer':>9}   (ms)")
+    for size in sizes:
+        rng = random.Random(size)
+        customers = [Customer(number, f"{rng.choice(first_names)} {rng.choice(last_names)}",
+                              f"guest{number}@example.com", "secret", f"05{rng.randrange(10 ** 8):08d}")
+                     for number in range(1, size + 1)]
+        start = time.perf_counter()
+        customer_index = CustomerSearchIndex()
+        customer_index.add_all(customers)
+        reservation_index = ReservationSearchIndex()
+        day_zero = datetime(2025, 1, 1)
+        for number, customer in enumerate(customers, 1):  # One reservation per customer over two years
+            reservation = Reservation(number, customer, tickets[number % len(tickets)],
+                                      (day_zero + timedelta(days=number % 730)).strftime("%Y-%m-%d"))
+            customer.add_reservation(reservation)
+            reservation_index.add(reservation)
+        build = time.perf_counter() - start
+
+        # Time each query, the customer index's blocks already joined by a first search
+        customer_index.search("warm-up")
+        timings = []
+        for _, run in searches:
+            start = time.perf_counter()
+            for _ in range(queries):
+                run(customer_index, size)
+            timings.append((time.perf_counter() - start) / queries * 1000)
+        for run in (lambda: reservation_index.search("2025-06-01", "2025-06-07", limit=SEARCH_RESULT_LIMIT),
+                    lambda: reservation_index.search("2025-06-01", "2025-06-30", "Child Ticket",
+                                                     limit=SEARCH_RESULT_LIMIT),
+                    lambda: reservation_index.search(customers=customer_index.search(f"guest{size // 3}@", 10,
+                                                                                       prefix=True))):
+            start = time.perf_counter()
+            for _ in range(queries):
+                run()
+            timings.append((time.perf_counter() - start) / queries * 1000)
+        print(f"{size:>9} {build:>10.2f} " + " ".join(f"{timing:>16.2f}" for timing in timings[:-3]) +
+              f" {timings[-3]:>10.2f} {timings[-2]:>11.2f} {timings[-1]:>9.2f}")
+        del customers, customer_index, reservation_index
+
+
+# Function run by each gate process in the check-in benchmark: scan its share of the day's reservations
+def run_gate_scans(data_dir, reservation_ids, results):
+    store = DataStore(data_dir)
+    admitted, refused = 0, 0
+    for reservation_id in reservation_ids:
+        try:
+            store.check_in(reservation_id, "2025-06-01")
+            admitted += 1
+        except BookingError:
+            refused += 1
+    store.close()
+    results.put((admitted, refused))
+
+
+# Function to measure gate scans per minute, with the same tickets scanned twice at different gates
+def benchmark_checkin(size=100000, gate_counts=(1, 2, 4), scans=2000):
+    tickets = [Ticket(1, "Single-Day Pass", 100, "1 Day", "", "", None)]
+    print(f"{'gates':>6} {'scans':>6} {'admitted':>9} {'refused':>8} {'seconds':>8} {'per minute':>11} "
+          f"{'one scan (ms)':>14}")
+    for gates in gate_counts:
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_benchmark_snapshots(data_dir, tickets, size)  # Every reservation is for 2025-06-01
+
+            # Each gate scans its own tickets, then the next gate's again, which must be refused
+            share = scans // gates
+            batches = [list(range(gate * share + 1, (gate + 1) * share + 1)) for gate in range(gates)]
+            batches = [batch + batches[(gate + 1) % gates] for gate, batch in enumerate(batches)]
+            results = multiprocessing.Queue()
+            processes = [multiprocessing.Process(target=run_gate_scans, args=(data_dir, batch, results))
+                         for batch in batches]
+            start = time.perf_counter()
+            for process in processes:
+                process.start()
+            counts = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+
+            # Reload from disk and check that every visitor was let in exactly once
+            store = DataStore(data_dir)
+            expected, checked_in = store.count_check_ins("2025-06-01")
+            start = time.perf_counter()
+            try:
+                store.check_in(1, "2025-06-01")
+            except ValidationError:
+                pass  # Already checked in: the refusal is what a second scan costs
+            one_scan = time.perf_counter() - start
+            store.close()
+        admitted, refused = sum(count[0] for count in counts), sum(count[1] for count in counts)
+        total = admitted + refused
+        print(f"{gates:>6} {total:>6} {admitted:>9} {refused:>8} {elapsed:>8.2f} {total / elapsed * 60:>11.0f} "
+              f"{one_scan * 1000:>14.3f}")
+        if admitted != gates * share or checked_in != admitted or expected != size:
+            raise SystemExit(f"Check-in failed: {admitted} admitted, {checked_in} recorded of {gates * share}")
+
+
+# Function to size the password work factor: logins per second at each cost, checked on the password pool
+def benchmark_passwords(costs=(10, 11, 12, 13, 14, 15, 16), logins=20, target=50):
+    workers = os.cpu_count() or 1
+    print(f"{'cost':>5} {'hash (ms)':>10} {'one login (ms)':>15} {'logins per second':>18}   ({workers} worker(s))")
+    chosen = None
+    for cost in costs:
+        start = time.perf_counter()
+        stored = hash_password("secret", cost)
+        hashing = time.perf_counter() - start
+        start = time.perf_counter()
+        if not verify_password(stored, "secret") or verify_password(stored, "wrong"):
+            raise SystemExit(f"Password check failed at cost {cost}")
+        one_login = (time.perf_counter() - start) / 2
+
+        # Many sign-ins at once, as the HTTP API sees them
+        hasher = PasswordHasher(cost, workers, max_pending=logins)
+        start = time.perf_counter()
+        futures = [hasher.submit(verify_password, stored, "secret") for _ in range(logins)]
+        if not all(future.result() for future in futures):
+            raise SystemExit(f"Password check failed at cost {cost}")
+        rate = logins / (time.perf_counter() - start)
+        hasher.close()
+        if rate >= target:
+            chosen = cost  # The costs rise, so this ends as the highest one fast enough
+        print(f"{cost:>5} {hashing * 1000:>10.1f} {one_login * 1000:>15.1f} {rate:>18.1f}")
+    print(f"Highest cost that still allows {target} logins per second: {chosen} "
+          f"(PASSWORD_HASH_COST is {PASSWORD_HASH_COST})")
+
+
+# Function to time opening and resolving sessions with 100,000 users signed in at once
+def benchmark_sessions(sizes=(1000, 100000), lookups=200000):
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = DataStore(data_dir)
+        store.register_customer("Guest", "guest@example.com", hash_password("secret"), "0500000000")
+        service = BookingService(store)
+        customer = store.get_customer(1)
+
+        # The password check a session saves on every request
+        start = time.perf_counter()
+        service.login("guest@example.com", "secret")
+        login = time.perf_counter() - start
+
+        print(f"{'sessions':>9} {'open (us)':>10} {'resolve (us)':>13} {'forged (us)':>12} {'memory (MB)':>12} "
+              f"{'evicted':>8}   (one login: {login * 1000:.1f} ms)")
+        for size in sizes:
+            service.sessions = SessionTable(limit=size)
+            tracemalloc.start()
+            start = time.perf_counter()
+            tokens = [service.open_session(customer) for _ in range(size)]
+            opened = (time.perf_counter() - start) / size
+            memory = tracemalloc.get_traced_memory()[0] / 2 ** 20
+            tracemalloc.stop()
+
+            # Resolve tokens spread over the whole table, then tokens with a bad signature
+            sample = [random.choice(tokens) for _ in range(lookups)]
+            start = time.perf_counter()
+            for token in sample:
+                service.get_session_user(token)
+            resolved = (time.perf_counter() - start) / lookups
+            forged = [token[:-1] + ("0" if token[-1] != "0" else "1") for token in sample[:lookups // 10]]
+            start = time.perf_counter()
+            for token in forged:
+                try:
+                    service.get_session_user(token)
+                except AuthenticationError:
+                    pass
+            rejected = (time.perf_counter() - start) / len(forged)
+
+            # One more session than the limit signs out the least recently used
+            service.open_session(customer)
+            evicted = sum(1 for token in tokens if service.sessions.resolve(token) is None)
+            print(f"{size:>9} {opened * 1e6:>10.2f} {resolved * 1e6:>13.2f} {rejected * 1e6:>12.2f} "
+                  f"{memory:>12.1f} {evicted:>8}")
+            if evicted != 1 or service.sessions.count() != size:
+                raise SystemExit(f"Expected 1 eviction and {size} sessions, found {evicted} and "
+                                 f"{service.sessions.count()}")
+            del tokens, sample
+        service.hasher.close()
+        store.close()
+
+
+# Function to compare finding the selected ticket by its formatted text with the catalogue's ID lookup
+def benchmark_catalog(sizes=(10, 100, 1000), lookups=20000):
+    print(f"{'tickets':>8} {'match str (us)':>15} {'by ID (us)':>11} {'details (us)':>13} "
+          f"{'after price change (us)':>24}")
+    for size in sizes:
+        tickets = [Ticket(number, f"Pass {number}", 100 + number, "1 Day", "Access to the park", "None", None)
+                   for number in range(1, size + 1)]
+        catalog = TicketCatalog(tickets)
+        picks = [random.randint(1, size) for _ in range(lookups)]
+        labels = [str(catalog.get(ticket_id)) for ticket_id in picks]
+
+        # The old lookup: format every ticket until one matches the dropdown text
+        start = time.perf_counter()
+        for label in labels:
+            next(t for t in tickets if str(t) == label)
+        by_text = (time.perf_counter() - start) / lookups
+
+        # The dropdown position gives the ID; the label and details are formatted once per price
+        start = time.perf_counter()
+        for ticket_id in picks:
+            catalog.get(ticket_id)
+        by_id = (time.perf_counter() - start) / lookups
+        start = time.perf_counter()
+        for ticket_id in picks:
+            catalog.get_details(ticket_id)
+        details = (time.perf_counter() - start) / lookups
+
+        # A price change drops that ticket's text and the dropdown list, which are built again once
+        start = time.perf_counter()
+        for number, ticket_id in enumerate(picks[:1000]):
+            catalog.set_price(ticket_id, 200 + number)
+            catalog.get_choices()
+            catalog.get_details(ticket_id)
+        changed = (time.perf_counter() - start) / 1000
+        if catalog.get_label(picks[999]) != str(catalog.get(picks[999])):
+            raise SystemExit("The catalogue kept a label from before the price change")
+        print(f"{size:>8} {by_text * 1e6:>15.2f} {by_id * 1e6:>11.3f} {details * 1e6:>13.3f} {changed * 1e6:>24.2f}")
+
+
+# Function to time cancellations as the booking history grows, and check that refunds keep revenue right
+def benchmark_cancellation(sizes=(10000, 100000, 1000000), cancellations=1000):
+    tickets = [Ticket(1, "Single-Day Pass", 100, "1 Day", "", "", None)]
+    print(f"{'reservations':>12} {'cancel (us)':>12} {'list.remove (us)':>17} {'sweep (ms)':>11} {'revenue':>12}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_benchmark_snapshots(data_dir, tickets, size)  # Every seat paid 100
+            store = DataStore(data_dir, compact_threshold=10 ** 9)  # Compact and sweep only when asked
+            picks = random.Random(size).sample(range(1, size + 1), cancellations)
+
+            # What each cancellation used to cost: a scan of the whole list, on a copy
+            copy = list(store.reservations)
+            start = time.perf_counter()
+            for reservation_id in picks[:20]:
+                copy.remove(store.get_reservation(reservation_id))
+            scan = (time.perf_counter() - start) / 20
+            del copy
+
+            start = time.perf_counter()
+            for reservation_id in picks:
+                store.remove_reservation(store.get_reservation(reservation_id))
+            cancel = (time.perf_counter() - start) / cancellations
+            start = time.perf_counter()
+            swept = store.sweep_tombstones()
+            sweep = time.perf_counter() - start
+
+            # Sales and refunds must add up to the running revenue, before and after a reload
+            revenue = sum(payment.get_amount() for payment in store.payments)
+            expected = (size - cancellations) * 100
+            checks = [swept == cancellations, len(store.reservations) == size - cancellations,
+                      revenue == expected, store.metrics.get_totals()[1] == expected]
+            store.compact()
+            store.close()
+            store = DataStore(data_dir)
+            checks += [store.count_reservations() == size - cancellations,
+                       sum(payment.get_amount() for payment in store.payments) == expected]
+            store.close()
+        print(f"{size:>12} {cancel * 1e6:>12.1f} {scan * 1e6:>17.1f} {sweep * 1000:>11.1f} {revenue:>12}")
+        if not all(checks):
+            raise SystemExit(f"Cancellation check failed: {checks}")
+
+
+# Function to time deleting a customer with their records as the data grows, and a bulk retention purge
+def benchmark_retention(sizes=(10000, 100000, 1000000), deletions=100, purge_ratio=0.1):
+    tickets = [Ticket(1, "Single-Day Pass", 100, "1 Day", "", "", None)]
+    print(f"{'reservations':>12} {'delete (us)':>12} {'scan (us)':>10} {'purge':>7} {'purge (ms)':>11} "
+          f"{'anonymize (ms)':>15} {'sweep (ms)':>11}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_benchmark_snapshots(data_dir, tickets, size)  # Ten reservations per customer, each paid 100
+            store = DataStore(data_dir, compact_threshold=10 ** 9)  # Compact and sweep only when asked
+            customers = list(store.customers)
+            random.Random(size).shuffle(customers)
+            singles, purged = customers[:deletions], customers[deletions:deletions + int(len(customers) * purge_ratio)]
+            anonymized = customers[len(singles) + len(purged):][:len(purged)]
+
+            # What finding one customer's records would cost without the customer -> reservations index
+            start = time.perf_counter()
+            for customer in singles[:5]:
+                [reservation for reservation in store.reservations if reservation.get_customer() is customer]
+            scan = (time.perf_counter() - start) / 5
+
+            start = time.perf_counter()
+            for customer in singles:
+                store.remove_customer(customer)
+            delete = (time.perf_counter() - start) / deletions
+            start = time.perf_counter()
+            store.purge_customers(purged)
+            purge = time.perf_counter() - start
+            start = time.perf_counter()
+            store.purge_customers(anonymized, anonymize=True)
+            anonymize = time.perf_counter() - start
+            start = time.perf_counter()
+            store.sweep_tombstones()
+            sweep = time.perf_counter() - start
+
+            # The deleted customers' sales leave the figures; the anonymized ones stay but cannot sign in
+            removed = (len(singles) + len(purged)) * 10
+            expected = (size - removed) * 100
+            checks = [store.count_customers() == len(customers) - len(singles) - len(purged),
+                      store.count_reservations() == size - removed, len(store.payments) == size - removed,
+                      store.metrics.get_totals()[1] == expected,
+                      not any(customer.check_password("secret") for customer in anonymized)]
+            store.compact()
+            store.close()
+            store = DataStore(data_dir)
+            checks += [store.count_reservations() == size - removed, store.count_customers() == len(store.customers),
+                       sum(payment.get_amount() for payment in store.payments) == expected,
+                       store.get_customer(anonymized[0].get_user_id()).is_locked()]
+            store.close()
+        print(f"{size:>12} {delete * 1e6:>12.1f} {scan * 1e6:>10.1f} {len(purged):>7} {purge * 1000:>11.1f} "
+              f"{anonymize * 1000:>15.1f} {sweep * 1000:>11.1f}")
+        if not all(checks):
+            raise SystemExit(f"Retention check failed: {checks}")
+
+
+# Function to measure what the instrumentation adds to a call when it is off and when it is on
+def benchmark_instrumentation(calls=1000000, saves=20):
+    def operation(value):
+        return value + 1
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "customers.pkl")
+        data = [Customer(i, f"Guest {i}", f"guest{i}@example.com", "secret", "0500000000") for i in range(10000)]
+        print(f"{'instrumentation':>16} {'call (ns)':>10} {'save_data (ms)':>15}")
+        for label, instruments in (("none", None), ("off", Instrumentation(False)), ("on", Instrumentation(True))):
+            measured = operation if instruments is None else instruments.measure("operation")(operation)
+            start = time.perf_counter()
+            for value in range(calls):
+                measured(value)
+            call = (time.perf_counter() - start) / calls
+
+            # A snapshot write, timed and with its bytes counted as save_data's are
+            save = getattr(save_data, "__wrapped__", save_data)  # Unwrapped when the environment turned it on
+            if instruments is not None:
+                save = instruments.measure("save_data")(save)
+            start = time.perf_counter()
+            for _ in range(saves):
+                save(path, data)
+                if instruments is not None:
+                    instruments.count_bytes(path, os.path.getsize(path))
+            saved = (time.perf_counter() - start) / saves
+            print(f"{label:>16} {call * 1e9:>10.1f} {saved * 1000:>15.2f}")
+
+        # The enabled instance must have seen every call and every byte
+        snapshot = instruments.get_snapshot()
+        checks = [snapshot["operations"]["operation"]["calls"] == calls,
+                  snapshot["operations"]["save_data"]["calls"] == saves,
+                  snapshot["files"]["customers.pkl"]["bytes"] == os.path.getsize(path) * saves,
+                  instruments.to_prometheus().count("_bucket{") == 2 * (len(LATENCY_BUCKETS) + 1)]
+        if not all(checks):
+            raise SystemExit(f"Instrumentation check failed: {checks}")
+
+
+# Function to time the SQLite migration of a store using every field of the current record format, and check that
+# the database gives the same records back
+def benchmark_migration(sizes=(1000, 10000)):
+    today = datetime.now().strftime("%Y-%m-%d")
+    print(f"{'customers':>10} {'reservations':>13} {'migrate (ms)':>13} {'day query (ms)':>15}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            store = DataStore(data_dir, compact_threshold=10 ** 9)
+            BookingService(store).initialize_default_tickets()
+            ticket = store.tickets[0]
+            for number in range(1, size + 1):
+                customer = store.register_customer(f"Guest {number}", f"guest{number}@example.com",
+                                                   "secret", "0500000000")
+                reservation = store.add_reservation(customer, ticket, today, "Credit Card")
+                if number % 10 == 0:
+                    store.add_group_reservation(customer, ticket, today, "Cash", 3)  # One payment, three seats
+                if number % 7 == 0:
+                    store.check_in(reservation.get_reservation_id(), today)
+                if number % 11 == 0:
+                    store.remove_reservation(reservation)  # Leaves a refund payment
+            expected = {
+                "customers": sorted(customer.to_record() for customer in store.get_customers()),
+                "reservations": sorted(reservation.to_record() for reservation in store.reservations
+                                       if reservation.get_cancelled() is None),
+                "payments": sorted(payment.to_record() for payment in store.payments),
+            }
+            store.close()
+
+            start = time.perf_counter()
+            migrate_pickles_to_sqlite(data_dir)
+            migrate = time.perf_counter() - start
+            repository = SQLiteRepository(os.path.join(data_dir, DATABASE_FILE))
+            start = time.perf_counter()
+            reservations = repository.reservations_on(today)  # Customers and payments come with the same query
+            query = time.perf_counter() - start
+            found = {
+                "customers": sorted(customer.to_record() for customer in repository.list_customers(0, size + 1)),
+                "reservations": sorted(reservation.to_record() for reservation in reservations),
+                "payments": sorted(payment.to_record() for payment in repository.payments_between("", "9999")),
+            }
+            repository.close()
+        print(f"{size:>10} {len(reservations):>13} {migrate * 1000:>13.1f} {query * 1000:>15.1f}")
+        mismatched = [name for name in expected if expected[name] != found[name]]
+        if mismatched:
+            raise SystemExit(f"Migration round trip lost data in: {', '.join(mismatched)}")
+
+
+# Function to time a full export in both formats, and check that incremental extracts add up to the revenue
+# when reservations are cancelled after they were exported
+def benchmark_export(sizes=(10000, 100000), cancellations=100):
+    tickets = [Ticket(1, "Single-Day Pass", 100, "1 Day", "", "", None)]
+    today = datetime.now().date()
+    print(f"{'reservations':>12} {'csv (ms)':>9} {'columnar (ms)':>14} {'csv (KB)':>9} {'columnar (KB)':>14} "
+          f"{'refund rows':>12}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_benchmark_snapshots(data_dir, tickets, size)  # Every seat paid 100, on a past day
+            times, file_sizes = [], []
+            for export_format in ("csv", "columnar"):
+                path = os.path.join(data_dir, f"full.{export_format}")
+                start = time.perf_counter()
+                export_reservations(path, data_dir, export_format)
+                times.append(time.perf_counter() - start)
+                file_sizes.append(os.path.getsize(path))
+
+            # Extract every past day, then sell and cancel today, some of the cancelled seats already exported
+            watermark_file = os.path.join(data_dir, "watermark")
+            first = os.path.join(data_dir, "first.csv")
+            export_reservations(first, data_dir, watermark_file=watermark_file, today=today)
+            store = DataStore(data_dir, compact_threshold=10 ** 9)
+            customer, ticket = store.customers[0], store.tickets[0]
+            sold = [store.add_reservation(customer, ticket, "2025-06-01", "Cash") for _ in range(10)]
+            store.add_group_reservation(customer, ticket, "2025-06-01", "Cash", 4)
+            cancelled = random.Random(size).sample(range(1, size + 1), cancellations)
+            for reservation_id in cancelled:
+                store.remove_reservation(store.get_reservation(reservation_id))
+            store.remove_reservation(sold[0])  # Sold and cancelled before it was ever exported
+            revenue = sum(payment.get_amount() for payment in store.payments)
+            store.close()
+
+            # The next day's extract has today's sales and refunds: the extracts add up to the revenue
+            second = os.path.join(data_dir, "second.csv")
+            export_reservations(second, data_dir, watermark_file=watermark_file,
+                                today=today + timedelta(days=1))
+            with open(first, newline='') as file:
+                first_rows = list(csv.DictReader(file))
+            with open(second, newline='') as file:
+                second_rows = list(csv.DictReader(file))
+            refunds = [row for row in second_rows if row["refund_of"] != "0"]
+            total = sum(float(row["price"]) for row in first_rows + second_rows)
+            full = os.path.join(data_dir, "full.csv")
+            export_reservations(full, data_dir)
+            with open(full, newline='') as file:
+                full_total = sum(float(row["price"]) for row in csv.DictReader(file))
+            checks = [len(first_rows) == size, len(refunds) == cancellations + 1,
+                      sorted(int(row["reservation_id"]) for row in refunds)
+                      == sorted(cancelled + [sold[0].get_reservation_id()]),
+                      all(float(row["price"]) < 0 for row in refunds), len(second_rows) == 14 + cancellations + 1,
+                      total == revenue, full_total == revenue]
+        print(f"{size:>12} {times[0] * 1000:>9.1f} {times[1] * 1000:>14.1f} {file_sizes[0] / 1024:>9.0f} "
+              f"{file_sizes[1] / 1024:>14.0f} {len(refunds):>12}")
+        if not all(checks):
+            raise SystemExit(f"Export check failed: {checks}")
+
+
+# Function to send one HTTP request on an open connection and return (status, JSON payload)
+def http_request(connection, method, path, payload=None, credentials=None, token=None):
+    headers = {"Content-Type": "application/json"}
+    if credentials:
+        headers["Authorization"] = "Basic " + base64.b64encode(":".join(credentials).encode()).decode()
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    connection.request(method, path, json.dumps(payload) if payload is not None else None, headers)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+# Function to measure booking requests per second through the HTTP API
+def benchmark_http(requests=2000, port=0):
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = DataStore(data_dir)
+        service = BookingService(store)
+        service.initialize_default_tickets()
+        service.register("Gate Client", "client@example.com", "secret", "0500000000")
+
+        # Serve from a background thread on a free port
+        server = BookingHTTPServer(service, port=port)
+        loop = asyncio.new_event_loop()
+        listener = loop.run_until_complete(asyncio.start_server(server.handle_connection, server.host, port))
+        port = listener.sockets[0].getsockname()[1]
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        connection = http.client.HTTPConnection(server.host, port)  # One keep-alive connection
+        status, body = http_request(connection, "POST", "/login", {"email": "client@example.com", "password": "secret"})
+        if status != 200:
+            raise SystemExit(f"Login failed with {status}: {body}")
+        print(f"{'request':>20} {'count':>7} {'seconds':>8} {'per second':>11}")
+        purchase = {"ticket_id": 1, "date": "2026-12-01", "payment_method": "Credit Card"}
+        for name, method, path, payload, count, auth in [
+            ("GET /tickets", "GET", "/tickets", None, requests, {}),
+            ("POST /reservations", "POST", "/reservations", purchase, requests, {"token": body["token"]}),
+            ("with password", "POST", "/reservations", purchase, max(1, requests // 100),
+             {"credentials": ("client@example.com", "secret")}),  # Every request pays for a password check
+        ]:
+            start = time.perf_counter()
+            for _ in range(count):
+                status, response = http_request(connection, method, path, payload, **auth)
+                if status >= 300:
+                    raise SystemExit(f"{name} failed with {status}: {response}")
+            elapsed = time.perf_counter() - start
+            print(f"{name:>20} {count:>7} {elapsed:>8.2f} {count / elapsed:>11.0f}")
+        connection.close()
+
+        # Let the connection handler see the close before stopping the loop
+        async def shutdown():
+            listener.close()
+            pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            await asyncio.gather(*pending, return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        store.close()
+
+
+# Benchmarks that can be run by NAME
+BENCHMARKS = {
+    "login": benchmark_login,
+    "records": benchmark_records,
+    "terminals": benchmark_terminals,
+    "capacity": benchmark_capacity,
+    "group": benchmark_group,
+    "search": benchmark_search,
+    "startup": benchmark_startup,
+    "persistence": benchmark_persistence,
+    "snapshots": benchmark_snapshots,
+    "analytics": benchmark_analytics,
+    "checkin": benchmark_checkin,
+    "passwords": benchmark_passwords,
+    "sessions": benchmark_sessions,
+    "catalog": benchmark_catalog,
+    "cancellation": benchmark_cancellation,
+    "retention": benchmark_retention,
+    "migration": benchmark_migration,
+    "export": benchmark_export,
+    "instrumentation": benchmark_instrumentation,
+    "http": benchmark_http,
+}
+
+
+# Check if the script is being run directly
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Adventure Land Theme Park benchmarks")
+    parser.add_argument("name", choices=sorted(BENCHMARKS), help="benchmark to run")
+    BENCHMARKS[parser.parse_args().name]()
+    INSTRUMENTS.write_output()  # Write the measurements if the environment names a file
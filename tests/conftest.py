@@ -0,0 +1,36 @@
+# Shared fixtures of the test suite (run from the repository root with: python -m pytest -q)
+
+# Importing os, sys and pytest for the fixtures
+import os
+import sys
+
+import pytest
+
+# Importing the application module from the directory above
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import BookingService, DataStore
+
+
+# Fixture returning the path of an empty data directory for the test
+@pytest.fixture
+def data_dir(tmp_path):
+    return str(tmp_path)
+
+
+# Fixture opening data stores on the test's data directory, one per terminal, all closed after the test
+@pytest.fixture
+def open_store(data_dir):
+    stores = []
+
+    # Function to open another store on the directory, with the default tickets on the first one
+    def open_store(**options):
+        options.setdefault("compact_threshold", 10 ** 9)  # Compacted only when a test asks for it
+        store = DataStore(data_dir, **options)
+        if not store.tickets:
+            BookingService(store).initialize_default_tickets()
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
@@ -0,0 +1,60 @@
+# Tests of the reservation export: streamed from the snapshots and the journal, which it only reads
+
+# Importing csv, os and datetime for reading the extracts
+import csv
+import os
+from datetime import datetime, timedelta
+
+from main import export_reservations
+
+
+# Function to read the rows of a CSV extract
+def read_rows(path):
+    with open(path, newline='') as file:
+        return list(csv.DictReader(file))
+
+
+# Test that exporting an empty directory writes an empty extract and leaves no file behind in the directory
+def test_export_of_an_empty_directory(data_dir, tmp_path_factory):
+    path = os.path.join(str(tmp_path_factory.mktemp("extracts")), "full.csv")
+    assert export_reservations(path, data_dir) == (0, None)
+    assert os.listdir(data_dir) == []
+    assert read_rows(path) == []
+
+
+# Test that the extracts match the store, with changes both compacted and still in the journal, and that the
+# export changes no file of the data directory
+def test_export_matches_the_store(data_dir, open_store, tmp_path_factory):
+    store = open_store()
+    customer = store.register_customer("Ann", "ann@example.com", "hash", "0500000000")
+    ticket = store.tickets[0]
+    sold = [store.add_reservation(customer, ticket, "2025-07-01", "Cash") for _ in range(5)]
+    group = store.add_group_reservation(customer, store.tickets[1], "2025-07-02", "Card", 3)
+    store.remove_reservation(sold[0])
+    store.compact()
+    store.remove_reservation(sold[1])  # In the journal tail
+    store.remove_reservation(group[0])
+    store.set_ticket_price(ticket, 300)  # Later price changes do not alter what was paid
+    store.close()
+
+    files = {name: os.path.getmtime(os.path.join(data_dir, name)) for name in os.listdir(data_dir)}
+    extracts = str(tmp_path_factory.mktemp("extracts"))
+    full = os.path.join(extracts, "full.csv")
+    export_reservations(full, data_dir)
+    rows = read_rows(full)
+    assert sorted(int(row["reservation_id"]) for row in rows) == \
+        sorted(reservation.get_reservation_id() for reservation in sold[2:] + group[1:])
+    paid = 3 * sold[0].get_payment().get_amount() + 2 * group[0].get_payment().get_seat_amount()
+    assert sum(float(row["price"]) for row in rows) == paid
+
+    # An incremental extract of today has every seat sold and the refunds, adding up to the revenue
+    today = datetime.now().date()
+    incremental = os.path.join(extracts, "today.csv")
+    export_reservations(incremental, data_dir, watermark_file=os.path.join(extracts, "watermark"),
+                        today=today + timedelta(days=1))
+    rows = read_rows(incremental)
+    assert len(rows) == 5 + 3 + 3
+    assert sorted(int(row["refund_of"]) for row in rows if row["refund_of"] != "0") == \
+        sorted(reservation.get_payment().get_payment_id() for reservation in (sold[0], sold[1], group[0]))
+    assert sum(float(row["price"]) for row in rows) == sum(float(row["price"]) for row in read_rows(full))
+    assert {name: os.path.getmtime(os.path.join(data_dir, name)) for name in os.listdir(data_dir)} == files
@@ -0,0 +1,79 @@
+# Tests of the write-ahead journal: replaying it rebuilds the store, with or without snapshots underneath
+
+# Importing os and datetime for the journal file and today's date
+import os
+from datetime import datetime
+
+from main import JOURNAL_FILE
+
+
+# Function to capture everything the store holds as flat records, with the metrics and seats
+def store_state(store):
+    return ([ticket.to_record() for ticket in store.tickets],
+            sorted(customer.to_record() for customer in store.get_customers()),
+            sorted(reservation.to_record() for reservation in store.reservations
+                   if reservation.get_cancelled() is None),
+            sorted(payment.to_record() for payment in store.payments if payment.get_deleted() is None),
+            store.metrics.get_state(), store.inventory.get_state())
+
+
+# Function to make one of each kind of change
+def make_changes(store, suffix):
+    today = datetime.now().strftime("%Y-%m-%d")
+    customer = store.register_customer(f"Guest {suffix}", f"guest{suffix}@example.com", "hash", "0500000000")
+    store.update_customer(customer, f"Guest {suffix} Lee", f"guest{suffix}@example.com", "0511111111")
+    kept = store.add_reservation(customer, store.tickets[0], today, "Cash")
+    cancelled = store.add_reservation(customer, store.tickets[1], "2025-07-01", "Card")
+    store.add_group_reservation(customer, store.tickets[4], "2025-07-02", "Cash", 20)
+    store.remove_reservation(cancelled)
+    store.check_in(kept.get_reservation_id(), today)
+    store.set_ticket_price(store.tickets[0], 300)
+    store.set_capacity("VIP Experience Pass", 50)
+    gone = store.register_customer(f"Gone {suffix}", f"gone{suffix}@example.com", "hash", "0500000000")
+    store.add_reservation(gone, store.tickets[0], "2025-07-03", "Cash")
+    store.remove_customer(gone)
+
+
+# Test that reopening a store replays the journal into the same state
+def test_journal_replay_rebuilds_the_store(open_store):
+    store = open_store()
+    make_changes(store, 1)
+    expected = store_state(store)
+    store.close()
+    assert store_state(open_store()) == expected
+
+
+# Test that the journal after a compaction is replayed on top of the snapshots it wrote
+def test_journal_replay_after_compaction(open_store):
+    store = open_store()
+    make_changes(store, 1)
+    store.compact()
+    make_changes(store, 2)
+    expected = store_state(store)
+    store.close()
+    assert store_state(open_store()) == expected
+
+
+# Test that a record torn by a crash mid-write is cut off, keeping every complete one
+def test_journal_replay_drops_a_torn_record(data_dir, open_store):
+    store = open_store()
+    make_changes(store, 1)
+    expected = store_state(store)
+    store.close()
+    path = os.path.join(data_dir, JOURNAL_FILE)
+    size = os.path.getsize(path)
+    with open(path, 'ab') as file:
+        file.write(b"\x00\x00\x01\x00torn")  # A size prefix promising more than was written
+
+    assert store_state(open_store()) == expected
+    assert os.path.getsize(path) == size
+
+
+# Test that a terminal catches up with changes another terminal journaled, across its compactions
+def test_terminal_catches_up_with_another(open_store):
+    first, second = open_store(), open_store()
+    make_changes(first, 1)
+    first.compact()
+    make_changes(first, 2)
+    second.refresh()
+    assert store_state(second) == store_state(first)
@@ -0,0 +1,56 @@
+# Tests of the sales figures: cancellation rates over a date range, and deleting a customer
+
+# Importing datetime for today's date
+from datetime import datetime
+
+from benchmarks import write_benchmark_snapshots
+from main import BookingService, Ticket
+
+
+# Test that the cancellation rate of a report counts only the sales paid for within its dates
+def test_cancellation_rate_over_a_date_range(data_dir, open_store):
+    write_benchmark_snapshots(data_dir, [Ticket(1, "Single-Day Pass", 100, "1 Day", "", "", None)], 10)
+    store = open_store()  # Ten seats paid for on 2025-05-01
+    service = BookingService(store)
+    for reservation_id in (1, 2):
+        store.remove_reservation(store.get_reservation(reservation_id))
+    customer, ticket = store.customers[0], store.tickets[0]
+    sold = [store.add_reservation(customer, ticket, "2025-07-01", "Cash") for _ in range(4)]
+    store.remove_reservation(sold[0])
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    for start, end, tickets, cancelled in (("2025-05-01", "2025-05-01", 8, 2), (today, today, 3, 1),
+                                           ("", "", 11, 3)):
+        figures = service.get_sales_analytics(start, end)["ticket_types"]["Single-Day Pass"]
+        assert (figures["tickets"], figures["cancelled"]) == (tickets, cancelled)
+        assert figures["cancellation_rate"] == cancelled / (tickets + cancelled)
+    assert service.get_sales_analytics("2025-06-01", "2025-06-30")["ticket_types"] == {}
+
+
+# Test that deleting a customer takes their sales out of the figures without counting them as cancellations,
+# keeping the refunds of their earlier cancellations with the sales they refund
+def test_customer_deletion(open_store):
+    store = open_store()
+    leaving = store.register_customer("Leaving", "leaving@example.com", "hash", "0500000000")
+    staying = store.register_customer("Staying", "staying@example.com", "hash", "0500000000")
+    ticket = store.tickets[0]
+    cancelled = store.add_reservation(leaving, ticket, "2025-07-01", "Cash")
+    store.add_reservation(leaving, ticket, "2025-07-01", "Cash")
+    store.add_group_reservation(leaving, ticket, "2025-07-02", "Card", 3)
+    store.remove_reservation(cancelled)
+    kept = store.add_reservation(staying, ticket, "2025-07-01", "Cash")
+
+    store.remove_customer(leaving)
+    for current in (store, open_store()):  # The same after the journal is replayed
+        assert current.get_customer(leaving.get_user_id()) is None
+        assert current.count_reservations() == 1
+        assert current.get_reservation(kept.get_reservation_id()) is not None
+        figures = BookingService(current).get_sales_analytics()["ticket_types"][ticket.get_ticket_type()]
+        assert (figures["tickets"], figures["cancelled"]) == (1, 1)  # Only the real cancellation
+        assert current.metrics.get_totals()[1] == ticket.get_price()
+
+        # The cancelled sale and its refund are kept as a pair that adds up to nothing
+        payments = [payment for payment in current.payments if payment.get_deleted() is None]
+        refunds = [payment for payment in payments if payment.get_refund_of() is not None]
+        assert [refund.get_reservation_id() for refund in refunds] == [cancelled.get_reservation_id()]
+        assert sum(payment.get_amount() for payment in payments) == ticket.get_price()
@@ -0,0 +1,87 @@
+# Tests of several terminals sharing one data directory: serialized purchases and optimistic concurrency
+
+# Importing multiprocessing and pytest for the terminal processes and the checks
+import multiprocessing
+
+import pytest
+
+from main import ConcurrencyError, DataStore
+
+
+# Function run by each terminal process: buy tickets one at a time, compacting along the way
+def buy_tickets(data_dir, customer_id, purchases, results):
+    store = DataStore(data_dir, compact_threshold=50)  # Small threshold so compactions happen mid-run
+    customer, ticket = store.get_customer(customer_id), store.tickets[0]
+    reservation_ids = [store.add_reservation(customer, ticket, "2025-07-01", "Cash").get_reservation_id()
+                       for _ in range(purchases)]
+    store.close()
+    results.put(reservation_ids)
+
+
+# Test that purchases made by several processes at once are all kept, each with its own ID
+def test_terminals_lose_no_reservations(data_dir, open_store):
+    store = open_store()
+    customer_id = store.register_customer("Booth Guest", "booth@example.com", "hash", "0500000000").get_user_id()
+    store.close()
+
+    terminals, purchases = 4, 60
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=buy_tickets, args=(data_dir, customer_id, purchases, results))
+                 for _ in range(terminals)]
+    for process in processes:
+        process.start()
+    sold = [reservation_id for _ in processes for reservation_id in results.get(timeout=120)]
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    store = open_store()
+    assert len(sold) == len(set(sold)) == terminals * purchases
+    assert store.count_reservations() == terminals * purchases
+    assert all(store.get_reservation(reservation_id) is not None for reservation_id in sold)
+    assert len({payment.get_payment_id() for payment in store.payments}) == terminals * purchases
+
+
+# Test that a change based on a version another terminal has moved on from is refused
+def test_stale_version_is_refused(open_store):
+    first, second = open_store(), open_store()
+    customer = first.register_customer("Ann", "ann@example.com", "hash", "0500000000")
+    second.refresh()
+    version = second.get_version("customer", customer.get_user_id())
+
+    first.update_customer(customer, "Ann Lee", "ann@example.com", "0500000000", expected_version=version)
+    with pytest.raises(ConcurrencyError):
+        second.update_customer(second.get_customer(customer.get_user_id()), "Ann Other", "ann@example.com",
+                               "0500000000", expected_version=version)
+    assert second.get_customer(customer.get_user_id()).get_name() == "Ann Lee"
+
+    ticket = first.tickets[0]
+    version = second.get_version("ticket", ticket.get_ticket_id())
+    first.set_ticket_price(ticket, 300, expected_version=version)
+    with pytest.raises(ConcurrencyError):
+        second.set_ticket_price(second.get_ticket(ticket.get_ticket_id()), 310, expected_version=version)
+
+
+# Test that versions survive a compaction and a reload: a current version is accepted, a stale one refused
+def test_versions_are_kept_in_the_records(open_store):
+    first, second = open_store(), open_store()
+    customer = first.register_customer("Ann", "ann@example.com", "hash", "0500000000")
+    reservation = first.add_reservation(customer, first.tickets[0], "2025-07-01", "Cash")
+    first.update_customer(customer, "Ann Lee", "ann@example.com", "0500000000", expected_version=1)
+    second.refresh()
+    stale = second.get_version("customer", customer.get_user_id())  # Read by a form before the compactions
+    first.compact()
+    first.update_customer(customer, "Ann Ray", "ann@example.com", "0500000000", expected_version=2)
+    first.compact()
+    first.compact()
+
+    reopened = open_store()
+    assert reopened.get_version("customer", customer.get_user_id()) == 3
+    assert reopened.get_version("reservation", reservation.get_reservation_id()) == 1
+    reopened.update_customer(reopened.get_customer(customer.get_user_id()), "Ann Kay", "ann@example.com",
+                             "0500000000", expected_version=3)
+    with pytest.raises(ConcurrencyError):
+        second.update_customer(second.get_customer(customer.get_user_id()), "Ann Old", "ann@example.com",
+                               "0500000000", expected_version=stale)
+    assert second.get_customer(customer.get_user_id()).get_name() == "Ann Kay"
+    assert second.get_version("customer", customer.get_user_id()) == 4